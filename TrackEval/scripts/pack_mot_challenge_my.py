@@ -0,0 +1,62 @@
+""" pack_mot_challenge_my.py
+
+Converts the gt.txt/predict.txt files of all sequences (video+expression) in a results folder into the packed binary
+format of MotChallenge2DBox_my. Later evaluations of the same results can then read the packed data by setting
+--INPUT_AS_PACKED True, instead of opening every text file again.
+
+Run example:
+pack_mot_challenge_my.py --SEQMAP_FILE seqmap.txt --SKIP_SPLIT_FOL True --TRACKERS_FOLDER results_epoch80
+    --GT_LOC_FORMAT {gt_folder}{video_id}/{expression_id}/gt.txt --TRACKERS_TO_EVAL results_epoch80
+
+Command Line Arguments: Defaults, # Comments
+    Dataset arguments (as for run_mot_challenge.py), notably:
+        'TRACKERS_FOLDER': os.path.join(code_path, 'data/trackers/mot_challenge/'),  # Trackers location
+        'SEQMAP_FILE': None,  # Directly specify seqmap file (if none use seqmap_folder/benchmark-split_to_eval)
+        'GT_LOC_FORMAT': '{gt_folder}/{seq}/gt/gt.txt',  # '{gt_folder}/{seq}/gt/gt.txt'
+        'TRACKERS_TO_EVAL': [],  # Filenames of trackers whose data is packed (each into its own folder)
+        'PACKED_SUB_FOLDER': 'packed',  # Packed data is written to TRACKERS_FOLDER/tracker_name/PACKED_SUB_FOLDER
+"""
+
+import sys
+import os
+import argparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import trackeval  # noqa: E402
+
+if __name__ == '__main__':
+
+    # Command line interface:
+    config = trackeval.datasets.MotChallenge2DBox_my.get_default_dataset_config()
+    parser = argparse.ArgumentParser()
+    for setting in config.keys():
+        if type(config[setting]) == list or type(config[setting]) == type(None):
+            parser.add_argument("--" + setting, nargs='+')
+        else:
+            parser.add_argument("--" + setting)
+    args = parser.parse_args().__dict__
+    for setting in args.keys():
+        if args[setting] is not None:
+            if type(config[setting]) == type(True):
+                if args[setting] == 'True':
+                    x = True
+                elif args[setting] == 'False':
+                    x = False
+                else:
+                    raise Exception('Command line parameter ' + setting + 'must be True or False')
+            elif type(config[setting]) == type(1):
+                x = int(args[setting])
+            elif type(args[setting]) == type(None):
+                x = None
+            elif setting == 'SEQ_INFO':
+                x = dict(zip(args[setting], [None]*len(args[setting])))
+            elif setting in ['SEQMAP_FILE', 'SEQMAP_FOLDER']:
+                x = args[setting][0]
+            else:
+                x = args[setting]
+            config[setting] = x
+    config['INPUT_AS_PACKED'] = False
+
+    # Run code
+    dataset = trackeval.datasets.MotChallenge2DBox_my(config)
+    dataset.write_packed_data()
@@ -31,6 +31,8 @@ Command Line Arguments: Defaults, # Comments
         'OUTPUT_SUB_FOLDER': '',  # Output files are saved in OUTPUT_FOLDER/tracker_name/OUTPUT_SUB_FOLDER
     Metric arguments:
         'METRICS': ['HOTA', 'CLEAR', 'Identity', 'VACE']
+        'THRESHOLD': 0.5,  # Threshold of CLEAR and Identity. Several thresholds (e.g. --THRESHOLD 0.3 0.5 0.7) are
+                           # evaluated in one pass, giving results for each threshold.
 """
 
 import sys
@@ -52,7 +54,7 @@ if __name__ == '__main__':
     config = {**default_eval_config, **default_dataset_config, **default_metrics_config}  # Merge default configs
     parser = argparse.ArgumentParser()
     for setting in config.keys():
-        if type(config[setting]) == list:
+        if type(config[setting]) == list or setting == 'THRESHOLD':
             parser.add_argument("--" + setting, nargs='+')
         else:
             parser.add_argument("--" + setting)
@@ -70,6 +72,8 @@ if __name__ == '__main__':
                 x = int(args[setting])
             elif type(args[setting]) == type(None):
                 x = None
+            elif setting == 'THRESHOLD':
+                x = float(args[setting][0]) if len(args[setting]) == 1 else [float(t) for t in args[setting]]
             elif setting == 'SEQ_INFO':
                 x = dict(zip(args[setting], [None]*len(args[setting])))
             else:
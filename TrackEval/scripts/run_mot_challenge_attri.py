@@ -1,8 +1,14 @@
 
-""" run_mot_challenge.py
+""" run_mot_challenge_attri.py
+
+Evaluates RMOT results (MotChallenge2DBox_my), both on all timesteps and on the timesteps of each attribute, in a single
+run. The data of each sequence is only loaded once and then masked per attribute (see eval_sequence_attributes), so no
+filtered copies of the gt/predict files (scripts/attridata.py) are needed.
 
 Run example:
-run_mot_challenge.py --USE_PARALLEL False --METRICS Hota --TRACKERS_TO_EVAL Lif_T
+run_mot_challenge_attri.py --METRICS HOTA --SEQMAP_FILE seqmap.txt --SKIP_SPLIT_FOL True --TRACKERS_FOLDER results_epoch80
+    --GT_LOC_FORMAT {gt_folder}{video_id}/{expression_id}/gt.txt --TRACKERS_TO_EVAL results_epoch80
+    --ATTRIBUTE_FOLDER /path/to/AerialMind/Attribute
 
 Command Line Arguments: Defaults, # Comments
     Eval arguments:
@@ -29,8 +35,15 @@ Command Line Arguments: Defaults, # Comments
         'DO_PREPROC': True,  # Whether to perform preprocessing (never done for 2D_MOT_2015)
         'TRACKER_SUB_FOLDER': 'data',  # Tracker files are in TRACKER_FOLDER/tracker_name/TRACKER_SUB_FOLDER
         'OUTPUT_SUB_FOLDER': '',  # Output files are saved in OUTPUT_FOLDER/tracker_name/OUTPUT_SUB_FOLDER
+        'IMAGE_FOLDER': '/home/data/UAV-RMOT/rmot_train/training/image_02',  # Used to get UAV sequence lengths
+        'ATTRIBUTE_FOLDER': None,  # Folder with the <video>.txt attribute files. Results for each attribute are saved
+                                   # in OUTPUT_FOLDER/tracker_name/OUTPUT_SUB_FOLDER/<attribute>
+        'ATTRIBUTES': ['Day', 'Night', 'ViewPoint_Change', 'Scale_Variation', 'Occlusion', 'Fast_Motion',
+                       'Rotation', 'Low_Resolution'],  # Names of the columns of the attribute files
     Metric arguments:
         'METRICS': ['HOTA', 'CLEAR', 'Identity', 'VACE']
+        'THRESHOLD': 0.5,  # Threshold of CLEAR and Identity. Several thresholds (e.g. --THRESHOLD 0.3 0.5 0.7) are
+                           # evaluated in one pass, giving results for each threshold.
 """
 
 import sys
@@ -47,12 +60,12 @@ if __name__ == '__main__':
     # Command line interface:
     default_eval_config = trackeval.Evaluator.get_default_eval_config()
     default_eval_config['DISPLAY_LESS_PROGRESS'] = False
-    default_dataset_config = trackeval.datasets.MotChallenge2DBox.get_default_dataset_config()
+    default_dataset_config = trackeval.datasets.MotChallenge2DBox_my.get_default_dataset_config()
     default_metrics_config = {'METRICS': ['HOTA', 'CLEAR', 'Identity'], 'THRESHOLD': 0.5}
     config = {**default_eval_config, **default_dataset_config, **default_metrics_config}  # Merge default configs
     parser = argparse.ArgumentParser()
     for setting in config.keys():
-        if type(config[setting]) == list or type(config[setting]) == type(None):
+        if type(config[setting]) == list or type(config[setting]) == type(None) or setting == 'THRESHOLD':
             parser.add_argument("--" + setting, nargs='+')
         else:
             parser.add_argument("--" + setting)
@@ -70,8 +83,12 @@ if __name__ == '__main__':
                 x = int(args[setting])
             elif type(args[setting]) == type(None):
                 x = None
+            elif setting == 'THRESHOLD':
+                x = float(args[setting][0]) if len(args[setting]) == 1 else [float(t) for t in args[setting]]
             elif setting == 'SEQ_INFO':
                 x = dict(zip(args[setting], [None]*len(args[setting])))
+            elif setting in ['SEQMAP_FILE', 'SEQMAP_FOLDER', 'OUTPUT_FOLDER', 'ATTRIBUTE_FOLDER']:
+                x = args[setting][0]
             else:
                 x = args[setting]
             config[setting] = x
@@ -81,7 +98,7 @@ if __name__ == '__main__':
 
     # Run code
     evaluator = trackeval.Evaluator(eval_config)
-    dataset_list = [trackeval.datasets.MotChallenge2DBox(dataset_config)]
+    dataset_list = [trackeval.datasets.MotChallenge2DBox_my(dataset_config)]
     metrics_list = []
     for metric in [trackeval.metrics.HOTA, trackeval.metrics.CLEAR, trackeval.metrics.Identity, trackeval.metrics.VACE]:
         if metric.get_name() in metrics_config['METRICS']:
@@ -0,0 +1,108 @@
+""" Helpers for the tests of MotChallenge2DBox_my: writing a small generated dataset (the gt and tracker files of a few
+videos with a few expressions each, as in the RMOT results folders), evaluating it and comparing results.
+"""
+
+import sys
+import os
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import trackeval  # noqa: E402
+
+VIDEO_LENGTHS = {'uav0000001_00000_v': 30, 'uav0000002_00000_v': 20, 'M0101': 45}
+
+
+def write_dataset(data_fol, rng, num_expressions=3):
+    """ Writes the gt and tracker files of each expression of each video into data_fol/<video>/<expression>/, and
+    returns the sequence lengths (for SEQ_INFO).
+    Some gt objects are of distractor classes or zero marked, and some tracker dets are false positives or have
+    switched ids, so that preprocessing and all metrics have something to do.
+    """
+    seq_lengths = {}
+    for video, num_frames in VIDEO_LENGTHS.items():
+        num_objects = 12
+        starts = rng.integers(1, num_frames, num_objects)
+        ends = np.minimum(num_frames, starts + rng.integers(3, num_frames, num_objects))
+        positions = rng.uniform(0, 500, (num_objects, 2))
+        velocities = rng.normal(0, 4, (num_objects, 2))
+        sizes = rng.uniform(10, 60, (num_objects, 2))
+        classes = rng.choice([1, 1, 1, 1, 2, 7, 8], num_objects)
+        for e in range(num_expressions):
+            expression = 'Expression number %i of %s' % (e, video)
+            seq_lengths[video + '+' + expression] = num_frames
+            expression_fol = os.path.join(data_fol, video, expression)
+            os.makedirs(expression_fol)
+            object_ids = rng.choice(num_objects, rng.integers(1, 7), replace=False)
+            gt_rows = []
+            tracker_rows = []
+            for frame in range(1, num_frames + 1):
+                for obj in object_ids:
+                    if starts[obj] <= frame <= ends[obj]:
+                        box = np.concatenate((positions[obj] + velocities[obj] * frame, sizes[obj]))
+                        zero_marked = int(rng.random() > 0.05)
+                        gt_rows.append('%i,%i,%.2f,%.2f,%.2f,%.2f,%i,%i,1.0' % (frame, obj + 1, *box, zero_marked,
+                                                                                classes[obj]))
+                        if rng.random() < 0.9:
+                            tracker_id = obj + 1 + (100 if rng.random() < 0.05 else 0)
+                            box = box + rng.normal(0, 3, 4)
+                            tracker_rows.append('%i,%i,%.2f,%.2f,%.2f,%.2f,1,-1,-1,-1' % (frame, tracker_id, *box))
+                if rng.random() < 0.2:
+                    box = np.concatenate((rng.uniform(0, 500, 2), rng.uniform(10, 50, 2)))
+                    tracker_rows.append('%i,%i,%.2f,%.2f,%.2f,%.2f,1,-1,-1,-1' % (frame, 500 + frame, *box))
+            with open(os.path.join(expression_fol, 'gt.txt'), 'w') as fp:
+                fp.write(''.join(row + '\n' for row in gt_rows))
+            with open(os.path.join(expression_fol, 'predict.txt'), 'w') as fp:
+                fp.write(''.join(row + '\n' for row in tracker_rows))
+    return seq_lengths
+
+
+def write_attributes(attribute_fol, rng, num_attributes=8):
+    """ Writes the attribute files (one row of 0/1 flags per frame) of the videos written by write_dataset into
+    attribute_fol. The file of the second video ends before the video, and the last video has no attribute file.
+    """
+    os.makedirs(attribute_fol)
+    for v, (video, num_frames) in enumerate(list(VIDEO_LENGTHS.items())[:-1]):
+        num_flagged = num_frames if v == 0 else num_frames // 2
+        flags = rng.random((num_flagged, num_attributes)) < rng.uniform(0.2, 0.8, num_attributes)
+        with open(os.path.join(attribute_fol, video + '.txt'), 'w') as fp:
+            fp.write(''.join(','.join(str(int(flag)) for flag in flags_t) + '\n' for flags_t in flags))
+
+
+def get_dataset_config(data_fol, seq_lengths, **config):
+    """The config of MotChallenge2DBox_my for a dataset written by write_dataset, with the given config values"""
+    dataset_config = {'GT_FOLDER': data_fol, 'TRACKERS_FOLDER': data_fol, 'SKIP_SPLIT_FOL': True,
+                      'TRACKERS_TO_EVAL': ['tracker'], 'SEQ_INFO': dict(seq_lengths), 'PRINT_CONFIG': False,
+                      'GT_LOC_FORMAT': '{gt_folder}/{video_id}/{expression_id}/gt.txt'}
+    dataset_config.update(config)
+    return dataset_config
+
+
+def get_metrics():
+    """The metrics to evaluate in the tests"""
+    return [trackeval.metrics.HOTA({'PRINT_CONFIG': False}),
+            trackeval.metrics.CLEAR({'PRINT_CONFIG': False}),
+            trackeval.metrics.Identity({'PRINT_CONFIG': False}),
+            trackeval.metrics.VACE()]
+
+
+def evaluate(dataset_config, metrics_list=None, **eval_config):
+    """ Evaluates MotChallenge2DBox_my with the given dataset config and eval config values (without any output),
+    and returns the results and messages of each tracker. metrics_list defaults to get_metrics().
+    """
+    config = {'USE_PARALLEL': False, 'PRINT_CONFIG': False, 'PRINT_RESULTS': False, 'TIME_PROGRESS': False,
+              'OUTPUT_SUMMARY': False, 'OUTPUT_DETAILED': False, 'PLOT_CURVES': False, 'LOG_ON_ERROR': None}
+    config.update(eval_config)
+    dataset = trackeval.datasets.MotChallenge2DBox_my(dataset_config)
+    res, msg = trackeval.Evaluator(config).evaluate([dataset], metrics_list or get_metrics())
+    return res['MotChallenge2DBox_my'], msg['MotChallenge2DBox_my']
+
+
+def assert_results_equal(res, expected, path=''):
+    """Checks that two (nested dicts of) results are equal, up to floating point rounding"""
+    if isinstance(expected, dict):
+        assert set(res.keys()) == set(expected.keys()), path
+        for key in expected.keys():
+            assert_results_equal(res[key], expected[key], path + '/' + str(key))
+    else:
+        np.testing.assert_allclose(np.asarray(res, dtype=float), np.asarray(expected, dtype=float), rtol=0,
+                                   atol=1e-10, equal_nan=True, err_msg=path)
@@ -0,0 +1,91 @@
+""" Tests of the timestep by timestep evaluation of the metrics: each metric's accumulator is compared to its
+eval_sequence, on random preprocessed data.
+Can be run with pytest, or directly as a script.
+"""
+
+import sys
+import os
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import trackeval  # noqa: E402
+from mot_challenge_my_data import assert_results_equal  # noqa: E402
+
+
+def _get_metrics():
+    """All metrics with accumulators, also with multiple thresholds"""
+    return [trackeval.metrics.HOTA({'PRINT_CONFIG': False}),
+            trackeval.metrics.CLEAR({'PRINT_CONFIG': False}),
+            trackeval.metrics.CLEAR({'THRESHOLD': [0.3, 0.5, 0.75], 'PRINT_CONFIG': False}),
+            trackeval.metrics.Identity({'PRINT_CONFIG': False}),
+            trackeval.metrics.Identity({'THRESHOLD': [0.3, 0.5, 0.75], 'PRINT_CONFIG': False}),
+            trackeval.metrics.VACE(),
+            trackeval.metrics.Count()]
+
+
+def _random_sequence(rng, num_timesteps, num_gt_ids=8, num_tracker_ids=10):
+    """ Random preprocessed data of a sequence, with empty timesteps and sparse (partly tied) similarity scores.
+    All ids are present in the first timestep, as for relabelled ids of every prefix of the sequence.
+    """
+    data = {'gt_ids': [], 'tracker_ids': [], 'similarity_scores': []}
+    for t in range(num_timesteps):
+        gt_ids = np.sort(rng.choice(num_gt_ids, rng.integers(0, num_gt_ids + 1), replace=False))
+        tracker_ids = np.sort(rng.choice(num_tracker_ids, rng.integers(0, num_tracker_ids + 1), replace=False))
+        if t == 0:
+            gt_ids = np.arange(num_gt_ids)
+            tracker_ids = np.arange(num_tracker_ids)
+        if t % 7 == 3:
+            gt_ids = gt_ids[:0]
+        if t % 11 == 5:
+            tracker_ids = tracker_ids[:0]
+        similarity_scores = np.round(rng.random((len(gt_ids), len(tracker_ids))), 1)
+        similarity_scores[similarity_scores < 0.4] = 0
+        data['gt_ids'].append(gt_ids)
+        data['tracker_ids'].append(tracker_ids)
+        data['similarity_scores'].append(similarity_scores)
+    data['num_gt_ids'] = num_gt_ids
+    data['num_tracker_ids'] = num_tracker_ids
+    data['num_gt_dets'] = sum(len(gt_ids) for gt_ids in data['gt_ids'])
+    data['num_tracker_dets'] = sum(len(tracker_ids) for tracker_ids in data['tracker_ids'])
+    data['num_timesteps'] = num_timesteps
+    data['seq'] = 'test'
+    return data
+
+
+def _get_prefix(data, num_timesteps):
+    """The data of the first timesteps of a sequence (with the same number of ids)"""
+    prefix = {key: data[key][:num_timesteps] for key in ['gt_ids', 'tracker_ids', 'similarity_scores']}
+    prefix['num_gt_ids'] = data['num_gt_ids']
+    prefix['num_tracker_ids'] = data['num_tracker_ids']
+    prefix['num_gt_dets'] = sum(len(gt_ids) for gt_ids in prefix['gt_ids'])
+    prefix['num_tracker_dets'] = sum(len(tracker_ids) for tracker_ids in prefix['tracker_ids'])
+    prefix['num_timesteps'] = num_timesteps
+    prefix['seq'] = data['seq']
+    return prefix
+
+
+def test_accumulators():
+    rng = np.random.default_rng(0)
+    for num_timesteps in [1, 25, 60]:
+        data = _random_sequence(rng, num_timesteps)
+        for metric in _get_metrics():
+            accumulator = metric.get_accumulator()
+            if hasattr(accumulator, 'CONSOLIDATE_INTERVAL'):
+                accumulator.CONSOLIDATE_INTERVAL = 4  # Also test merging the matches of several timesteps.
+            for t in range(num_timesteps):
+                accumulator.update({'gt_ids': data['gt_ids'][t],
+                                    'tracker_ids': data['tracker_ids'][t],
+                                    'similarity_scores': data['similarity_scores'][t],
+                                    'num_gt_ids': data['num_gt_ids'],
+                                    'num_tracker_ids': data['num_tracker_ids']})
+                # Running results are the results of the timesteps seen so far.
+                if t % 10 == 0:
+                    assert_results_equal(accumulator.result(), metric.eval_sequence(_get_prefix(data, t + 1)),
+                                         metric.get_name())
+            assert_results_equal(accumulator.result(), metric.eval_sequence(data), metric.get_name())
+
+if __name__ == '__main__':
+    for test_name, test_func in list(globals().items()):
+        if test_name.startswith('test_'):
+            test_func()
+            print('%s passed' % test_name)
@@ -0,0 +1,63 @@
+""" Tests of max_score_assignment, against the Hungarian algorithm of scipy.
+Can be run with pytest, or directly as a script.
+"""
+
+import sys
+import os
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from trackeval import _assignment  # noqa: E402
+
+
+def _check_max_score_assignment(score_mat):
+    """Checks that max_score_assignment finds a valid one-to-one matching with the same score as the Hungarian one"""
+    match_rows, match_cols = _assignment.max_score_assignment(score_mat)
+    match_rows, match_cols = np.asarray(match_rows), np.asarray(match_cols)
+    assert len(np.unique(match_rows)) == len(match_rows)
+    assert len(np.unique(match_cols)) == len(match_cols)
+    assert np.all(np.diff(match_rows) > 0)
+    expected_rows, expected_cols = linear_sum_assignment(-score_mat)
+    assert score_mat[match_rows, match_cols].sum() == score_mat[expected_rows, expected_cols].sum()
+
+
+def test_max_score_assignment_random():
+    rng = np.random.default_rng(0)
+    for _ in range(500):
+        shape = rng.integers(1, 8, 2)
+        score_mat = rng.random(shape)
+        score_mat[score_mat < rng.random()] = 0  # Sparse matrices are mostly conflict free.
+        _check_max_score_assignment(score_mat)
+
+
+def test_max_score_assignment_ties():
+    rng = np.random.default_rng(1)
+    for _ in range(500):
+        shape = rng.integers(1, 6, 2)
+        _check_max_score_assignment(rng.integers(0, 3, shape).astype(float))
+    _check_max_score_assignment(np.ones((1, 4)))
+    _check_max_score_assignment(np.ones((4, 1)))
+    _check_max_score_assignment(np.ones((3, 3)))
+
+
+def test_max_score_assignment_all_zero():
+    for shape in [(1, 1), (1, 5), (5, 1), (4, 6)]:
+        match_rows, match_cols = _assignment.max_score_assignment(np.zeros(shape))
+        assert len(match_rows) == 0 and len(match_cols) == 0
+
+
+def test_max_score_assignment_non_square():
+    rng = np.random.default_rng(2)
+    for shape in [(2, 9), (9, 2), (1, 7), (7, 1), (3, 50)]:
+        for _ in range(50):
+            _check_max_score_assignment(rng.random(shape) * (rng.random(shape) < 0.5))
+    for shape in [(0, 3), (3, 0)]:
+        match_rows, match_cols = _assignment.max_score_assignment(np.zeros(shape))
+        assert len(match_rows) == 0 and len(match_cols) == 0
+
+if __name__ == '__main__':
+    for test_name, test_func in list(globals().items()):
+        if test_name.startswith('test_'):
+            test_func()
+            print('%s passed' % test_name)
@@ -0,0 +1,112 @@
+""" Tests of the evaluation of attribute slices (ATTRIBUTE_FOLDER) of MotChallenge2DBox_my, on a small generated
+dataset.
+Can be run with pytest, or directly as a script.
+"""
+
+import sys
+import os
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'scripts')))
+import trackeval  # noqa: E402
+import attridata  # noqa: E402
+from trackeval.eval import eval_sequence, eval_sequence_attributes  # noqa: E402
+from mot_challenge_my_data import write_dataset, write_attributes, get_dataset_config, get_metrics, evaluate, \
+    assert_results_equal  # noqa: E402
+
+
+def test_attributes_match_attridata():
+    """ Evaluating the attributes in one pass gives the same results as the copy-and-rerun pipeline of
+    scripts/attridata.py: copying the gt and tracker rows of the frames of each attribute into a folder per attribute,
+    and evaluating each of these folders (on the sequences which have any rows left) separately.
+    """
+    with tempfile.TemporaryDirectory() as root:
+        data_fol = os.path.join(root, 'results')
+        attribute_fol = os.path.join(root, 'Attribute')
+        rng = np.random.default_rng(0)
+        seq_lengths = write_dataset(data_fol, rng)
+        write_attributes(attribute_fol, rng)
+        res, _ = evaluate(get_dataset_config(data_fol, seq_lengths, ATTRIBUTE_FOLDER=attribute_fol))
+        attribute_res = res['tracker'].pop('ATTRIBUTES')
+
+        # The results of all timesteps are unchanged.
+        expected, _ = evaluate(get_dataset_config(data_fol, seq_lengths))
+        assert_results_equal(res, expected)
+
+        attridata.INPUT_RESULTS_DIR = data_fol
+        attridata.INPUT_ATTRIBUTES_DIR = attribute_fol
+        attridata.PROCESSED_DATA_ROOT = os.path.join(root, 'processed_attribute_results')
+        assert attridata.preprocess_data_by_attribute()
+        attributes = trackeval.datasets.MotChallenge2DBox_my.get_default_dataset_config()['ATTRIBUTES']
+        assert set(attribute_res.keys()) == set(attributes)
+        for attribute in attributes:
+            processed_fol = os.path.join(attridata.PROCESSED_DATA_ROOT, attribute)
+            attribute_seqs = {seq: seq_length for seq, seq_length in seq_lengths.items()
+                              if os.path.isdir(os.path.join(processed_fol, *seq.split('+')))}
+            if len(attribute_seqs) == 0:
+                assert attribute_res[attribute] == {}, attribute
+                continue
+            expected, _ = evaluate(get_dataset_config(processed_fol, attribute_seqs))
+            assert_results_equal(attribute_res[attribute], expected['tracker'], attribute)
+
+
+def _get_raw_timestep_subset(raw_data, timestep_mask):
+    """The raw data of a sequence with all dets removed from the timesteps not selected by timestep_mask"""
+    subset_data = {}
+    for key, value in raw_data.items():
+        if isinstance(value, list):
+            subset_data[key] = [v if timestep_mask[t] else
+                                {k: x[:0] for k, x in v.items()} if isinstance(v, dict) else v[:0, :0] if
+                                key == 'similarity_scores' else v[:0] for t, v in enumerate(value)]
+        else:
+            subset_data[key] = value
+    subset_data['gt_preproc'] = {}
+    return subset_data
+
+
+def test_attribute_slices():
+    """ The data of each attribute (the preprocessed data of the sequence with the timesteps without that attribute
+    masked out) is the same as preprocessing the sequence with the dets of those timesteps removed, and shares the
+    similarity scores of the sequence. The full sequence ('All') gives the same results as eval_sequence.
+    """
+    with tempfile.TemporaryDirectory() as root:
+        data_fol = os.path.join(root, 'results')
+        attribute_fol = os.path.join(root, 'Attribute')
+        rng = np.random.default_rng(1)
+        seq_lengths = write_dataset(data_fol, rng)
+        write_attributes(attribute_fol, rng)
+        dataset = trackeval.datasets.MotChallenge2DBox_my(get_dataset_config(data_fol, seq_lengths,
+                                                                             ATTRIBUTE_FOLDER=attribute_fol))
+        metrics_list = get_metrics()
+        metric_names = trackeval.utils.validate_metrics_list(metrics_list)
+        for seq in seq_lengths.keys():
+            raw_data = dataset.get_raw_seq_data('tracker', seq)
+            data = dataset.get_preprocessed_seq_data(raw_data, 'pedestrian')
+            attribute_masks = dataset.get_attribute_masks(seq)
+            masks = [attribute_masks[:, a] for a in range(attribute_masks.shape[1])]
+            masks += [np.zeros(seq_lengths[seq], dtype=bool), rng.random(seq_lengths[seq]) < 0.1]
+            for mask in masks:
+                subset_data = dataset.get_preprocessed_timestep_subset(data, mask)
+                expected = dataset.get_preprocessed_seq_data(_get_raw_timestep_subset(raw_data, mask), 'pedestrian')
+                assert set(subset_data.keys()) == set(expected.keys())
+                for key, value in expected.items():
+                    if isinstance(value, list):
+                        for value_t, subset_value_t in zip(value, subset_data[key]):
+                            np.testing.assert_array_equal(subset_value_t, value_t, err_msg=key)
+                    else:
+                        assert subset_data[key] == value, key
+                for t in np.flatnonzero(mask):
+                    assert subset_data['similarity_scores'][t] is data['similarity_scores'][t]
+
+            res = eval_sequence_attributes(seq, dataset, 'tracker', ['pedestrian'], metrics_list, metric_names)
+            expected = eval_sequence(seq, dataset, 'tracker', ['pedestrian'], metrics_list, metric_names)
+            assert_results_equal(res['All'], expected)
+
+
+if __name__ == '__main__':
+    for test_name, test_func in list(globals().items()):
+        if test_name.startswith('test_'):
+            test_func()
+            print('%s passed' % test_name)
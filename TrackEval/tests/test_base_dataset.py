@@ -0,0 +1,196 @@
+""" Tests of the helper functions of _BaseDataset which are shared by the datasets.
+Can be run with pytest, or directly as a script.
+"""
+
+import sys
+import os
+import tempfile
+from copy import deepcopy
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from trackeval.datasets._base_dataset import _BaseDataset  # noqa: E402
+from trackeval.utils import TrackEvalException  # noqa: E402
+
+
+def _load_text(text):
+    """Loads the given text with _load_text_file_as_array, from a temporary file"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file = os.path.join(tmp_dir, 'data.txt')
+        with open(file, 'w', newline='') as fp:
+            fp.write(text)
+        return _BaseDataset._load_text_file_as_array(file)
+
+
+def test_load_text_file_as_array():
+    data = _load_text('1,2,3.5,-4\n\n5 6 7 8,\n9, 10,11 ,1e2\n')
+    np.testing.assert_array_equal(data, [[1, 2, 3.5, -4], [5, 6, 7, 8], [9, 10, 11, 100]])
+    np.testing.assert_array_equal(_load_text('1,2\r\n3,4\r\n'), [[1, 2], [3, 4]])
+    np.testing.assert_array_equal(_load_text('1\t2,\n3\t4'), [[1, 2], [3, 4]])  # No newline at the end.
+    assert _load_text('').shape == (0, 0)
+    assert _load_text('\n \n').shape == (0, 0)
+
+
+def test_load_text_file_as_array_invalid():
+    for text in ['1,2,3,4,5,6,7,8,9\n1,2,3,4,5,6,7\n',  # Same total as 2 rows of 8 values.
+                 '1,2,3,4,5,6,7,8,9,10\n1,2,3,4,5,6,7,8\n',
+                 '1,2,3\n4,5\n',
+                 '\n1,2,3\n4,5,6\n\n7,8\n',
+                 '1,2,a\n',
+                 '1,a,2\n3,4,5\n',
+                 '1-2,3\n']:
+        try:
+            _load_text(text)
+        except ValueError:
+            continue
+        raise AssertionError('No ValueError for invalid text: %r' % text)
+    try:
+        _BaseDataset._load_text_file_as_array(os.path.join(tempfile.gettempdir(), 'missing_trackeval_file.txt'))
+    except TrackEvalException:
+        pass
+    else:
+        raise AssertionError('No TrackEvalException for a missing file')
+
+
+def test_split_by_timestep():
+    data = np.array([[2, 1], [1, 2], [2, 3], [5, 4], [1, 5]], dtype=float)
+    timesteps, time_data = _BaseDataset._split_by_timestep(data)
+    np.testing.assert_array_equal(timesteps, [1, 2, 5])
+    np.testing.assert_array_equal(time_data[0][:, 1], [2, 5])  # Dets keep their order within each timestep.
+    np.testing.assert_array_equal(time_data[1][:, 1], [1, 3])
+    np.testing.assert_array_equal(time_data[2][:, 1], [4])
+
+    # Sorted data is split into views.
+    sorted_data = data[np.argsort(data[:, 0], kind='stable')]
+    timesteps, time_data = _BaseDataset._split_by_timestep(sorted_data)
+    np.testing.assert_array_equal(timesteps, [1, 2, 5])
+    assert all(np.shares_memory(time_data_t, sorted_data) for time_data_t in time_data)
+
+    # Other time column.
+    timesteps, time_data = _BaseDataset._split_by_timestep(data[:, ::-1], time_col=1)
+    np.testing.assert_array_equal(timesteps, [1, 2, 5])
+
+    timesteps, time_data = _BaseDataset._split_by_timestep(np.empty((0, 0)))
+    assert len(timesteps) == 0 and time_data == []
+
+
+def _relabel_ids_with_id_map(ids):
+    """The relabelling of the ids (a list for each timestep) with an id map, as in the original preprocessing"""
+    unique_ids = np.unique(np.concatenate([np.empty(0, dtype=int)] + list(ids)).astype(int))
+    id_map = np.nan * np.ones(max(unique_ids, default=-1) + 1)
+    id_map[unique_ids] = np.arange(len(unique_ids))
+    return [id_map[ids_t.astype(int)].astype(int) for ids_t in ids], len(unique_ids)
+
+
+def test_relabel_ids():
+    rng = np.random.default_rng(0)
+    for num_timesteps in [0, 1, 20]:
+        for offset in [0, 1000000 * 17]:  # Also large ids, as with per-video id offsets.
+            data = {'gt_ids': [], 'tracker_ids': []}
+            for t in range(num_timesteps):
+                for key in ['gt_ids', 'tracker_ids']:
+                    num_ids = 0 if t % 5 == 2 else rng.integers(0, 10)
+                    ids_t = rng.choice(np.arange(1, 200), num_ids, replace=False) + offset  # Not sorted.
+                    data[key].append(ids_t.astype(float) if key == 'tracker_ids' else ids_t)
+            expected = {key: _relabel_ids_with_id_map([ids_t - offset for ids_t in data[key]])
+                        for key in ['gt_ids', 'tracker_ids']}
+            _BaseDataset._relabel_ids(data)
+            for id_key, num_key in [('gt_ids', 'num_gt_ids'), ('tracker_ids', 'num_tracker_ids')]:
+                expected_ids, expected_num_ids = expected[id_key]
+                assert data[num_key] == expected_num_ids
+                assert len(data[id_key]) == num_timesteps
+                for ids_t, expected_ids_t in zip(data[id_key], expected_ids):
+                    np.testing.assert_array_equal(ids_t, expected_ids_t)
+                    assert ids_t.dtype.kind == 'i'
+
+
+def _random_boxes(rng, num_boxes, box_format):
+    """Random boxes (some of them with zero width or height) in the given format"""
+    boxes = np.round(rng.uniform(0, 50, (num_boxes, 4)))
+    boxes[rng.random(num_boxes) < 0.1, 2] = 0
+    if box_format == 'x0y0x1y1':
+        boxes[:, 2:] += boxes[:, :2]
+    return boxes
+
+
+def _calculate_box_ious_original(bboxes1, bboxes2, box_format='xywh', do_ioa=False):
+    """The original implementation of _calculate_box_ious"""
+    if box_format in 'xywh':
+        bboxes1 = deepcopy(bboxes1)
+        bboxes2 = deepcopy(bboxes2)
+        bboxes1[:, 2] = bboxes1[:, 0] + bboxes1[:, 2]
+        bboxes1[:, 3] = bboxes1[:, 1] + bboxes1[:, 3]
+        bboxes2[:, 2] = bboxes2[:, 0] + bboxes2[:, 2]
+        bboxes2[:, 3] = bboxes2[:, 1] + bboxes2[:, 3]
+    min_ = np.minimum(bboxes1[:, np.newaxis, :], bboxes2[np.newaxis, :, :])
+    max_ = np.maximum(bboxes1[:, np.newaxis, :], bboxes2[np.newaxis, :, :])
+    intersection = np.maximum(min_[..., 2] - max_[..., 0], 0) * np.maximum(min_[..., 3] - max_[..., 1], 0)
+    area1 = (bboxes1[..., 2] - bboxes1[..., 0]) * (bboxes1[..., 3] - bboxes1[..., 1])
+    if do_ioa:
+        ioas = np.zeros_like(intersection)
+        valid_mask = area1 > 0 + np.finfo('float').eps
+        ioas[valid_mask, :] = intersection[valid_mask, :] / area1[valid_mask][:, np.newaxis]
+        return ioas
+    else:
+        area2 = (bboxes2[..., 2] - bboxes2[..., 0]) * (bboxes2[..., 3] - bboxes2[..., 1])
+        union = area1[:, np.newaxis] + area2[np.newaxis, :] - intersection
+        intersection[area1 <= 0 + np.finfo('float').eps, :] = 0
+        intersection[:, area2 <= 0 + np.finfo('float').eps] = 0
+        intersection[union <= 0 + np.finfo('float').eps] = 0
+        union[union <= 0 + np.finfo('float').eps] = 1
+        ious = intersection / union
+        return ious
+
+
+def test_calculate_box_ious():
+    rng = np.random.default_rng(1)
+    for box_format in ['xywh', 'x0y0x1y1']:
+        for do_ioa in [False, True]:
+            for num_boxes1, num_boxes2 in [(0, 0), (0, 4), (4, 0), (1, 1), (7, 5), (30, 40)]:
+                bboxes1 = _random_boxes(rng, num_boxes1, box_format)
+                bboxes2 = _random_boxes(rng, num_boxes2, box_format)
+                bboxes1_copy, bboxes2_copy = bboxes1.copy(), bboxes2.copy()
+                ious = _BaseDataset._calculate_box_ious(bboxes1, bboxes2, box_format, do_ioa)
+                expected = _calculate_box_ious_original(bboxes1, bboxes2, box_format, do_ioa)
+                assert ious.shape == (num_boxes1, num_boxes2)
+                np.testing.assert_allclose(ious, expected, rtol=0, atol=1e-12)
+                np.testing.assert_array_equal(bboxes1, bboxes1_copy)  # The boxes are not modified.
+                np.testing.assert_array_equal(bboxes2, bboxes2_copy)
+
+            # Identical boxes.
+            bboxes = _random_boxes(rng, 5, box_format)
+            bboxes = bboxes[(bboxes[:, 2] != 0) if box_format == 'xywh' else (bboxes[:, 2] != bboxes[:, 0])]
+            ious = _BaseDataset._calculate_box_ious(bboxes, bboxes, box_format, do_ioa)
+            np.testing.assert_allclose(np.diag(ious), 1)
+    try:
+        _BaseDataset._calculate_box_ious(np.zeros((1, 4)), np.zeros((1, 4)), 'xyxy')
+    except TrackEvalException:
+        pass
+    else:
+        raise AssertionError('No TrackEvalException for an unknown box format')
+
+
+def test_calculate_box_ious_batched():
+    rng = np.random.default_rng(3)
+    for box_format in ['xywh', 'x0y0x1y1']:
+        for do_ioa in [False, True]:
+            num_boxes1 = rng.integers(0, 6, 20)
+            num_boxes2 = rng.integers(0, 6, 20)
+            bboxes1 = [_random_boxes(rng, n, box_format) for n in num_boxes1]
+            bboxes2 = [_random_boxes(rng, n, box_format) for n in num_boxes2]
+            offsets1 = np.concatenate([[0], np.cumsum(num_boxes1)])
+            offsets2 = np.concatenate([[0], np.cumsum(num_boxes2)])
+            for max_pairs in [1, 7, 40, 2 ** 22]:  # Chunks of single (also larger) frames, several frames, all frames.
+                ious = _BaseDataset._calculate_box_ious_batched(np.concatenate(bboxes1), np.concatenate(bboxes2),
+                                                                offsets1, offsets2, box_format, do_ioa, max_pairs)
+                assert len(ious) == len(bboxes1)
+                for bboxes1_t, bboxes2_t, ious_t in zip(bboxes1, bboxes2, ious):
+                    expected = _BaseDataset._calculate_box_ious(bboxes1_t, bboxes2_t, box_format, do_ioa)
+                    np.testing.assert_array_equal(ious_t, expected)
+
+
+if __name__ == '__main__':
+    for test_name, test_func in list(globals().items()):
+        if test_name.startswith('test_'):
+            test_func()
+            print('%s passed' % test_name)
@@ -0,0 +1,162 @@
+""" Tests of the Evaluator options (result cache, parallel evaluation and evaluating all trackers together), on a small
+generated MotChallenge2DBox_my dataset.
+Can be run with pytest, or directly as a script.
+"""
+
+import sys
+import os
+import pickle
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import trackeval  # noqa: E402
+from trackeval.utils import TrackEvalException  # noqa: E402
+from mot_challenge_my_data import write_dataset, get_dataset_config, evaluate, assert_results_equal  # noqa: E402
+
+
+def test_result_cache():
+    with tempfile.TemporaryDirectory() as root:
+        data_fol = os.path.join(root, 'results')
+        cache_fol = os.path.join(root, 'cache')
+        seq_lengths = write_dataset(data_fol, np.random.default_rng(0))
+        dataset_config = get_dataset_config(data_fol, seq_lengths)
+        expected, _ = evaluate(dataset_config)
+        res, _ = evaluate(dataset_config, RESULT_CACHE_FOLDER=cache_fol)
+        assert_results_equal(res, expected)
+        cache_files = os.listdir(cache_fol)
+        assert len(cache_files) == len(seq_lengths)
+
+        # Mark the cached results, to see which sequences are loaded from the cache.
+        for cache_file in cache_files:
+            with open(os.path.join(cache_fol, cache_file), 'rb') as f:
+                seq_res = pickle.load(f)
+            seq_res['pedestrian']['Count']['Dets'] = -1
+            with open(os.path.join(cache_fol, cache_file), 'wb') as f:
+                pickle.dump(seq_res, f)
+        res, _ = evaluate(dataset_config, RESULT_CACHE_FOLDER=cache_fol)
+        assert all(res['tracker'][seq]['pedestrian']['Count']['Dets'] == -1 for seq in seq_lengths.keys())
+
+        # Changing the tracker data of a sequence only invalidates its own result.
+        changed_seq = list(seq_lengths.keys())[1]
+        predict_file = os.path.join(data_fol, *changed_seq.split('+'), 'predict.txt')
+        with open(predict_file) as f:
+            rows = f.readlines()
+        with open(predict_file, 'w') as f:
+            f.writelines(rows[:-1])
+        expected, _ = evaluate(dataset_config)
+        res, _ = evaluate(dataset_config, RESULT_CACHE_FOLDER=cache_fol)
+        for seq in seq_lengths.keys():
+            if seq == changed_seq:
+                assert_results_equal(res['tracker'][seq], expected['tracker'][seq])
+            else:
+                assert res['tracker'][seq]['pedestrian']['Count']['Dets'] == -1
+        assert len(os.listdir(cache_fol)) == len(seq_lengths) + 1
+
+        # Results with other preprocessing or of streaming evaluation are cached separately.
+        for dataset_extra_config, eval_extra_config in [({'DO_PREPROC': False}, {}), ({}, {'STREAMING_EVAL': True})]:
+            dataset_config = get_dataset_config(data_fol, seq_lengths, **dataset_extra_config)
+            expected, _ = evaluate(dataset_config, **eval_extra_config)
+            res, _ = evaluate(dataset_config, RESULT_CACHE_FOLDER=cache_fol, **eval_extra_config)
+            assert_results_equal(res, expected)
+
+
+def test_parallel():
+    with tempfile.TemporaryDirectory() as data_fol:
+        seq_lengths = write_dataset(data_fol, np.random.default_rng(1))
+        dataset_config = get_dataset_config(data_fol, seq_lengths)
+        expected, _ = evaluate(dataset_config)
+        for num_cores in [1, 3]:
+            res, _ = evaluate(dataset_config, USE_PARALLEL=True, NUM_PARALLEL_CORES=num_cores)
+            assert_results_equal(res, expected)
+
+
+def test_get_seq_chunks():
+    with tempfile.TemporaryDirectory() as data_fol:
+        seq_lengths = write_dataset(data_fol, np.random.default_rng(2), num_expressions=4)
+        dataset = trackeval.datasets.MotChallenge2DBox_my(get_dataset_config(data_fol, seq_lengths))
+        seq_list = list(seq_lengths.keys())
+        for num_cores, chunks_per_core in [(1, 1), (2, 2), (3, 4), (64, 4)]:
+            evaluator = trackeval.Evaluator({'NUM_PARALLEL_CORES': num_cores, 'CHUNKS_PER_CORE': chunks_per_core,
+                                             'PRINT_CONFIG': False, 'TIME_PROGRESS': False})
+            chunks = evaluator._get_seq_chunks(dataset, seq_list)
+            chunk_size = max(1, int(np.ceil(len(seq_list) / (num_cores * chunks_per_core))))
+            assert all(len(chunk) <= chunk_size for chunk in chunks)
+            assert sorted(seq for chunk in chunks for seq in chunk) == sorted(seq_list)
+            assert [len(chunk) for chunk in chunks] == sorted([len(chunk) for chunk in chunks], reverse=True)
+
+            # Each chunk only has sequences of one video, and each video is split into as few chunks as possible.
+            for chunk in chunks:
+                assert len(set(dataset.get_seq_group(seq) for seq in chunk)) == 1
+            for video in set(dataset.get_seq_group(seq) for seq in seq_list):
+                video_seqs = [seq for seq in seq_list if dataset.get_seq_group(seq) == video]
+                num_video_chunks = sum(dataset.get_seq_group(chunk[0]) == video for chunk in chunks)
+                assert num_video_chunks == int(np.ceil(len(video_seqs) / chunk_size))
+
+
+def _write_packed_trackers(data_fol, seq_lengths, rng):
+    """ Writes the packed data of two trackers with different results: 'tracker' with the tracker files of the
+    dataset, and 'tracker2' with these files after dropping a random part of the rows.
+    """
+    dataset_config = get_dataset_config(data_fol, seq_lengths)
+    trackeval.datasets.MotChallenge2DBox_my(dataset_config).write_packed_data('tracker')
+    for seq in seq_lengths.keys():
+        predict_file = os.path.join(data_fol, *seq.split('+'), 'predict.txt')
+        with open(predict_file) as f:
+            rows = f.readlines()
+        with open(predict_file, 'w') as f:
+            f.writelines(row for row in rows if rng.random() < 0.7)
+    trackeval.datasets.MotChallenge2DBox_my(dataset_config).write_packed_data('tracker2')
+
+
+def test_trackers_in_inner_loop():
+    with tempfile.TemporaryDirectory() as data_fol:
+        rng = np.random.default_rng(3)
+        seq_lengths = write_dataset(data_fol, rng)
+        _write_packed_trackers(data_fol, seq_lengths, rng)
+        dataset_config = get_dataset_config(data_fol, seq_lengths, TRACKERS_TO_EVAL=['tracker', 'tracker2'],
+                                            INPUT_AS_PACKED=True)
+        expected, _ = evaluate(dataset_config)
+        assert not np.allclose(expected['tracker']['COMBINED_SEQ']['pedestrian']['HOTA']['HOTA'],
+                               expected['tracker2']['COMBINED_SEQ']['pedestrian']['HOTA']['HOTA'])
+        for use_parallel in [False, True]:
+            res, _ = evaluate(dataset_config, TRACKERS_IN_INNER_LOOP=True, USE_PARALLEL=use_parallel)
+            assert_results_equal(res, expected)
+
+
+def test_trackers_in_inner_loop_error():
+    with tempfile.TemporaryDirectory() as data_fol:
+        rng = np.random.default_rng(4)
+        seq_lengths = write_dataset(data_fol, rng)
+        _write_packed_trackers(data_fol, seq_lengths, rng)
+        dataset_config = get_dataset_config(data_fol, seq_lengths, TRACKERS_TO_EVAL=['tracker', 'tracker2'],
+                                            INPUT_AS_PACKED=True)
+
+        # Invalid timesteps in the data of the second tracker.
+        rows_file = os.path.join(data_fol, 'tracker2', 'packed', 'rows.npy')
+        rows = np.load(rows_file)
+        rows[:, 0] += 1000
+        np.save(rows_file, rows)
+
+        # Evaluated one by one, only the second tracker fails.
+        res, msg = evaluate(dataset_config, BREAK_ON_ERROR=False)
+        assert res['tracker'] is not None and msg['tracker'] == 'Success'
+        assert res['tracker2'] is None and 'invalid timesteps' in msg['tracker2']
+
+        # Evaluated together, the error can't be attributed to a tracker, so it is the error of both.
+        res, msg = evaluate(dataset_config, BREAK_ON_ERROR=False, TRACKERS_IN_INNER_LOOP=True)
+        assert res['tracker'] is None and res['tracker2'] is None
+        assert msg['tracker'] == msg['tracker2'] and 'invalid timesteps' in msg['tracker']
+        try:
+            evaluate(dataset_config, TRACKERS_IN_INNER_LOOP=True)
+        except TrackEvalException:
+            pass
+        else:
+            raise AssertionError('No TrackEvalException with BREAK_ON_ERROR')
+
+
+if __name__ == '__main__':
+    for test_name, test_func in list(globals().items()):
+        if test_name.startswith('test_'):
+            test_func()
+            print('%s passed' % test_name)
@@ -0,0 +1,114 @@
+""" Tests of the IncrementalEvaluator, which is compared to the Evaluator on a small generated MotChallenge2DBox_my
+dataset.
+Can be run with pytest, or directly as a script.
+"""
+
+import sys
+import os
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import trackeval  # noqa: E402
+from trackeval.eval import IncrementalEvaluator  # noqa: E402
+from trackeval.utils import TrackEvalException  # noqa: E402
+from mot_challenge_my_data import write_dataset, get_dataset_config, get_metrics, evaluate, \
+    assert_results_equal  # noqa: E402
+
+
+def _get_metrics():
+    """The metrics of the tests, with multiple thresholds for CLEAR"""
+    return [trackeval.metrics.CLEAR({'THRESHOLD': [0.3, 0.5, 0.75], 'PRINT_CONFIG': False})
+            if metric.get_name() == 'CLEAR' else metric for metric in get_metrics()]
+
+
+def _add_timesteps(evaluator, raw_data, seq, timesteps):
+    """Adds the given timesteps of the raw tracker data of a sequence to the evaluator"""
+    for t in timesteps:
+        evaluator.add_timestep(seq, raw_data['tracker_ids'][t],
+                               raw_data['tracker_dets'][t].tolist(),  # Lists are also accepted.
+                               raw_data['tracker_confidences'][t],
+                               raw_data['tracker_classes'][t])
+
+
+def test_incremental_evaluator():
+    with tempfile.TemporaryDirectory() as data_fol:
+        seq_lengths = write_dataset(data_fol, np.random.default_rng(0))
+        dataset_config = get_dataset_config(data_fol, seq_lengths)
+        metrics_list = _get_metrics()
+        expected, _ = evaluate(dataset_config, metrics_list)
+
+        # Add the timesteps of all sequences interleaved, as by a tracker which is still running.
+        dataset = trackeval.datasets.MotChallenge2DBox_my(dataset_config)
+        evaluator = IncrementalEvaluator(dataset, metrics_list)
+        raw_data = {seq: dataset._load_raw_file('tracker', seq, is_gt=False) for seq in seq_lengths.keys()}
+        for t in range(max(seq_lengths.values())):
+            for seq, raw_tracker_data in raw_data.items():
+                if t < raw_tracker_data['num_timesteps']:
+                    _add_timesteps(evaluator, raw_tracker_data, seq, [t])
+        assert_results_equal(evaluator.get_results(), expected['tracker'])
+
+
+def test_incremental_evaluator_running():
+    """ The running results of a sequence are the results of the sequence cut after the added timesteps (for both the
+    gt and the tracker data).
+    """
+    with tempfile.TemporaryDirectory() as root:
+        data_fol = os.path.join(root, 'results')
+        seq_lengths = write_dataset(data_fol, np.random.default_rng(1), num_expressions=1)
+        dataset = trackeval.datasets.MotChallenge2DBox_my(get_dataset_config(data_fol, seq_lengths))
+        metrics_list = _get_metrics()
+        seq = list(seq_lengths.keys())[0]
+        raw_data = dataset._load_raw_file('tracker', seq, is_gt=False)
+        evaluator = IncrementalEvaluator(dataset, metrics_list)
+        num_added = 0
+        for num_timesteps in [1, 10, seq_lengths[seq] - 1]:
+            _add_timesteps(evaluator, raw_data, seq, range(num_added, num_timesteps))
+            num_added = num_timesteps
+
+            # Write the sequence cut after num_timesteps frames, and evaluate it.
+            cut_fol = os.path.join(root, 'cut_%i' % num_timesteps)
+            for file in ['gt.txt', 'predict.txt']:
+                os.makedirs(os.path.join(cut_fol, *seq.split('+')), exist_ok=True)
+                with open(os.path.join(data_fol, *seq.split('+'), file)) as f:
+                    rows = [row for row in f if int(row.split(',')[0]) <= num_timesteps]
+                with open(os.path.join(cut_fol, *seq.split('+'), file), 'w') as f:
+                    f.writelines(rows)
+            expected, _ = evaluate(get_dataset_config(cut_fol, {seq: num_timesteps}), metrics_list)
+            res = evaluator.get_results()
+            assert_results_equal(res[seq], expected['tracker'][seq])
+            assert_results_equal(res['COMBINED_SEQ'], expected['tracker']['COMBINED_SEQ'])
+
+
+def test_incremental_evaluator_invalid():
+    with tempfile.TemporaryDirectory() as data_fol:
+        seq_lengths = write_dataset(data_fol, np.random.default_rng(2), num_expressions=1)
+        dataset = trackeval.datasets.MotChallenge2DBox_my(get_dataset_config(data_fol, seq_lengths))
+        seq = list(seq_lengths.keys())[0]
+        evaluator = IncrementalEvaluator(dataset, _get_metrics())
+        box = [10, 10, 20, 20]
+        for tracker_ids, tracker_dets in [([1, 1], [box, box]),  # Same id twice.
+                                          ([1, 2], [box])]:  # Fewer dets than ids.
+            try:
+                evaluator.add_timestep(seq, tracker_ids, tracker_dets)
+            except TrackEvalException:
+                continue
+            raise AssertionError('No TrackEvalException for invalid tracker data')
+
+        # Empty timesteps, up to the end of the sequence.
+        for _ in range(seq_lengths[seq]):
+            evaluator.add_timestep(seq, [], [])
+        try:
+            evaluator.add_timestep(seq, [], [])
+        except TrackEvalException:
+            pass
+        else:
+            raise AssertionError('No TrackEvalException for a timestep after the end of the sequence')
+        assert np.all(evaluator.get_results()[seq]['pedestrian']['CLEAR']['CLR_FP'] == 0)
+
+
+if __name__ == '__main__':
+    for test_name, test_func in list(globals().items()):
+        if test_name.startswith('test_'):
+            test_func()
+            print('%s passed' % test_name)
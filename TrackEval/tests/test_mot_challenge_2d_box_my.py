@@ -0,0 +1,122 @@
+""" Tests of the loading and preprocessing of MotChallenge2DBox_my, on a small generated dataset.
+Can be run with pytest, or directly as a script.
+"""
+
+import sys
+import os
+import shutil
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import trackeval  # noqa: E402
+from trackeval.utils import TrackEvalException  # noqa: E402
+from mot_challenge_my_data import write_dataset, get_dataset_config, evaluate, assert_results_equal  # noqa: E402
+
+
+def _assert_raw_data_equal(raw_data, expected):
+    """Checks that two raw (or preprocessed) sequence data dicts are equal"""
+    assert set(raw_data.keys()) == set(expected.keys())
+    for key, value in expected.items():
+        if isinstance(value, list):
+            assert len(raw_data[key]) == len(value), key
+            for value_t, expected_t in zip(raw_data[key], value):
+                if isinstance(expected_t, dict):
+                    assert_results_equal(value_t, expected_t, key)
+                else:
+                    np.testing.assert_array_equal(value_t, expected_t, err_msg=key)
+        elif key != 'gt_preproc':
+            assert raw_data[key] == value, key
+
+
+def test_packed_data():
+    with tempfile.TemporaryDirectory() as data_fol:
+        seq_lengths = write_dataset(data_fol, np.random.default_rng(0))
+        trackers = ['tracker', 'tracker2']
+        text_config = get_dataset_config(data_fol, seq_lengths, TRACKERS_TO_EVAL=trackers)
+        packed_config = get_dataset_config(data_fol, seq_lengths, TRACKERS_TO_EVAL=trackers, INPUT_AS_PACKED=True)
+        text_dataset = trackeval.datasets.MotChallenge2DBox_my(text_config)
+        text_dataset.write_packed_data()
+        for tracker in trackers:
+            assert os.path.isfile(os.path.join(data_fol, tracker, 'packed', 'rows.npy'))
+
+        # The packed data of each tracker loads to the same raw data as the text files.
+        packed_dataset = trackeval.datasets.MotChallenge2DBox_my(packed_config)
+        for tracker in trackers:
+            for seq in seq_lengths.keys():
+                for is_gt in [True, False]:
+                    _assert_raw_data_equal(packed_dataset._load_raw_file(tracker, seq, is_gt),
+                                           text_dataset._load_raw_file(tracker, seq, is_gt))
+
+        expected, _ = evaluate(text_config)
+        res, _ = evaluate(packed_config)
+        assert_results_equal(res, expected)
+
+
+def test_packed_data_invalid():
+    with tempfile.TemporaryDirectory() as data_fol:
+        seq_lengths = write_dataset(data_fol, np.random.default_rng(1))
+        trackers = ['tracker', 'tracker2']
+        packed_config = get_dataset_config(data_fol, seq_lengths, TRACKERS_TO_EVAL=trackers, INPUT_AS_PACKED=True)
+        for config, write_trackers in [(packed_config, []),  # No packed data.
+                                       (packed_config, ['tracker']),  # No packed data for the second tracker.
+                                       (dict(packed_config, SEQ_INFO=dict(seq_lengths, missing_seq=10)), trackers)]:
+            for tracker in write_trackers:
+                trackeval.datasets.MotChallenge2DBox_my(get_dataset_config(data_fol, seq_lengths)).write_packed_data(
+                    tracker)
+            try:
+                trackeval.datasets.MotChallenge2DBox_my(config)
+            except TrackEvalException:
+                continue
+            raise AssertionError('No TrackEvalException for invalid packed data')
+
+        # The packed data of another tracker is not used.
+        shutil.copy(os.path.join(data_fol, 'tracker', 'packed', 'index.npz'),
+                    os.path.join(data_fol, 'tracker2', 'packed', 'index.npz'))
+        try:
+            trackeval.datasets.MotChallenge2DBox_my(packed_config)
+        except TrackEvalException:
+            pass
+        else:
+            raise AssertionError('No TrackEvalException for the packed data of another tracker')
+
+        packed_dataset = trackeval.datasets.MotChallenge2DBox_my(dict(packed_config, TRACKERS_TO_EVAL=['tracker']))
+        try:
+            packed_dataset.write_packed_data()
+        except TrackEvalException:
+            pass
+        else:
+            raise AssertionError('No TrackEvalException for writing packed data while reading packed data')
+
+
+def test_rmot_preproc():
+    """ RMOT_PREPROC gives the same preprocessed data and results as the standard preprocessing, on data with
+    distractor and zero marked gt dets, and on data without any (where the data is passed through).
+    """
+    with tempfile.TemporaryDirectory() as data_fol:
+        seq_lengths = write_dataset(data_fol, np.random.default_rng(2))
+        for remove_distractors in [False, True]:
+            if remove_distractors:
+                for seq in seq_lengths.keys():
+                    gt_file = os.path.join(data_fol, *seq.split('+'), 'gt.txt')
+                    with open(gt_file) as f:
+                        rows = [row.split(',') for row in f]
+                    with open(gt_file, 'w') as f:
+                        f.writelines(','.join(row) for row in rows if row[6] == '1' and row[7] == '1')
+            datasets = [trackeval.datasets.MotChallenge2DBox_my(get_dataset_config(data_fol, seq_lengths,
+                                                                                   RMOT_PREPROC=rmot_preproc))
+                        for rmot_preproc in [True, False]]
+            for seq in seq_lengths.keys():
+                data, expected = [dataset.get_preprocessed_seq_data(dataset.get_raw_seq_data('tracker', seq),
+                                                                    'pedestrian') for dataset in datasets]
+                _assert_raw_data_equal(data, expected)
+            res, _ = evaluate(get_dataset_config(data_fol, seq_lengths, RMOT_PREPROC=True))
+            expected, _ = evaluate(get_dataset_config(data_fol, seq_lengths, RMOT_PREPROC=False))
+            assert_results_equal(res, expected)
+
+
+if __name__ == '__main__':
+    for test_name, test_func in list(globals().items()):
+        if test_name.startswith('test_'):
+            test_func()
+            print('%s passed' % test_name)
@@ -0,0 +1,48 @@
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+# Number of times each way of finding an assignment was used by max_score_assignment (in the current process).
+assignment_counts = {'empty': 0, 'single_row': 0, 'single_col': 0, 'conflict_free': 0, 'hungarian': 0}
+
+
+def reset_assignment_counts():
+    """Sets all counts of assignment_counts to zero"""
+    for key in assignment_counts.keys():
+        assignment_counts[key] = 0
+
+
+def max_score_assignment(score_mat):
+    """ Finds the one-to-one matching between rows and columns of a (non-negative) score matrix which maximises the
+    total score. This is equivalent to linear_sum_assignment(-score_mat), but resolves trivial cases directly, which
+    are the large majority for sparse (e.g. RMOT) data:
+        - a single row or a single column, with a unique maximum score.
+        - each row and each column has at most one positive score (no conflicts), so all positive pairs are matched.
+    The Hungarian algorithm is only used if there are conflicts between positive scores.
+
+    Returns (match_rows, match_cols), sorted by row as for linear_sum_assignment. Pairs with a score of zero may be
+    left out, so callers must ignore matches with zero score (e.g. by thresholding the score or similarity).
+    """
+    num_rows, num_cols = score_mat.shape
+    if num_rows == 0 or num_cols == 0 or not np.all(score_mat >= 0):
+        assignment_counts['hungarian'] += 1
+        return linear_sum_assignment(-score_mat)
+    positive_mask = score_mat > 0
+    if not np.any(positive_mask):
+        assignment_counts['empty'] += 1
+        return np.array([], int), np.array([], int)
+
+    if num_rows == 1 or num_cols == 1:
+        scores = score_mat.ravel()
+        best = np.argmax(scores)
+        if np.count_nonzero(scores == scores[best]) == 1:
+            if num_rows == 1:
+                assignment_counts['single_row'] += 1
+                return np.array([0]), np.array([best])
+            assignment_counts['single_col'] += 1
+            return np.array([best]), np.array([0])
+    elif np.all(positive_mask.sum(0) <= 1) and np.all(positive_mask.sum(1) <= 1):
+        assignment_counts['conflict_free'] += 1
+        return np.nonzero(positive_mask)
+
+    assignment_counts['hungarian'] += 1
+    return linear_sum_assignment(-score_mat)
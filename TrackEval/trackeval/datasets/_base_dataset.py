@@ -3,12 +3,19 @@ import io
 import zipfile
 import os
 import traceback
+import warnings
 import numpy as np
-from copy import deepcopy
 from abc import ABC, abstractmethod
 from .. import _timing
 from ..utils import TrackEvalException
 
+# Maximum number of pairs of boxes whose IOUs _calculate_box_ious_batched calculates in one pass.
+MAX_BATCHED_IOU_PAIRS = 2 ** 22
+
+# Whether each byte separates values in _load_text_file_as_array (whitespace, commas are replaced by spaces).
+_IS_TEXT_DELIMITER = np.zeros(256, dtype=bool)
+_IS_TEXT_DELIMITER[np.frombuffer(b' \t\n\r\x0b\x0c', dtype=np.uint8)] = True
+
 
 class _BaseDataset(ABC):
     @abstractmethod
@@ -20,6 +27,7 @@ class _BaseDataset(ABC):
         self.output_sub_fol = None
         self.should_classes_combine = True
         self.use_super_categories = False
+        self.attribute_list = []
 
     # Functions to implement:
 
@@ -63,9 +71,75 @@ class _BaseDataset(ABC):
         """Return info about the dataset needed for the Evaluator"""
         return self.tracker_list, self.seq_list, self.class_list
 
+    def get_seq_group(self, seq):
+        """ Returns the group that a sequence belongs to, e.g. the video it was taken from. When evaluating in parallel,
+        sequences of the same group are sent to the same worker process together, so that data cached by the dataset
+        for a group is re-used. By default each sequence is its own group.
+        """
+        return seq
+
+    def get_attribute_masks(self, seq):
+        """ Returns a boolean NDArray (timesteps x attributes) giving which of the attributes in attribute_list each
+        timestep of a sequence has. Only needs to be implemented by datasets with a non-empty attribute_list, for which
+        the Evaluator additionally evaluates each attribute on the timesteps which have it.
+        """
+        raise NotImplementedError('Attributes are not implemented for dataset %s' % self.get_name())
+
+    @staticmethod
+    def get_preprocessed_timestep_subset(data, timestep_mask):
+        """ Returns preprocessed data (as returned by get_preprocessed_seq_data) in which all timesteps not selected by
+        timestep_mask are empty, i.e. as if neither gt nor tracker had any dets in them. This gives the same data as
+        preprocessing the raw data with those timesteps removed, because preprocessing is done per timestep.
+        The data of the selected timesteps (including the similarity scores) is shared with data, not copied. Only the
+        ids are relabeled (to be contiguous within the subset) and the numbers of dets and ids are counted again.
+        """
+        num_timesteps = data['num_timesteps']
+
+        def empty_like(key, value):
+            if key == 'similarity_scores':
+                return value[:0, :0]
+            elif isinstance(value, dict):
+                return {k: v[:0] for k, v in value.items()}
+            return value[:0]
+
+        subset_data = {}
+        for key, value in data.items():
+            if isinstance(value, list) and len(value) == num_timesteps:
+                subset_data[key] = [v if timestep_mask[t] else empty_like(key, v) for t, v in enumerate(value)]
+            else:
+                subset_data[key] = value
+
+        # Re-label IDs such that there are no empty IDs (ids are already contiguous over all timesteps, so their order
+        # is kept).
+        for id_key, num_key in [('gt_ids', 'num_gt_ids'), ('tracker_ids', 'num_tracker_ids')]:
+            unique_ids = np.unique(np.concatenate([np.empty(0, dtype=int)] + subset_data[id_key]))
+            if len(unique_ids) > 0 and len(unique_ids) != data[num_key]:
+                id_map = np.zeros(data[num_key], dtype=int)
+                id_map[unique_ids] = np.arange(len(unique_ids))
+                subset_data[id_key] = [id_map[ids] if len(ids) > 0 else ids for ids in subset_data[id_key]]
+            subset_data[num_key] = len(unique_ids)
+        subset_data['num_gt_dets'] = sum(len(ids) for ids in subset_data['gt_ids'])
+        subset_data['num_tracker_dets'] = sum(len(ids) for ids in subset_data['tracker_ids'])
+        return subset_data
+
+    def get_seq_hash(self, tracker, seq):
+        """ Returns a hash (string) of all inputs that the results of a tracker on a sequence depend on, i.e. its data
+        files and the relevant dataset config. This is used by the Evaluator to cache results between runs.
+        Returns None if results should not be cached, which is the default for datasets that don't implement it.
+        """
+        return None
+
     @_timing.time
-    def get_raw_seq_data(self, tracker, seq):
+    def get_raw_gt_data(self, tracker, seq):
+        """ Loads the raw ground-truth data for a single sequence. This can be passed to get_raw_seq_data for each of
+        several trackers, so that it is only loaded once.
+        """
+        return self._load_raw_file(tracker, seq, is_gt=True)
+
+    @_timing.time
+    def get_raw_seq_data(self, tracker, seq, raw_gt_data=None):
         """ Loads raw data (tracker and ground-truth) for a single tracker on a single sequence.
+        If raw_gt_data (from get_raw_gt_data) is given, the ground-truth is not loaded again.
         Raw data includes all of the information needed for both preprocessing and evaluation, for all classes.
         A later function (get_processed_seq_data) will perform such preprocessing and extract relevant information for
         the evaluation of each class.
@@ -89,18 +163,67 @@ class _BaseDataset(ABC):
         calculation of metrics such as class confusion matrices. Typically the impact of this on performance is low.
         """
         # Load raw data.
-        raw_gt_data = self._load_raw_file(tracker, seq, is_gt=True)
+        if raw_gt_data is None:
+            raw_gt_data = self.get_raw_gt_data(tracker, seq)
         raw_tracker_data = self._load_raw_file(tracker, seq, is_gt=False)
         raw_data = {**raw_tracker_data, **raw_gt_data}  # Merges dictionaries
 
         # Calculate similarities for each timestep.
-        similarity_scores = []
-        for t, (gt_dets_t, tracker_dets_t) in enumerate(zip(raw_data['gt_dets'], raw_data['tracker_dets'])):
-            ious = self._calculate_similarities(gt_dets_t, tracker_dets_t)
-            similarity_scores.append(ious)
-        raw_data['similarity_scores'] = similarity_scores
+        raw_data['similarity_scores'] = self._calculate_seq_similarities(raw_data['gt_dets'], raw_data['tracker_dets'])
         return raw_data
 
+    def _calculate_seq_similarities(self, gt_dets, tracker_dets):
+        """ Calculates the similarity scores of all timesteps of a sequence, given lists (for each timestep) of the gt
+        and tracker dets. Returns a list (for each timestep) of 2D NDArrays.
+        By default _calculate_similarities is called for each timestep. Datasets can override this to calculate the
+        similarities of all timesteps at once (e.g. with _calculate_seq_box_ious), instead of with many small calls.
+        """
+        return [self._calculate_similarities(gt_dets_t, tracker_dets_t)
+                for gt_dets_t, tracker_dets_t in zip(gt_dets, tracker_dets)]
+
+    def get_preprocessed_timesteps(self, tracker, seq, cls, raw_gt_data=None):
+        """ Yields the preprocessed data of a single tracker on a single sequence for a class one timestep at a time,
+        for evaluation with metric accumulators (see _BaseAccumulator) without the data of the whole sequence in memory.
+        If raw_gt_data (from get_raw_gt_data) is given, the ground-truth is not loaded again.
+
+        Each timestep is a dict which contains the fields:
+            [gt_ids, tracker_ids, tracker_confidences]: 1D NDArrays (for each det).
+            [gt_dets, tracker_dets]: lists of detections.
+            [similarity_scores]: 2D NDArray.
+            [num_gt_ids, num_tracker_ids]: integers.
+        The ids are contiguous, but (unlike get_preprocessed_seq_data) may be numbered in order of first appearance, so
+        that num_gt_ids and num_tracker_ids only need to count the ids seen so far.
+
+        By default the whole sequence is loaded and preprocessed first. Datasets which preprocess each timestep
+        separately can override this to only calculate the similarities and preprocessed data of one timestep at once.
+        """
+        raw_data = self.get_raw_seq_data(tracker, seq, raw_gt_data)
+        data = self.get_preprocessed_seq_data(raw_data, cls)
+        data_keys = ['gt_ids', 'tracker_ids', 'gt_dets', 'tracker_dets', 'tracker_confidences', 'similarity_scores']
+        for t in range(data['num_timesteps']):
+            data_t = {key: data[key][t] for key in data_keys}
+            data_t['num_gt_ids'] = data['num_gt_ids']
+            data_t['num_tracker_ids'] = data['num_tracker_ids']
+            yield data_t
+
+    def get_preprocessed_timestep(self, raw_gt_data, t, raw_tracker_data_t, cls, id_maps):
+        """ Calculates the similarity scores of timestep t of a sequence and preprocesses it for a class, given the raw
+        gt data of the sequence (from get_raw_gt_data) and the raw tracker data of the timestep (a dict with the
+        tracker_ids, tracker_classes, tracker_confidences and tracker_dets of the timestep, as in _load_raw_file).
+        id_maps is a dict with the id maps ('gt_ids' and 'tracker_ids', see _relabel_timestep_ids) of the sequence so
+        far. Returns the data of the timestep, as yielded by get_preprocessed_timesteps.
+        This is used for incremental evaluation (see IncrementalEvaluator in eval.py), and is only implemented by
+        datasets which preprocess each timestep separately.
+        """
+        raise NotImplementedError('Incremental evaluation is not implemented for dataset %s' % self.get_name())
+
+    @staticmethod
+    def _relabel_timestep_ids(ids, id_map):
+        """ Relabels the ids of a timestep to be contiguous, in order of first appearance. id_map is a dict (from
+        original to relabeled id) shared by all timesteps of a sequence, and new ids are added to it.
+        """
+        return np.array([id_map.setdefault(i, len(id_map)) for i in ids.tolist()], dtype=int)
+
     @staticmethod
     def _load_simple_text_file(file, time_col=0, id_col=None, remove_negative_ids=False, valid_filter=None,
                                crowd_ignore_filter=None, convert_filter=None, is_zipped=False, zip_file=None,
@@ -211,6 +334,81 @@ class _BaseDataset(ABC):
                     file))
         return read_data, crowd_ignore_data
 
+    @staticmethod
+    def _load_text_file_as_array(file, is_zipped=False, zip_file=None):
+        """ Loads a text file which only contains numeric values (e.g. the MOT Challenge format) into a single 2D float
+        NDArray (dets x columns), with rows in the same order as in the file.
+        Values can be separated by commas and/or whitespace, and trailing delimiters at the end of rows are ignored.
+
+        This is a fast alternative to _load_simple_text_file (which reads the file row by row into lists of strings),
+        for files that do not need any filtering or conversion of non-numeric columns.
+        The whole file is parsed in one vectorized call. Use _split_by_timestep to separate the dets by timestep.
+
+        Raises a TrackEvalException if the file cannot be read, and a ValueError if its values cannot be converted to a
+        float array (e.g. non-numeric values or rows with different numbers of columns).
+        Returns an array of shape (0, 0) for an empty file.
+        """
+        try:
+            if is_zipped:  # Either open file directly or within a zip.
+                if zip_file is None:
+                    raise TrackEvalException('is_zipped set to True, but no zip_file is given.')
+                with zipfile.ZipFile(os.path.join(zip_file), 'r') as archive:
+                    text = archive.read(file).decode()
+            else:
+                with open(file) as fp:
+                    text = fp.read()
+        except Exception:
+            print('Error loading file: %s, printing traceback.' % file)
+            traceback.print_exc()
+            raise TrackEvalException(
+                'File %s cannot be read because it is either not present or invalidly formatted' % os.path.basename(
+                    file))
+
+        # Number of values of each line, from the starts of the tokens (non-delimiter bytes after a delimiter).
+        text = text.replace(',', ' ')
+        chars = np.frombuffer(text.encode(), dtype=np.uint8)
+        is_delimiter = _IS_TEXT_DELIMITER[chars]
+        token_starts = np.flatnonzero(~is_delimiter & np.concatenate(([True], is_delimiter[:-1])))
+        line_ids = np.cumsum(chars == ord('\n'))
+        if len(token_starts) == 0:
+            return np.empty((0, 0))
+        values_per_line = np.bincount(line_ids[token_starts])
+        num_cols = values_per_line[line_ids[token_starts[0]]]
+        ragged_lines = np.flatnonzero((values_per_line > 0) & (values_per_line != num_cols))
+        if len(ragged_lines) > 0:
+            raise ValueError('File %s has rows with different numbers of columns (line %i has %i values instead of %i)'
+                             % (os.path.basename(file), ragged_lines[0] + 1, values_per_line[ragged_lines[0]],
+                                num_cols))
+
+        # Parse all values at once. Depending on the numpy version, parsing either raises an error or stops (with a
+        # warning) at the first value which is not a number.
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', DeprecationWarning)
+                values = np.fromstring(text, dtype=float, sep=' ')
+        except ValueError:
+            values = None
+        if values is None or len(values) != len(token_starts):
+            raise ValueError('File %s contains values which are not numbers' % os.path.basename(file))
+        return values.reshape(-1, num_cols)
+
+    @staticmethod
+    def _split_by_timestep(data, time_col=0):
+        """ Separates an array of dets (one det per row) by timestep, using split offsets rather than a dict of rows.
+        Dets keep their relative order within each timestep.
+        Returns the sorted timesteps (1D int NDArray) and a list (for each of these timesteps) of 2D NDArrays (views of
+        data if data is already sorted by timestep).
+        """
+        if data.shape[0] == 0:
+            return np.empty(0, dtype=int), []
+        timesteps = data[:, time_col].astype(int)
+        if np.any(timesteps[1:] < timesteps[:-1]):
+            order = np.argsort(timesteps, kind='stable')
+            timesteps = timesteps[order]
+            data = data[order]
+        unique_timesteps, split_idx = np.unique(timesteps, return_index=True)
+        return unique_timesteps, np.split(data, split_idx[1:])
+
     @staticmethod
     def _calculate_mask_ious(masks1, masks2, is_encoded=False, do_ioa=False):
         """ Calculates the IOU (intersection over union) between two arrays of segmentation masks.
@@ -251,39 +449,98 @@ class _BaseDataset(ABC):
         If do_ioa (intersection over area) , then calculates the intersection over the area of boxes1 - this is commonly
         used to determine if detections are within crowd ignore region.
         """
+        corners1 = _BaseDataset._get_box_corners(bboxes1, box_format)
+        corners2 = _BaseDataset._get_box_corners(bboxes2, box_format)
+        return _BaseDataset._calculate_corner_ious([c[:, np.newaxis] for c in corners1],
+                                                   [c[np.newaxis, :] for c in corners2], do_ioa)
+
+    @staticmethod
+    def _calculate_seq_box_ious(bboxes1, bboxes2, box_format='xywh', do_ioa=False):
+        """ Calculates the IOUs between the boxes of each timestep of a sequence, given lists (for each timestep) of
+        arrays of boxes, in a single pass (see _calculate_box_ious_batched). Returns a list (for each timestep) of 2D
+        NDArrays, which are views into a single buffer.
+        """
+        offsets1 = np.concatenate([[0], np.cumsum([len(bboxes1_t) for bboxes1_t in bboxes1])])
+        offsets2 = np.concatenate([[0], np.cumsum([len(bboxes2_t) for bboxes2_t in bboxes2])])
+        return _BaseDataset._calculate_box_ious_batched(np.concatenate(bboxes1), np.concatenate(bboxes2), offsets1,
+                                                        offsets2, box_format, do_ioa)
+
+    @staticmethod
+    def _calculate_box_ious_batched(bboxes1, bboxes2, offsets1, offsets2, box_format='xywh', do_ioa=False,
+                                    max_pairs=MAX_BATCHED_IOU_PAIRS):
+        """ Calculates the IOUs between the boxes of each of several frames (e.g. all timesteps of a sequence) at once,
+        with the same results as _calculate_box_ious for each frame.
+        bboxes1 and bboxes2 contain the boxes of all frames concatenated, and offsets1 and offsets2 (of length
+        num_frames + 1) give the start of the boxes of each frame within them, and their end. All pairs of boxes within
+        the same frame are put into a flat array of pairs (ordered frame by frame and row by row), whose IOUs are
+        calculated in vectorized passes over chunks of consecutive frames with at most max_pairs pairs each (a single
+        frame with more pairs gets a chunk of its own), to bound the memory of the temporary arrays.
+        Returns a list (for each frame) of 2D NDArrays, which are views into a single buffer.
+        """
+        offsets1 = np.asarray(offsets1, dtype=int)
+        offsets2 = np.asarray(offsets2, dtype=int)
+        num_boxes1 = np.diff(offsets1)
+        num_boxes2 = np.diff(offsets2)
+        block_sizes = num_boxes1 * num_boxes2
+        block_offsets = np.concatenate([[0], np.cumsum(block_sizes)])
+        corners1 = _BaseDataset._get_box_corners(bboxes1, box_format)
+        corners2 = _BaseDataset._get_box_corners(bboxes2, box_format)
+
+        ious = np.zeros(block_offsets[-1], dtype=float)
+        start = 0
+        while start < len(block_sizes):
+            # Last frame of the chunk: the last one which ends within max_pairs of the chunk start (at least one frame).
+            end = max(np.searchsorted(block_offsets, block_offsets[start] + max_pairs, side='right') - 1, start + 1)
+
+            # Frame and indices of the two boxes of each pair of the chunk.
+            chunk_sizes = block_sizes[start:end]
+            pair_frame = np.repeat(np.arange(start, end), chunk_sizes)
+            pair_row, pair_col = np.divmod(np.arange(block_offsets[start], block_offsets[end]) -
+                                           block_offsets[pair_frame], num_boxes2[pair_frame])
+            pair_idx1 = offsets1[pair_frame] + pair_row
+            pair_idx2 = offsets2[pair_frame] + pair_col
+            ious[block_offsets[start]:block_offsets[end]] = _BaseDataset._calculate_corner_ious(
+                [c[pair_idx1] for c in corners1], [c[pair_idx2] for c in corners2], do_ioa)
+            start = end
+        return [ious[block_offsets[f]:block_offsets[f + 1]].reshape(num_boxes1[f], num_boxes2[f])
+                for f in range(len(block_sizes))]
+
+    @staticmethod
+    def _get_box_corners(bboxes, box_format):
+        """Returns the (x0, y0, x1, y1) coordinates of an array of boxes, without modifying (or copying) the array"""
         if box_format in 'xywh':
             # layout: (x0, y0, w, h)
-            bboxes1 = deepcopy(bboxes1)
-            bboxes2 = deepcopy(bboxes2)
-
-            bboxes1[:, 2] = bboxes1[:, 0] + bboxes1[:, 2]
-            bboxes1[:, 3] = bboxes1[:, 1] + bboxes1[:, 3]
-            bboxes2[:, 2] = bboxes2[:, 0] + bboxes2[:, 2]
-            bboxes2[:, 3] = bboxes2[:, 1] + bboxes2[:, 3]
+            return bboxes[:, 0], bboxes[:, 1], bboxes[:, 0] + bboxes[:, 2], bboxes[:, 1] + bboxes[:, 3]
         elif box_format not in 'x0y0x1y1':
             raise (TrackEvalException('box_format %s is not implemented' % box_format))
-
         # layout: (x0, y0, x1, y1)
-        min_ = np.minimum(bboxes1[:, np.newaxis, :], bboxes2[np.newaxis, :, :])
-        max_ = np.maximum(bboxes1[:, np.newaxis, :], bboxes2[np.newaxis, :, :])
-        intersection = np.maximum(min_[..., 2] - max_[..., 0], 0) * np.maximum(min_[..., 3] - max_[..., 1], 0)
-        area1 = (bboxes1[..., 2] - bboxes1[..., 0]) * (bboxes1[..., 3] - bboxes1[..., 1])
+        return bboxes[:, 0], bboxes[:, 1], bboxes[:, 2], bboxes[:, 3]
 
-        if do_ioa:
-            ioas = np.zeros_like(intersection)
-            valid_mask = area1 > 0 + np.finfo('float').eps
-            ioas[valid_mask, :] = intersection[valid_mask, :] / area1[valid_mask][:, np.newaxis]
+    @staticmethod
+    def _calculate_corner_ious(corners1, corners2, do_ioa=False):
+        """ Calculates the IOU (or IOA, see _calculate_box_ious) between boxes given by their (x0, y0, x1, y1)
+        coordinates. The coordinates of boxes1 and boxes2 are broadcast against each other, e.g. an N x 1 against a
+        1 x M array for all pairs of boxes, or two flat arrays of pairs of boxes.
+        The intersections are calculated from the coordinates directly, instead of from (N, M, 4) min/max arrays, and
+        invalid pairs (with empty boxes or union) are set to zero by the division, instead of by masked writes.
+        """
+        x0_1, y0_1, x1_1, y1_1 = corners1
+        x0_2, y0_2, x1_2, y1_2 = corners2
+        intersection = np.maximum(np.minimum(x1_1, x1_2) - np.maximum(x0_1, x0_2), 0) * \
+            np.maximum(np.minimum(y1_1, y1_2) - np.maximum(y0_1, y0_2), 0)
+        area1 = (x1_1 - x0_1) * (y1_1 - y0_1)
 
-            return ioas
+        if do_ioa:
+            valid_mask = np.broadcast_to(area1 > 0 + np.finfo('float').eps, intersection.shape)
+            return np.divide(intersection, area1, out=np.zeros_like(intersection), where=valid_mask, casting='unsafe')
         else:
-            area2 = (bboxes2[..., 2] - bboxes2[..., 0]) * (bboxes2[..., 3] - bboxes2[..., 1])
-            union = area1[:, np.newaxis] + area2[np.newaxis, :] - intersection
-            intersection[area1 <= 0 + np.finfo('float').eps, :] = 0
-            intersection[:, area2 <= 0 + np.finfo('float').eps] = 0
-            intersection[union <= 0 + np.finfo('float').eps] = 0
-            union[union <= 0 + np.finfo('float').eps] = 1
-            ious = intersection / union
-            return ious
+            area2 = (x1_2 - x0_2) * (y1_2 - y0_2)
+            union = area1 + area2 - intersection
+            valid_mask = (area1 > 0 + np.finfo('float').eps) & (area2 > 0 + np.finfo('float').eps) & \
+                (union > 0 + np.finfo('float').eps)
+            # (the ious have the dtype of intersection / union, e.g. float64 for integer boxes)
+            ious = np.zeros(intersection.shape, dtype=np.result_type(intersection, union, 1.0))
+            return np.divide(intersection, union, out=ious, where=valid_mask)
 
     @staticmethod
     def _calculate_euclidean_similarity(dets1, dets2, zero_distance=2.0):
@@ -296,6 +553,21 @@ class _BaseDataset(ABC):
         sim = np.maximum(0, 1 - dist/zero_distance)
         return sim
 
+    @staticmethod
+    def _relabel_ids(data):
+        """ Re-labels the gt and tracker ids of preprocessed data (lists for each timestep) such that there are no empty
+        ids, keeping their order, and sets num_gt_ids and num_tracker_ids. The ids of all timesteps are relabeled at
+        once, with np.unique over their concatenation, which is split back into the timesteps. Unlike an id map with an
+        entry for each possible id, this doesn't depend on how large the ids are (e.g. with per-video id offsets).
+        """
+        for id_key, num_key in [('gt_ids', 'num_gt_ids'), ('tracker_ids', 'num_tracker_ids')]:
+            ids = data[id_key]
+            timestep_ends = np.cumsum([len(ids_t) for ids_t in ids])
+            unique_ids, relabeled_ids = np.unique(np.concatenate([np.empty(0, dtype=int)] + list(ids)).astype(int),
+                                                  return_inverse=True)
+            data[id_key] = np.split(relabeled_ids.ravel(), timestep_ends[:-1]) if len(ids) > 0 else []
+            data[num_key] = len(unique_ids)
+
     @staticmethod
     def _check_unique_ids(data, after_preproc=False):
         """Check the requirement that the tracker_ids and gt_ids are unique per timestep"""
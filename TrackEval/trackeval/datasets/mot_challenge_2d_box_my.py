@@ -1,11 +1,13 @@
 import os
 import csv
+import hashlib
+import zipfile
 import configparser
 import numpy as np
-from scipy.optimize import linear_sum_assignment
 from ._base_dataset import _BaseDataset
 from .. import utils
 from .. import _timing
+from .. import _assignment
 from ..utils import TrackEvalException
 
 
@@ -25,8 +27,14 @@ class MotChallenge2DBox_my(_BaseDataset):
             'BENCHMARK': 'MOT17',  # Valid: 'MOT17', 'MOT16', 'MOT20', 'MOT15'
             'SPLIT_TO_EVAL': 'train',  # Valid: 'train', 'test', 'all'
             'INPUT_AS_ZIP': False,  # Whether tracker input files are zipped
+            'INPUT_AS_PACKED': False,  # Whether gt and tracker data are read from the packed binary files written by
+                                       # write_packed_data (see scripts/pack_mot_challenge_my.py)
+            'PACKED_SUB_FOLDER': 'packed',  # Packed data is in TRACKERS_FOLDER/tracker_name/PACKED_SUB_FOLDER
             'PRINT_CONFIG': True,  # Whether to print current config
             'DO_PREPROC': True,  # Whether to perform preprocessing (never done for MOT15)
+            'RMOT_PREPROC': True,  # If True, timesteps without distractor gt dets skip matching tracker to gt dets,
+                                   # and their data is passed through without copies if nothing is removed (e.g. for
+                                   # RMOT data without distractor classes or zero marked gt). Results are the same.
             'TRACKER_SUB_FOLDER': 'data',  # Tracker files are in TRACKER_FOLDER/tracker_name/TRACKER_SUB_FOLDER
             'OUTPUT_SUB_FOLDER': '',  # Output files are saved in OUTPUT_FOLDER/tracker_name/OUTPUT_SUB_FOLDER
             'TRACKER_DISPLAY_NAMES': None,  # Names of trackers to display, if None: TRACKERS_TO_EVAL
@@ -37,6 +45,13 @@ class MotChallenge2DBox_my(_BaseDataset):
             'SKIP_SPLIT_FOL': False,  # If False, data is in GT_FOLDER/BENCHMARK-SPLIT_TO_EVAL/ and in
                                       # TRACKERS_FOLDER/BENCHMARK-SPLIT_TO_EVAL/tracker/
                                       # If True, then the middle 'benchmark-split' folder is skipped for both.
+            'IMAGE_FOLDER': '/home/data/UAV-RMOT/rmot_train/training/image_02',  # Used to get UAV sequence lengths
+            'SEQ_LENGTHS_SIDECAR': False,  # If True, video lengths are read from (and saved to) a .seqlengths file
+                                           # next to the seqmap, instead of counting images for every run.
+            'ATTRIBUTE_FOLDER': None,  # If not None, each attribute is also evaluated separately, on the timesteps
+                                       # flagged in ATTRIBUTE_FOLDER/<video>.txt (one row of 0/1 flags per frame).
+            'ATTRIBUTES': ['Day', 'Night', 'ViewPoint_Change', 'Scale_Variation', 'Occlusion', 'Fast_Motion',
+                           'Rotation', 'Low_Resolution'],  # Names of the columns of the attribute files
         }
         return default_config
 
@@ -60,7 +75,21 @@ class MotChallenge2DBox_my(_BaseDataset):
         self.should_classes_combine = False
         self.use_super_categories = False
         self.data_is_zipped = self.config['INPUT_AS_ZIP']
+        self.data_is_packed = self.config['INPUT_AS_PACKED']
+        self.packed_sub_fol = self.config['PACKED_SUB_FOLDER']
         self.do_preproc = self.config['DO_PREPROC']
+        self.rmot_preproc = self.config['RMOT_PREPROC']
+
+        # Attributes to evaluate separately, with the (timesteps x attributes) flags of each video loaded once.
+        self.attribute_fol = self.config['ATTRIBUTE_FOLDER']
+        if self.attribute_fol is not None:
+            self.attribute_list = list(self.config['ATTRIBUTES'])
+        self._video_attribute_masks = {}
+
+        # Packed data of each tracker (memory-mapped rows and the offsets of each sequence's gt and tracker data within
+        # them).
+        self._packed_rows = {}
+        self._packed_offsets = {}
 
         self.output_fol = self.config['OUTPUT_FOLDER']
         if self.output_fol is None:
@@ -87,7 +116,7 @@ class MotChallenge2DBox_my(_BaseDataset):
 
         # Check gt files exist
         for seq in self.seq_list:
-            if not self.data_is_zipped:
+            if not self.data_is_zipped and not self.data_is_packed:
                 # curr_file = self.config["GT_LOC_FORMAT"].format(gt_folder=self.gt_fol, seq=seq)
                 # gt has been saved into the same folder with prediction
                 curr_file = self.config["GT_LOC_FORMAT"].format(gt_folder=self.tracker_fol, video_id=seq.split('+')[0],
@@ -95,7 +124,7 @@ class MotChallenge2DBox_my(_BaseDataset):
                 if not os.path.isfile(curr_file):
                     print('GT file not found ' + curr_file)
                     raise TrackEvalException('GT file not found for sequence: ' + seq)
-        if self.data_is_zipped:
+        if self.data_is_zipped and not self.data_is_packed:
             curr_file = os.path.join(self.gt_fol, 'data.zip')
             if not os.path.isfile(curr_file):
                 print('GT file not found ' + curr_file)
@@ -116,6 +145,10 @@ class MotChallenge2DBox_my(_BaseDataset):
             raise TrackEvalException('List of tracker files and tracker display names do not match.')
 
         for tracker in self.tracker_list:
+            if self.data_is_packed:
+                # Checks that the packed data of the tracker contains all sequences.
+                self._load_packed_index(tracker)
+                continue
             if self.data_is_zipped:
                 curr_file = os.path.join(self.tracker_fol, tracker, self.tracker_sub_fol + '.zip')
                 if not os.path.isfile(curr_file):
@@ -134,9 +167,19 @@ class MotChallenge2DBox_my(_BaseDataset):
                             'Tracker file not found: ' + tracker + '/' + self.tracker_sub_fol + '/' +
                             os.path.basename(curr_file))
 
+    def __getstate__(self):
+        # Don't pickle the memory-mapped packed data (e.g. when sent to worker processes), it is re-opened on use.
+        state = self.__dict__.copy()
+        state['_packed_rows'] = {}
+        return state
+
     def get_display_name(self, tracker):
         return self.tracker_to_disp[tracker]
 
+    def get_seq_group(self, seq):
+        """Sequences are grouped by video, as the attributes of a video are cached"""
+        return seq.split('+')[0]
+
     def _get_seq_info(self):
         seq_list = []
         seq_lengths = {}
@@ -165,6 +208,13 @@ class MotChallenge2DBox_my(_BaseDataset):
             if not os.path.isfile(seqmap_file):
                 print('no seqmap found: ' + seqmap_file)
                 raise TrackEvalException('no seqmap found: ' + os.path.basename(seqmap_file))
+            # Sequence lengths are resolved once per video (not per expression), optionally from a sidecar file.
+            seq_lengths_file = os.path.splitext(seqmap_file)[0] + '.seqlengths'
+            if self.config['SEQ_LENGTHS_SIDECAR'] and os.path.isfile(seq_lengths_file):
+                video_lengths = self._load_video_lengths(seq_lengths_file)
+            else:
+                video_lengths = {}
+            num_known_videos = len(video_lengths)
             with open(seqmap_file) as fp:
                 reader = csv.reader(fp)
                 for i, row in enumerate(reader):
@@ -174,33 +224,97 @@ class MotChallenge2DBox_my(_BaseDataset):
                     #     continue
                     seq = row[0].split('+')[0]
                     seq_list.append(row[0])
-                    # ini_file = os.path.join('/data/Dadataset')
-                    if 'MOT' in seq:
-                        ini_file = os.path.join(self.gt_fol, seq, 'seqinfo.ini')
-                        if not os.path.isfile(ini_file):
-                            raise TrackEvalException('ini file does not exist: ' + seq + '/' + os.path.basename(ini_file))
-                        ini_data = configparser.ConfigParser()
-                        ini_data.read(ini_file)
-                        seq_lengths[row[0]] = int(ini_data['Sequence']['seqLength'])
-                    else:
-                        img_path = os.path.join('/home/data/UAV-RMOT/rmot_train/training/image_02', seq)
-                        img_list = os.listdir(img_path)
-                        seq_lengths[row[0]] = int(len(img_list))
+                    if seq not in video_lengths:
+                        video_lengths[seq] = self._get_video_length(seq)
+                    seq_lengths[row[0]] = video_lengths[seq]
+            if self.config['SEQ_LENGTHS_SIDECAR'] and len(video_lengths) > num_known_videos:
+                self._save_video_lengths(seq_lengths_file, video_lengths)
         return seq_list, seq_lengths
 
-    def _load_raw_file(self, tracker, seq, is_gt):
-        """Load a file (gt or tracker) in the MOT Challenge 2D box format
+    def _get_video_length(self, seq):
+        """Get the number of timesteps of a video, from its seqinfo.ini for MOT or by counting its images otherwise"""
+        if 'MOT' in seq:
+            ini_file = os.path.join(self.gt_fol, seq, 'seqinfo.ini')
+            if not os.path.isfile(ini_file):
+                raise TrackEvalException('ini file does not exist: ' + seq + '/' + os.path.basename(ini_file))
+            ini_data = configparser.ConfigParser()
+            ini_data.read(ini_file)
+            return int(ini_data['Sequence']['seqLength'])
+        img_path = os.path.join(self.config['IMAGE_FOLDER'], seq)
+        if not os.path.isdir(img_path):
+            raise TrackEvalException('image folder does not exist for sequence: ' + seq)
+        return len(os.listdir(img_path))
 
-        If is_gt, this returns a dict which contains the fields:
-        [gt_ids, gt_classes] : list (for each timestep) of 1D NDArrays (for each det).
-        [gt_dets, gt_crowd_ignore_regions]: list (for each timestep) of lists of detections.
-        [gt_extras] : list (for each timestep) of dicts (for each extra) of 1D NDArrays (for each det).
+    @staticmethod
+    def _load_video_lengths(file):
+        """Load video lengths from a .seqlengths file, which has one 'video,length' row per video"""
+        video_lengths = {}
+        with open(file) as fp:
+            for row in csv.reader(fp):
+                if len(row) == 2:
+                    video_lengths[row[0]] = int(row[1])
+        return video_lengths
 
-        if not is_gt, this returns a dict which contains the fields:
-        [tracker_ids, tracker_classes, tracker_confidences] : list (for each timestep) of 1D NDArrays (for each det).
-        [tracker_dets]: list (for each timestep) of lists of detections.
+    @staticmethod
+    def _save_video_lengths(file, video_lengths):
+        """Save video lengths to a .seqlengths file, which has one 'video,length' row per video"""
+        with open(file, 'w', newline='') as fp:
+            writer = csv.writer(fp)
+            for video, length in sorted(video_lengths.items()):
+                writer.writerow([video, length])
+
+    def get_attribute_masks(self, seq):
+        """ Returns a boolean NDArray (timesteps x attributes) of the attribute flags of the video of a sequence.
+        Timesteps beyond the end of the attribute file, and all timesteps of videos without an attribute file, have no
+        attributes.
         """
-        # File location
+        video_id = seq.split('+')[0]
+        num_timesteps = self.seq_lengths[seq]
+        if video_id not in self._video_attribute_masks:
+            attribute_file = os.path.join(self.attribute_fol, video_id + '.txt')
+            if os.path.isfile(attribute_file):
+                try:
+                    flags = self._load_text_file_as_array(attribute_file)
+                except ValueError:
+                    raise TrackEvalException('Cannot convert attribute data for video %s to float. Is data corrupted?'
+                                             % video_id)
+                if flags.shape[0] > 0 and flags.shape[1] != len(self.attribute_list):
+                    raise TrackEvalException('Attribute file for video %s has %i columns, but %i attributes are given.'
+                                             % (video_id, flags.shape[1], len(self.attribute_list)))
+                self._video_attribute_masks[video_id] = np.equal(flags, 1).reshape(-1, len(self.attribute_list))
+            else:
+                print('Attribute file not found, no attributes are evaluated for video: ' + video_id)
+                self._video_attribute_masks[video_id] = np.zeros((0, len(self.attribute_list)), dtype=bool)
+        video_masks = self._video_attribute_masks[video_id]
+        attribute_masks = np.zeros((num_timesteps, len(self.attribute_list)), dtype=bool)
+        num_flagged = min(num_timesteps, video_masks.shape[0])
+        attribute_masks[:num_flagged] = video_masks[:num_flagged]
+        return attribute_masks
+
+    def get_seq_hash(self, tracker, seq):
+        """Returns a hash of the gt and tracker data of a sequence, its length, attributes and preprocessing config"""
+        seq_hash = hashlib.sha1()
+        for is_gt in [True, False]:
+            if self.data_is_packed:
+                seq_hash.update(self._load_packed_rows(tracker, seq, is_gt).tobytes())
+            else:
+                file, zip_file = self._get_file_location(tracker, seq, is_gt)
+                if self.data_is_zipped:
+                    with zipfile.ZipFile(zip_file, 'r') as archive:
+                        seq_hash.update(archive.read(file))
+                else:
+                    with open(file, 'rb') as fp:
+                        seq_hash.update(fp.read())
+            seq_hash.update(b'\n--\n')
+        config_keys = ['BENCHMARK', 'CLASSES_TO_EVAL', 'DO_PREPROC', 'INPUT_AS_PACKED']
+        seq_hash.update(repr([self.seq_lengths[seq]] + [self.config[k] for k in config_keys]).encode())
+        if self.attribute_list:
+            seq_hash.update(repr(self.attribute_list).encode())
+            seq_hash.update(self.get_attribute_masks(seq).tobytes())
+        return seq_hash.hexdigest()
+
+    def _get_file_location(self, tracker, seq, is_gt):
+        """Returns the file (and the zip file it is in, or None) containing the gt or tracker data of a sequence"""
         if self.data_is_zipped:
             if is_gt:
                 zip_file = os.path.join(self.gt_fol, 'data.zip')
@@ -216,9 +330,39 @@ class MotChallenge2DBox_my(_BaseDataset):
             else:
                 # file = os.path.join(self.tracker_fol, tracker, self.tracker_sub_fol, seq + '.txt')
                 file = os.path.join(self.tracker_fol, seq.split('+')[0], seq.split('+')[1], 'predict.txt')
+        return file, zip_file
 
-        # Load raw data from text file
-        read_data, ignore_data = self._load_simple_text_file(file, is_zipped=self.data_is_zipped, zip_file=zip_file)
+    def _load_raw_file(self, tracker, seq, is_gt):
+        """Load a file (gt or tracker) in the MOT Challenge 2D box format
+
+        If is_gt, this returns a dict which contains the fields:
+        [gt_ids, gt_classes] : list (for each timestep) of 1D NDArrays (for each det).
+        [gt_dets, gt_crowd_ignore_regions]: list (for each timestep) of lists of detections.
+        [gt_extras] : list (for each timestep) of dicts (for each extra) of 1D NDArrays (for each det).
+        [gt_preproc] : dict (for each class) of the tracker independent part of its preprocessing, filled in by
+            get_preprocessed_seq_data. It is shared by all trackers evaluated with the same raw gt data.
+
+        if not is_gt, this returns a dict which contains the fields:
+        [tracker_ids, tracker_classes, tracker_confidences] : list (for each timestep) of 1D NDArrays (for each det).
+        [tracker_dets]: list (for each timestep) of lists of detections.
+        """
+        file, zip_file = self._get_file_location(tracker, seq, is_gt)
+
+        # Load raw data from text file (as one float array) and separate it by timestep
+        try:
+            if self.data_is_packed:
+                file_data = self._load_packed_rows(tracker, seq, is_gt)
+            else:
+                file_data = self._load_text_file_as_array(file, is_zipped=self.data_is_zipped, zip_file=zip_file)
+        except ValueError:
+            if is_gt:
+                raise TrackEvalException(
+                    'Cannot convert gt data for sequence %s to float. Is data corrupted?' % seq)
+            else:
+                raise TrackEvalException(
+                    'Cannot convert tracking data from tracker %s, sequence %s to float. Is data corrupted?' % (
+                        tracker, seq))
+        timesteps, time_data_list = self._split_by_timestep(file_data)
 
         # Convert data to required format
         num_timesteps = self.seq_lengths[seq]
@@ -230,8 +374,7 @@ class MotChallenge2DBox_my(_BaseDataset):
         raw_data = {key: [None] * num_timesteps for key in data_keys}
 
         # Check for any extra time keys
-        current_time_keys = [str( t+ 1) for t in range(num_timesteps)]
-        extra_time_keys = [x for x in read_data.keys() if x not in current_time_keys]
+        extra_time_keys = timesteps[(timesteps < 1) | (timesteps > num_timesteps)]
         if len(extra_time_keys) > 0:
             if is_gt:
                 text = 'Ground-truth'
@@ -240,20 +383,13 @@ class MotChallenge2DBox_my(_BaseDataset):
             raise TrackEvalException(
                 text + ' data contains the following invalid timesteps in seq %s: ' % seq + ', '.join(
                     [str(x) + ', ' for x in extra_time_keys]))
+        read_data = [None] * num_timesteps
+        for timestep, time_data in zip(timesteps, time_data_list):
+            read_data[timestep - 1] = time_data
 
         for t in range(num_timesteps):
-            time_key = str(t+1)
-            if time_key in read_data.keys():
-                try:
-                    time_data = np.asarray(read_data[time_key], dtype=float)
-                except ValueError:
-                    if is_gt:
-                        raise TrackEvalException(
-                            'Cannot convert gt data for sequence %s to float. Is data corrupted?' % seq)
-                    else:
-                        raise TrackEvalException(
-                            'Cannot convert tracking data from tracker %s, sequence %s to float. Is data corrupted?' % (
-                                tracker, seq))
+            time_data = read_data[t]
+            if time_data is not None:
                 try:
                     raw_data['dets'][t] = np.atleast_2d(time_data[:, 2:6])
                     raw_data['ids'][t] = np.atleast_1d(time_data[:, 1]).astype(int)
@@ -302,10 +438,104 @@ class MotChallenge2DBox_my(_BaseDataset):
                        'dets': 'tracker_dets'}
         for k, v in key_map.items():
             raw_data[v] = raw_data.pop(k)
+        if is_gt:
+            raw_data['gt_preproc'] = {}
         raw_data['num_timesteps'] = num_timesteps
         raw_data['seq'] = seq
         return raw_data
 
+    # Fields of the raw data (see _load_raw_file) which are needed to preprocess a single timestep.
+    raw_timestep_keys = ['gt_ids', 'gt_dets', 'gt_classes', 'tracker_ids', 'tracker_dets', 'tracker_classes',
+                         'tracker_confidences']
+
+    # Columns of the packed data. Column 6 holds zero_marked for gt and the confidence for tracker data.
+    packed_columns = ['frame', 'id', 'x', 'y', 'w', 'h', 'zero_marked/confidence', 'class']
+
+    def write_packed_data(self, tracker=None):
+        """ One-time conversion of the gt and tracker text files of all sequences into the packed binary format, which
+        is read instead of the text files if INPUT_AS_PACKED is True. The data of each tracker is packed separately,
+        into TRACKERS_FOLDER/tracker_name/PACKED_SUB_FOLDER (for all trackers to evaluate, or only the given tracker):
+            rows.npy: a single float array with all dets of all sequences (in the packed_columns layout), grouped by
+                sequence and sorted by frame within each sequence. It is memory-mapped when loaded.
+            index.npz: the tracker and sequence names, and the start and end row of the gt and tracker data for each
+                sequence.
+        The packed data has to be written again if any of the text files change.
+        """
+        if self.data_is_packed:
+            raise TrackEvalException('Cannot write packed data while reading packed data (INPUT_AS_PACKED is True).')
+        trackers = self.tracker_list if tracker is None else [tracker]
+        if len(trackers) == 0:
+            raise TrackEvalException('No trackers are given to write packed data for (see TRACKERS_TO_EVAL).')
+        for tracker in trackers:
+            rows = []
+            offsets = np.zeros((len(self.seq_list), 2, 2), dtype=np.int64)
+            num_rows = 0
+            for i, seq in enumerate(self.seq_list):
+                for j, is_gt in enumerate([True, False]):
+                    file, zip_file = self._get_file_location(tracker, seq, is_gt)
+                    file_data = self._load_text_file_as_array(file, is_zipped=self.data_is_zipped, zip_file=zip_file)
+                    if file_data.shape[0] > 0:
+                        if file_data.shape[1] < 7 or (is_gt and file_data.shape[1] < 8):
+                            raise TrackEvalException('Cannot pack data from file %s, because there is not enough '
+                                                     'columns in the data.' % file)
+                        if file_data.shape[1] < 8:
+                            # Tracker data without a class column is treated as pedestrian, as in _load_raw_file.
+                            file_data = np.concatenate((file_data, np.ones((file_data.shape[0], 1))), axis=1)
+                        file_data = file_data[np.argsort(file_data[:, 0].astype(int), kind='stable'), :8]
+                        rows.append(file_data)
+                    offsets[i, j] = [num_rows, num_rows + file_data.shape[0]]
+                    num_rows += file_data.shape[0]
+            rows = np.concatenate(rows) if len(rows) > 0 else np.empty((0, len(self.packed_columns)))
+
+            packed_fol = self._get_packed_fol(tracker)
+            os.makedirs(packed_fol, exist_ok=True)
+            np.save(os.path.join(packed_fol, 'rows.npy'), rows)
+            np.savez(os.path.join(packed_fol, 'index.npz'), tracker=np.array(tracker), seqs=np.array(self.seq_list),
+                     offsets=offsets, columns=np.array(self.packed_columns))
+            print('Packed data of %i sequence(s) written to %s' % (len(self.seq_list), packed_fol))
+
+    def _get_packed_fol(self, tracker):
+        """Returns the folder of the packed data of a tracker"""
+        return os.path.join(self.tracker_fol, tracker, self.packed_sub_fol)
+
+    def _load_packed_index(self, tracker):
+        """Loads the index of the packed data of a tracker and checks that it contains all sequences to be evaluated"""
+        packed_fol = self._get_packed_fol(tracker)
+        index_file = os.path.join(packed_fol, 'index.npz')
+        if not os.path.isfile(index_file) or not os.path.isfile(os.path.join(packed_fol, 'rows.npy')):
+            print('Packed data not found: ' + packed_fol)
+            raise TrackEvalException('Packed data not found for tracker %s, it can be written with write_packed_data.'
+                                     % tracker)
+        with np.load(index_file) as index:
+            if list(index['columns']) != self.packed_columns or 'tracker' not in index.files:
+                raise TrackEvalException('Packed data of tracker %s has an invalid layout, please write it again.'
+                                         % tracker)
+            if str(index['tracker']) != tracker:
+                raise TrackEvalException('Packed data in the folder of tracker %s was written for tracker %s.'
+                                         % (tracker, index['tracker']))
+            self._packed_offsets[tracker] = dict(zip(index['seqs'], index['offsets']))
+        missing_seqs = [seq for seq in self.seq_list if seq not in self._packed_offsets[tracker]]
+        if len(missing_seqs) > 0:
+            raise TrackEvalException('Packed data of tracker %s does not contain the following sequences: ' % tracker +
+                                     ', '.join(missing_seqs))
+
+    def _load_packed_rows(self, tracker, seq, is_gt):
+        """ Returns the packed gt or tracker rows of a sequence, as a view of the memory-mapped packed data of a
+        tracker. The gt is the same in the packed data of all trackers, so if no tracker is given (e.g. to only load
+        the gt) the first tracker to evaluate is used.
+        """
+        if tracker is None:
+            tracker = self.tracker_list[0]
+        if tracker not in self._packed_offsets:
+            self._load_packed_index(tracker)
+        if tracker not in self._packed_rows:
+            self._packed_rows[tracker] = np.load(os.path.join(self._get_packed_fol(tracker), 'rows.npy'),
+                                                 mmap_mode='r')
+        start, end = self._packed_offsets[tracker][seq][0 if is_gt else 1]
+        if start == end:
+            return np.empty((0, 0))
+        return np.asarray(self._packed_rows[tracker][start:end])
+
     @_timing.time
     def get_preprocessed_seq_data(self, raw_data, cls):
         """ Preprocess data for a single sequence for a single class ready for evaluation.
@@ -342,57 +572,126 @@ class MotChallenge2DBox_my(_BaseDataset):
         # Check that input data has unique ids
         self._check_unique_ids(raw_data)
 
-        distractor_class_names = ['person_on_vehicle', 'static_person', 'distractor', 'reflection']
-        if self.benchmark == 'MOT20':
-            distractor_class_names.append('non_mot_vehicle')
-        distractor_classes = [self.class_name_to_class_id[x] for x in distractor_class_names]
-        cls_id = self.class_name_to_class_id[cls]
+        distractor_classes = self._get_distractor_classes()
+        gt_to_keep_masks, gt_invalid_classes, gt_has_distractors = self._get_gt_preproc(raw_data, cls)
 
         data_keys = ['gt_ids', 'tracker_ids', 'gt_dets', 'tracker_dets', 'tracker_confidences', 'similarity_scores']
         data = {key: [None] * raw_data['num_timesteps'] for key in data_keys}
-        unique_gt_ids = []
-        unique_tracker_ids = []
         num_gt_dets = 0
         num_tracker_dets = 0
         for t in range(raw_data['num_timesteps']):
+            raw_data_t = {key: raw_data[key][t] for key in self.raw_timestep_keys}
+            data_t = self._preprocess_timestep(raw_data_t, raw_data['similarity_scores'][t], distractor_classes,
+                                               gt_to_keep_masks[t], gt_invalid_classes[t], gt_has_distractors[t],
+                                               raw_data['seq'], t)
+            for key in data_keys:
+                data[key][t] = data_t[key]
 
-            # Get all data
-            gt_ids = raw_data['gt_ids'][t]
-            gt_dets = raw_data['gt_dets'][t]
-            gt_classes = raw_data['gt_classes'][t]
-            gt_zero_marked = raw_data['gt_extras'][t]['zero_marked']
+            num_tracker_dets += len(data['tracker_ids'][t])
+            num_gt_dets += len(data['gt_ids'][t])
 
-            tracker_ids = raw_data['tracker_ids'][t]
-            tracker_dets = raw_data['tracker_dets'][t]
-            tracker_classes = raw_data['tracker_classes'][t]
-            tracker_confidences = raw_data['tracker_confidences'][t]
-            similarity_scores = raw_data['similarity_scores'][t]
+        # Re-label IDs such that there are no empty IDs
+        self._relabel_ids(data)
 
-            # Evaluation is ONLY valid for pedestrian class
-            if len(tracker_classes) > 0 and np.max(tracker_classes) > 1:
-                raise TrackEvalException(
-                    'Evaluation is only valid for pedestrian class. Non pedestrian class (%i) found in sequence %s at '
-                    'timestep %i.' % (np.max(tracker_classes), raw_data['seq'], t))
-
-            # Match tracker and gt dets (with hungarian algorithm) and remove tracker dets which match with gt dets
-            # which are labeled as belonging to a distractor class.
-            to_remove_tracker = np.array([], int)
-            if self.do_preproc and self.benchmark != 'MOT15' and gt_ids.shape[0] > 0 and tracker_ids.shape[0] > 0:
-
-                # Check all classes are valid:
-                invalid_classes = np.setdiff1d(np.unique(gt_classes), self.valid_class_numbers)
-                if len(invalid_classes) > 0:
-                    print(' '.join([str(x) for x in invalid_classes]))
-                    raise(TrackEvalException('Attempting to evaluate using invalid gt classes. '
-                                             'This warning only triggers if preprocessing is performed, '
-                                             'e.g. not for MOT15 or where prepropressing is explicitly disabled. '
-                                             'Please either check your gt data, or disable preprocessing. '
-                                             'The following invalid classes were found in timestep ' + str(t) + ': ' +
-                                             ' '.join([str(x) for x in invalid_classes])))
+        # Record overview statistics.
+        data['num_tracker_dets'] = num_tracker_dets
+        data['num_gt_dets'] = num_gt_dets
+        data['num_timesteps'] = raw_data['num_timesteps']
+        data['seq'] = raw_data['seq']
+
+        # Ensure again that ids are unique per timestep after preproc.
+        self._check_unique_ids(data, after_preproc=True)
 
+        return data
+
+    def get_preprocessed_timesteps(self, tracker, seq, cls, raw_gt_data=None):
+        """ Yields the preprocessed data of a single tracker on a single sequence for a class one timestep at a time
+        (see _BaseDataset.get_preprocessed_timesteps). The raw dets of the sequence are loaded at once, but the
+        similarity scores are only calculated and preprocessed for one timestep at a time, so that memory doesn't grow
+        with the similarity matrices of all timesteps of long sequences with dense gt. Ids are relabeled in order of
+        first appearance.
+        """
+        if raw_gt_data is None:
+            raw_gt_data = self.get_raw_gt_data(tracker, seq)
+        raw_tracker_data = self._load_raw_file(tracker, seq, is_gt=False)
+
+        # Check that input data has unique ids (which also holds after preprocessing, as this only removes dets)
+        self._check_unique_ids({**raw_tracker_data, **raw_gt_data})
+
+        id_maps = {'gt_ids': {}, 'tracker_ids': {}}
+        tracker_keys = ['tracker_ids', 'tracker_dets', 'tracker_classes', 'tracker_confidences']
+        for t in range(raw_gt_data['num_timesteps']):
+            raw_tracker_data_t = {key: raw_tracker_data[key][t] for key in tracker_keys}
+            yield self.get_preprocessed_timestep(raw_gt_data, t, raw_tracker_data_t, cls, id_maps)
+
+    def get_preprocessed_timestep(self, raw_gt_data, t, raw_tracker_data_t, cls, id_maps):
+        """ Calculates the similarity scores of a single timestep and preprocesses it for a class (see
+        _BaseDataset.get_preprocessed_timestep).
+        """
+        raw_data_t = {key: raw_gt_data[key][t] for key in ['gt_ids', 'gt_dets', 'gt_classes']}
+        raw_data_t.update(raw_tracker_data_t)
+        similarity_scores = self._calculate_similarities(raw_data_t['gt_dets'], raw_data_t['tracker_dets'])
+        gt_to_keep_masks, gt_invalid_classes, gt_has_distractors = self._get_gt_preproc(raw_gt_data, cls)
+        data_t = self._preprocess_timestep(raw_data_t, similarity_scores, self._get_distractor_classes(),
+                                           gt_to_keep_masks[t], gt_invalid_classes[t], gt_has_distractors[t],
+                                           raw_gt_data['seq'], t)
+        data_t['gt_ids'] = self._relabel_timestep_ids(data_t['gt_ids'], id_maps['gt_ids'])
+        data_t['tracker_ids'] = self._relabel_timestep_ids(data_t['tracker_ids'], id_maps['tracker_ids'])
+        data_t['num_gt_ids'] = len(id_maps['gt_ids'])
+        data_t['num_tracker_ids'] = len(id_maps['tracker_ids'])
+        return data_t
+
+    def _get_distractor_classes(self):
+        """Returns the class ids of the distractor classes, whose matched tracker dets are removed in preprocessing"""
+        distractor_class_names = ['person_on_vehicle', 'static_person', 'distractor', 'reflection']
+        if self.benchmark == 'MOT20':
+            distractor_class_names.append('non_mot_vehicle')
+        return [self.class_name_to_class_id[x] for x in distractor_class_names]
+
+    def _preprocess_timestep(self, raw_data_t, similarity_scores, distractor_classes, gt_to_keep_mask, invalid_classes,
+                             has_distractors, seq, t):
+        """ Preprocesses the raw data of timestep t of a sequence for a class (see get_preprocessed_seq_data), given
+        its similarity scores and the gt preprocessing of the class (from _get_gt_preproc). raw_data_t is a dict with
+        the raw_timestep_keys fields of the timestep. Returns a dict with the gt_ids, tracker_ids, gt_dets,
+        tracker_dets, tracker_confidences and similarity_scores of the timestep (ids are not relabeled).
+        With RMOT_PREPROC, data which nothing is removed from is returned as it is, without copies.
+        """
+        # Get all data
+        gt_ids = raw_data_t['gt_ids']
+        gt_dets = raw_data_t['gt_dets']
+        gt_classes = raw_data_t['gt_classes']
+
+        tracker_ids = raw_data_t['tracker_ids']
+        tracker_dets = raw_data_t['tracker_dets']
+        tracker_classes = raw_data_t['tracker_classes']
+        tracker_confidences = raw_data_t['tracker_confidences']
+
+        # Evaluation is ONLY valid for pedestrian class
+        if len(tracker_classes) > 0 and np.max(tracker_classes) > 1:
+            raise TrackEvalException(
+                'Evaluation is only valid for pedestrian class. Non pedestrian class (%i) found in sequence %s at '
+                'timestep %i.' % (np.max(tracker_classes), seq, t))
+
+        # Match tracker and gt dets (with hungarian algorithm) and remove tracker dets which match with gt dets
+        # which are labeled as belonging to a distractor class.
+        to_remove_tracker = np.array([], int)
+        if self.do_preproc and self.benchmark != 'MOT15' and gt_ids.shape[0] > 0 and tracker_ids.shape[0] > 0:
+
+            # Check all classes are valid:
+            if len(invalid_classes) > 0:
+                print(' '.join([str(x) for x in invalid_classes]))
+                raise(TrackEvalException('Attempting to evaluate using invalid gt classes. '
+                                         'This warning only triggers if preprocessing is performed, '
+                                         'e.g. not for MOT15 or where prepropressing is explicitly disabled. '
+                                         'Please either check your gt data, or disable preprocessing. '
+                                         'The following invalid classes were found in timestep ' + str(t) + ': ' +
+                                         ' '.join([str(x) for x in invalid_classes])))
+
+            # Tracker dets can only be removed by matching them to gt dets of a distractor class.
+            if has_distractors:
                 matching_scores = similarity_scores.copy()
                 matching_scores[matching_scores < 0.5 - np.finfo('float').eps] = 0
-                match_rows, match_cols = linear_sum_assignment(-matching_scores)
+                match_rows, match_cols = _assignment.max_score_assignment(matching_scores)
                 actually_matched_mask = matching_scores[match_rows, match_cols] > 0 + np.finfo('float').eps
                 match_rows = match_rows[actually_matched_mask]
                 match_cols = match_cols[actually_matched_mask]
@@ -400,58 +699,68 @@ class MotChallenge2DBox_my(_BaseDataset):
                 is_distractor_class = np.isin(gt_classes[match_rows], distractor_classes)
                 to_remove_tracker = match_cols[is_distractor_class]
 
-            # Apply preprocessing to remove all unwanted tracker dets.
-            data['tracker_ids'][t] = np.delete(tracker_ids, to_remove_tracker, axis=0)
-            data['tracker_dets'][t] = np.delete(tracker_dets, to_remove_tracker, axis=0)
-            data['tracker_confidences'][t] = np.delete(tracker_confidences, to_remove_tracker, axis=0)
+        # Apply preprocessing to remove all unwanted tracker dets.
+        data_t = {}
+        if len(to_remove_tracker) > 0 or not self.rmot_preproc:
+            data_t['tracker_ids'] = np.delete(tracker_ids, to_remove_tracker, axis=0)
+            data_t['tracker_dets'] = np.delete(tracker_dets, to_remove_tracker, axis=0)
+            data_t['tracker_confidences'] = np.delete(tracker_confidences, to_remove_tracker, axis=0)
             similarity_scores = np.delete(similarity_scores, to_remove_tracker, axis=1)
-
-            # Remove gt detections marked as to remove (zero marked), and also remove gt detections not in pedestrian
-            # class (not applicable for MOT15)
+        else:
+            data_t['tracker_ids'] = tracker_ids
+            data_t['tracker_dets'] = tracker_dets
+            data_t['tracker_confidences'] = tracker_confidences
+
+        # Remove gt detections marked as to remove (zero marked), and also remove gt detections not in pedestrian
+        # class (not applicable for MOT15)
+        if gt_to_keep_mask is None:
+            data_t['gt_ids'] = gt_ids
+            data_t['gt_dets'] = gt_dets
+            data_t['similarity_scores'] = similarity_scores
+        else:
+            data_t['gt_ids'] = gt_ids[gt_to_keep_mask]
+            data_t['gt_dets'] = gt_dets[gt_to_keep_mask, :]
+            data_t['similarity_scores'] = similarity_scores[gt_to_keep_mask]
+        return data_t
+
+    def _get_gt_preproc(self, raw_data, cls):
+        """ Returns the tracker independent part of preprocessing the gt of a sequence for a class: for each timestep,
+        the mask of gt dets to keep, the invalid gt classes (only checked if preprocessing is performed) and whether
+        there are gt dets of distractor classes.
+        With RMOT_PREPROC, the mask is None if all gt dets are kept, and the timesteps without distractor gt dets are
+        flagged, so that preprocessing can skip them. Without it, all timesteps are flagged as having distractors.
+        This is calculated once per class and stored in raw_data['gt_preproc'], which is shared by all trackers
+        evaluated with the same raw gt data.
+        """
+        if cls in raw_data['gt_preproc']:
+            return raw_data['gt_preproc'][cls]
+        cls_id = self.class_name_to_class_id[cls]
+        distractor_classes = self._get_distractor_classes()
+        gt_to_keep_masks = [None] * raw_data['num_timesteps']
+        gt_invalid_classes = [np.array([], int)] * raw_data['num_timesteps']
+        gt_has_distractors = [True] * raw_data['num_timesteps']
+        for t in range(raw_data['num_timesteps']):
+            gt_classes = raw_data['gt_classes'][t]
+            gt_zero_marked = raw_data['gt_extras'][t]['zero_marked']
             if self.do_preproc and self.benchmark != 'MOT15':
-                gt_to_keep_mask = (np.not_equal(gt_zero_marked, 0)) & \
-                                  (np.equal(gt_classes, cls_id))
+                gt_to_keep_masks[t] = (np.not_equal(gt_zero_marked, 0)) & \
+                                      (np.equal(gt_classes, cls_id))
+                if len(gt_classes) > 0:
+                    gt_invalid_classes[t] = np.setdiff1d(np.unique(gt_classes), self.valid_class_numbers)
             else:
                 # There are no classes for MOT15
-                gt_to_keep_mask = np.not_equal(gt_zero_marked, 0)
-            data['gt_ids'][t] = gt_ids[gt_to_keep_mask]
-            data['gt_dets'][t] = gt_dets[gt_to_keep_mask, :]
-            data['similarity_scores'][t] = similarity_scores[gt_to_keep_mask]
-
-            unique_gt_ids += list(np.unique(data['gt_ids'][t]))
-            unique_tracker_ids += list(np.unique(data['tracker_ids'][t]))
-            num_tracker_dets += len(data['tracker_ids'][t])
-            num_gt_dets += len(data['gt_ids'][t])
-
-        # Re-label IDs such that there are no empty IDs
-        if len(unique_gt_ids) > 0:
-            unique_gt_ids = np.unique(unique_gt_ids)
-            gt_id_map = np.nan * np.ones((np.max(unique_gt_ids) + 1))
-            gt_id_map[unique_gt_ids] = np.arange(len(unique_gt_ids))
-            for t in range(raw_data['num_timesteps']):
-                if len(data['gt_ids'][t]) > 0:
-                    data['gt_ids'][t] = gt_id_map[data['gt_ids'][t]].astype(int)
-        if len(unique_tracker_ids) > 0:
-            unique_tracker_ids = np.unique(unique_tracker_ids)
-            tracker_id_map = np.nan * np.ones((np.max(unique_tracker_ids) + 1))
-            tracker_id_map[unique_tracker_ids] = np.arange(len(unique_tracker_ids))
-            for t in range(raw_data['num_timesteps']):
-                if len(data['tracker_ids'][t]) > 0:
-                    data['tracker_ids'][t] = tracker_id_map[data['tracker_ids'][t]].astype(int)
-
-        # Record overview statistics.
-        data['num_tracker_dets'] = num_tracker_dets
-        data['num_gt_dets'] = num_gt_dets
-        data['num_tracker_ids'] = len(unique_tracker_ids)
-        data['num_gt_ids'] = len(unique_gt_ids)
-        data['num_timesteps'] = raw_data['num_timesteps']
-        data['seq'] = raw_data['seq']
-
-        # Ensure again that ids are unique per timestep after preproc.
-        self._check_unique_ids(data, after_preproc=True)
-
-        return data
+                gt_to_keep_masks[t] = np.not_equal(gt_zero_marked, 0)
+            if self.rmot_preproc:
+                gt_has_distractors[t] = bool(np.any(np.isin(gt_classes, distractor_classes)))
+                if np.all(gt_to_keep_masks[t]):
+                    gt_to_keep_masks[t] = None
+        raw_data['gt_preproc'][cls] = (gt_to_keep_masks, gt_invalid_classes, gt_has_distractors)
+        return raw_data['gt_preproc'][cls]
 
     def _calculate_similarities(self, gt_dets_t, tracker_dets_t):
         similarity_scores = self._calculate_box_ious(gt_dets_t, tracker_dets_t, box_format='xywh')
         return similarity_scores
+
+    def _calculate_seq_similarities(self, gt_dets, tracker_dets):
+        similarity_scores = self._calculate_seq_box_ious(gt_dets, tracker_dets, box_format='xywh')
+        return similarity_scores
@@ -2,13 +2,23 @@ import time
 import traceback
 from multiprocessing.pool import Pool
 from functools import partial
+import contextlib
+import math
 import os
+import pickle
+import hashlib
+import numpy as np
 from . import utils
 from .utils import TrackEvalException
 from . import _timing
+from . import _assignment
 from .metrics import Count
 
 
+# Version of the result cache (see RESULT_CACHE_FOLDER), to be increased whenever metric results change.
+RESULT_CACHE_VERSION = 1
+
+
 class Evaluator:
     """Evaluator class for evaluating different metrics for different datasets"""
 
@@ -19,6 +29,7 @@ class Evaluator:
         default_config = {
             'USE_PARALLEL': False,
             'NUM_PARALLEL_CORES': 8,
+            'CHUNKS_PER_CORE': 4,  # Sequences are split into about this many chunks per core (keeping groups together)
             'BREAK_ON_ERROR': True,  # Raises exception and exits with error
             'RETURN_ON_ERROR': False,  # if not BREAK_ON_ERROR, then returns from function on error
             'LOG_ON_ERROR': os.path.join(code_path, 'error_log.txt'),  # if not None, save any errors into a log file.
@@ -33,6 +44,15 @@ class Evaluator:
             'OUTPUT_EMPTY_CLASSES': True,  # If False, summary files are not output for classes with no detections
             'OUTPUT_DETAILED': True,
             'PLOT_CURVES': True,
+            'TRACKERS_IN_INNER_LOOP': False,  # If True, all trackers are evaluated together on each sequence in turn,
+                                              # loading and preprocessing the gt of each sequence only once. If
+                                              # this fails, the error is handled as an error of every tracker.
+            'STREAMING_EVAL': False,  # If True, each sequence is evaluated timestep by timestep with metric
+                                      # accumulators, without holding the data of the whole sequence in memory.
+                                      # Not used for datasets with attributes.
+
+            'RESULT_CACHE_FOLDER': None,  # If not None, results of each sequence are saved to (and re-used from)
+                                          # this folder, keyed by hashes of the sequence's inputs and metric configs.
         }
         return default_config
 
@@ -45,6 +65,166 @@ class Evaluator:
             if self.config['DISPLAY_LESS_PROGRESS']:
                 _timing.DISPLAY_LESS_PROGRESS = True
 
+    def _evaluate_sequences(self, eval_func, dataset, trackers, seq_list, class_list, metrics_list, metric_names,
+                            pool=None):
+        """ Evaluates one or more trackers on each sequence (with eval_func), in parallel (with a pool from
+        _get_worker_pool) or in series. When there are several trackers, the gt of each sequence is loaded only once and
+        shared by all of them.
+        If RESULT_CACHE_FOLDER is given, sequences whose inputs and metric configs are unchanged since an earlier run
+        are loaded from the cache instead, and the results of all other sequences are added to it.
+        Returns a dict (for each tracker) of dicts of the results of each sequence.
+        """
+        config = self.config
+        res = {tracker: {} for tracker in trackers}
+        cache_files = {tracker: {} for tracker in trackers}
+        if config['RESULT_CACHE_FOLDER'] is not None:
+            metrics_key = self._get_metrics_cache_key(eval_func, class_list, metrics_list, metric_names)
+            for tracker in trackers:
+                for seq in seq_list:
+                    seq_hash = dataset.get_seq_hash(tracker, seq)
+                    if seq_hash is None:
+                        continue
+                    cache_key = hashlib.sha1((seq_hash + metrics_key).encode()).hexdigest()
+                    cache_files[tracker][seq] = os.path.join(config['RESULT_CACHE_FOLDER'], cache_key + '.pkl')
+                    if os.path.isfile(cache_files[tracker][seq]):
+                        with open(cache_files[tracker][seq], 'rb') as f:
+                            res[tracker][seq] = pickle.load(f)
+            print('Loaded results of %i of %i sequence(s) from the result cache'
+                  % (sum(len(tracker_res) for tracker_res in res.values()), len(trackers) * len(seq_list)))
+        # Sequences that are missing for any tracker are evaluated for all trackers.
+        seqs_to_eval = [seq for seq in seq_list if any(seq not in tracker_res for tracker_res in res.values())]
+
+        if config['USE_PARALLEL']:
+            _eval_chunk = partial(_eval_sequence_chunk, eval_func, trackers)
+            for chunk_res in pool.imap_unordered(_eval_chunk, self._get_seq_chunks(dataset, seqs_to_eval)):
+                for tracker, seq, seq_res in chunk_res:
+                    res[tracker][seq] = seq_res
+            seq_order = seq_list
+        else:
+            for tracker, seq, seq_res in eval_sequence_chunk(sorted(seqs_to_eval), dataset, trackers, eval_func,
+                                                             class_list, metrics_list, metric_names):
+                res[tracker][seq] = seq_res
+            seq_order = sorted(seq_list)
+
+        # Save newly evaluated sequences to the cache (via a temporary file, so that no partial files are left).
+        if config['RESULT_CACHE_FOLDER'] is not None:
+            os.makedirs(config['RESULT_CACHE_FOLDER'], exist_ok=True)
+            for tracker in trackers:
+                for seq in seqs_to_eval:
+                    if seq in cache_files[tracker]:
+                        tmp_file = cache_files[tracker][seq] + '.%i.tmp' % os.getpid()
+                        with open(tmp_file, 'wb') as f:
+                            pickle.dump(res[tracker][seq], f)
+                        os.replace(tmp_file, cache_files[tracker][seq])
+        return {tracker: {seq: res[tracker][seq] for seq in seq_order} for tracker in trackers}
+
+    def _get_worker_pool(self, dataset, class_list, metrics_list, metric_names):
+        """ Returns a pool of worker processes for evaluating sequences of dataset in parallel, or a null context if
+        USE_PARALLEL is False. The dataset and metrics are sent to each worker only once, when it is started, and are
+        kept (together with anything the dataset caches) for all trackers.
+        """
+        if not self.config['USE_PARALLEL']:
+            return contextlib.nullcontext()
+        return Pool(self.config['NUM_PARALLEL_CORES'], initializer=_init_worker,
+                    initargs=(dataset, class_list, metrics_list, metric_names))
+
+    def _get_seq_chunks(self, dataset, seq_list):
+        """ Splits sequences into chunks for the worker processes. Sequences of the same group (see
+        dataset.get_seq_group) are kept together, apart from groups larger than the chunk size, which are split into
+        consecutive chunks. Chunks are returned largest first, so that the last chunks to finish are small.
+        """
+        chunk_size = max(1, math.ceil(len(seq_list) / (self.config['NUM_PARALLEL_CORES'] *
+                                                       self.config['CHUNKS_PER_CORE'])))
+        groups = {}
+        for seq in seq_list:
+            groups.setdefault(dataset.get_seq_group(seq), []).append(seq)
+        chunks = [group[i:i + chunk_size] for group in groups.values() for i in range(0, len(group), chunk_size)]
+        return sorted(chunks, key=len, reverse=True)
+
+    @staticmethod
+    def _get_metrics_cache_key(eval_func, class_list, metrics_list, metric_names):
+        """Returns a string identifying everything apart from the sequence inputs which the cached results depend on"""
+        metrics_key = [RESULT_CACHE_VERSION, eval_func.__name__, list(class_list)]
+        for metric, metric_name in zip(metrics_list, metric_names):
+            metric_config = getattr(metric, 'config', None) or {}
+            metrics_key.append((metric_name, metric.fields, list(metric.array_labels),
+                                sorted((k, v) for k, v in metric_config.items() if k != 'PRINT_CONFIG')))
+        return repr(metrics_key)
+
+    @staticmethod
+    def _combine_results(res, dataset, class_list, metrics_list, metric_names):
+        """ Combines the results of all sequences (res[seq][class][metric_name]) for each class, and then over classes.
+        The combined results are added to res under 'COMBINED_SEQ'. Returns the keys of the combined classes.
+        """
+        # collecting combined cls keys (cls averaged, det averaged, super classes)
+        combined_cls_keys = []
+        res['COMBINED_SEQ'] = {}
+        # combine sequences for each class
+        for c_cls in class_list:
+            res['COMBINED_SEQ'][c_cls] = {}
+            for metric, metric_name in zip(metrics_list, metric_names):
+                curr_res = {seq_key: seq_value[c_cls][metric_name] for seq_key, seq_value in res.items() if
+                            seq_key != 'COMBINED_SEQ'}
+                res['COMBINED_SEQ'][c_cls][metric_name] = metric.combine_sequences(curr_res)
+        # combine classes
+        if dataset.should_classes_combine:
+            combined_cls_keys += ['cls_comb_cls_av', 'cls_comb_det_av', 'all']
+            res['COMBINED_SEQ']['cls_comb_cls_av'] = {}
+            res['COMBINED_SEQ']['cls_comb_det_av'] = {}
+            for metric, metric_name in zip(metrics_list, metric_names):
+                cls_res = {cls_key: cls_value[metric_name] for cls_key, cls_value in
+                           res['COMBINED_SEQ'].items() if cls_key not in combined_cls_keys}
+                res['COMBINED_SEQ']['cls_comb_cls_av'][metric_name] = \
+                    metric.combine_classes_class_averaged(cls_res)
+                res['COMBINED_SEQ']['cls_comb_det_av'][metric_name] = \
+                    metric.combine_classes_det_averaged(cls_res)
+        # combine classes to super classes
+        if dataset.use_super_categories:
+            for cat, sub_cats in dataset.super_categories.items():
+                combined_cls_keys.append(cat)
+                res['COMBINED_SEQ'][cat] = {}
+                for metric, metric_name in zip(metrics_list, metric_names):
+                    cat_res = {cls_key: cls_value[metric_name] for cls_key, cls_value in
+                               res['COMBINED_SEQ'].items() if cls_key in sub_cats}
+                    res['COMBINED_SEQ'][cat][metric_name] = metric.combine_classes_det_averaged(cat_res)
+        return combined_cls_keys
+
+    def _output_results(self, res, combined_cls_keys, dataset, metrics_list, metric_names, tracker_display_name,
+                        output_fol):
+        """Prints and outputs the (combined) results of a tracker in various formats"""
+        config = self.config
+        for c_cls in res['COMBINED_SEQ'].keys():  # class_list + combined classes if calculated
+            summaries = []
+            details = []
+            num_dets = res['COMBINED_SEQ'][c_cls]['Count']['Dets']
+            if config['OUTPUT_EMPTY_CLASSES'] or num_dets > 0:
+                for metric, metric_name in zip(metrics_list, metric_names):
+                    # for combined classes there is no per sequence evaluation
+                    if c_cls in combined_cls_keys:
+                        table_res = {'COMBINED_SEQ': res['COMBINED_SEQ'][c_cls][metric_name]}
+                    else:
+                        table_res = {seq_key: seq_value[c_cls][metric_name] for seq_key, seq_value
+                                     in res.items()}
+
+                    if config['PRINT_RESULTS'] and config['PRINT_ONLY_COMBINED']:
+                        dont_print = dataset.should_classes_combine and c_cls not in combined_cls_keys
+                        if not dont_print:
+                            metric.print_table({'COMBINED_SEQ': table_res['COMBINED_SEQ']},
+                                               tracker_display_name, c_cls)
+                    elif config['PRINT_RESULTS']:
+                        metric.print_table(table_res, tracker_display_name, c_cls)
+                    if config['OUTPUT_SUMMARY']:
+                        summaries.append(metric.summary_results(table_res))
+                    if config['OUTPUT_DETAILED']:
+                        details.append(metric.detailed_results(table_res))
+                    if config['PLOT_CURVES']:
+                        metric.plot_single_tracker_results(table_res, tracker_display_name, c_cls,
+                                                           output_fol)
+                if config['OUTPUT_SUMMARY']:
+                    utils.write_summary_results(summaries, c_cls, output_fol)
+                if config['OUTPUT_DETAILED']:
+                    utils.write_detailed_results(details, c_cls, output_fol)
+
     @_timing.time
     def evaluate(self, dataset_list, metrics_list):
         """Evaluate a set of metrics on a set of datasets"""
@@ -64,131 +244,293 @@ class Evaluator:
                   'metrics: %s\n' % (len(tracker_list), len(seq_list), len(class_list), dataset_name,
                                      ', '.join(metric_names)))
 
-            # Evaluate each tracker
-            for tracker in tracker_list:
-                # if not config['BREAK_ON_ERROR'] then go to next tracker without breaking
-                try:
-                    # Evaluate each sequence in parallel or in series.
-                    # returns a nested dict (res), indexed like: res[seq][class][metric_name][sub_metric field]
-                    # e.g. res[seq_0001][pedestrian][hota][DetA]
-                    print('\nEvaluating %s\n' % tracker)
-                    time_start = time.time()
-                    if config['USE_PARALLEL']:
-                        with Pool(config['NUM_PARALLEL_CORES']) as pool:
-                            _eval_sequence = partial(eval_sequence, dataset=dataset, tracker=tracker,
-                                                     class_list=class_list, metrics_list=metrics_list,
-                                                     metric_names=metric_names)
-                            results = pool.map(_eval_sequence, seq_list)
-                            res = dict(zip(seq_list, results))
-                    else:
-                        res = {}
-                        for curr_seq in sorted(seq_list):
-                            res[curr_seq] = eval_sequence(curr_seq, dataset, tracker, class_list, metrics_list,
-                                                          metric_names)
-
-                    # Combine results over all sequences and then over all classes
-
-                    # collecting combined cls keys (cls averaged, det averaged, super classes)
-                    combined_cls_keys = []
-                    res['COMBINED_SEQ'] = {}
-                    # combine sequences for each class
-                    for c_cls in class_list:
-                        res['COMBINED_SEQ'][c_cls] = {}
-                        for metric, metric_name in zip(metrics_list, metric_names):
-                            curr_res = {seq_key: seq_value[c_cls][metric_name] for seq_key, seq_value in res.items() if
-                                        seq_key != 'COMBINED_SEQ'}
-                            res['COMBINED_SEQ'][c_cls][metric_name] = metric.combine_sequences(curr_res)
-                    # combine classes
-                    if dataset.should_classes_combine:
-                        combined_cls_keys += ['cls_comb_cls_av', 'cls_comb_det_av', 'all']
-                        res['COMBINED_SEQ']['cls_comb_cls_av'] = {}
-                        res['COMBINED_SEQ']['cls_comb_det_av'] = {}
-                        for metric, metric_name in zip(metrics_list, metric_names):
-                            cls_res = {cls_key: cls_value[metric_name] for cls_key, cls_value in
-                                       res['COMBINED_SEQ'].items() if cls_key not in combined_cls_keys}
-                            res['COMBINED_SEQ']['cls_comb_cls_av'][metric_name] = \
-                                metric.combine_classes_class_averaged(cls_res)
-                            res['COMBINED_SEQ']['cls_comb_det_av'][metric_name] = \
-                                metric.combine_classes_det_averaged(cls_res)
-                    # combine classes to super classes
-                    if dataset.use_super_categories:
-                        for cat, sub_cats in dataset.super_categories.items():
-                            combined_cls_keys.append(cat)
-                            res['COMBINED_SEQ'][cat] = {}
-                            for metric, metric_name in zip(metrics_list, metric_names):
-                                cat_res = {cls_key: cls_value[metric_name] for cls_key, cls_value in
-                                           res['COMBINED_SEQ'].items() if cls_key in sub_cats}
-                                res['COMBINED_SEQ'][cat][metric_name] = metric.combine_classes_det_averaged(cat_res)
-
-                    # Print and output results in various formats
-                    if config['TIME_PROGRESS']:
-                        print('\nAll sequences for %s finished in %.2f seconds' % (tracker, time.time() - time_start))
-                    output_fol = dataset.get_output_fol(tracker)
-                    tracker_display_name = dataset.get_display_name(tracker)
-                    for c_cls in res['COMBINED_SEQ'].keys():  # class_list + combined classes if calculated
-                        summaries = []
-                        details = []
-                        num_dets = res['COMBINED_SEQ'][c_cls]['Count']['Dets']
-                        if config['OUTPUT_EMPTY_CLASSES'] or num_dets > 0:
-                            for metric, metric_name in zip(metrics_list, metric_names):
-                                # for combined classes there is no per sequence evaluation
-                                if c_cls in combined_cls_keys:
-                                    table_res = {'COMBINED_SEQ': res['COMBINED_SEQ'][c_cls][metric_name]}
-                                else:
-                                    table_res = {seq_key: seq_value[c_cls][metric_name] for seq_key, seq_value
-                                                 in res.items()}
-
-                                if config['PRINT_RESULTS'] and config['PRINT_ONLY_COMBINED']:
-                                    dont_print = dataset.should_classes_combine and c_cls not in combined_cls_keys
-                                    if not dont_print:
-                                        metric.print_table({'COMBINED_SEQ': table_res['COMBINED_SEQ']},
-                                                           tracker_display_name, c_cls)
-                                elif config['PRINT_RESULTS']:
-                                    metric.print_table(table_res, tracker_display_name, c_cls)
-                                if config['OUTPUT_SUMMARY']:
-                                    summaries.append(metric.summary_results(table_res))
-                                if config['OUTPUT_DETAILED']:
-                                    details.append(metric.detailed_results(table_res))
-                                if config['PLOT_CURVES']:
-                                    metric.plot_single_tracker_results(table_res, tracker_display_name, c_cls,
-                                                                       output_fol)
-                            if config['OUTPUT_SUMMARY']:
-                                utils.write_summary_results(summaries, c_cls, output_fol)
-                            if config['OUTPUT_DETAILED']:
-                                utils.write_detailed_results(details, c_cls, output_fol)
-
-                    # Output for returning from function
-                    output_res[dataset_name][tracker] = res
-                    output_msg[dataset_name][tracker] = 'Success'
-
-                except Exception as err:
-                    output_res[dataset_name][tracker] = None
-                    if type(err) == TrackEvalException:
-                        output_msg[dataset_name][tracker] = str(err)
-                    else:
-                        output_msg[dataset_name][tracker] = 'Unknown error occurred.'
-                    print('Tracker %s was unable to be evaluated.' % tracker)
-                    print(err)
-                    traceback.print_exc()
-                    if config['LOG_ON_ERROR'] is not None:
-                        with open(config['LOG_ON_ERROR'], 'a') as f:
-                            print(dataset_name, file=f)
-                            print(tracker, file=f)
-                            print(traceback.format_exc(), file=f)
-                            print('\n\n\n', file=f)
-                    if config['BREAK_ON_ERROR']:
-                        raise err
-                    elif config['RETURN_ON_ERROR']:
-                        return output_res, output_msg
+            if dataset.attribute_list:
+                # Each sequence is also evaluated on the timesteps of each attribute (see eval_sequence_attributes).
+                # This returns one res dict (see below) per attribute, plus 'All'.
+                _eval_func = eval_sequence_attributes
+            elif config['STREAMING_EVAL']:
+                _eval_func = eval_sequence_streaming
+            else:
+                _eval_func = eval_sequence
+
+            # Evaluate each tracker (using the same worker processes for all of them if USE_PARALLEL)
+            _assignment.reset_assignment_counts()
+            with self._get_worker_pool(dataset, class_list, metrics_list, metric_names) as pool:
+                all_tracker_res = {}
+                all_tracker_err = None
+                if config['TRACKERS_IN_INNER_LOOP']:
+                    # Evaluate all trackers together, sequence by sequence, so that each gt is only loaded once.
+                    print('\nEvaluating %s\n' % ', '.join(tracker_list))
+                    try:
+                        all_tracker_res = self._evaluate_sequences(_eval_func, dataset, tracker_list, seq_list,
+                                                                   class_list, metrics_list, metric_names, pool)
+                    except Exception as err:
+                        # The error can't be attributed to a single tracker, so it is handled below for each of them.
+                        all_tracker_err = err
+                for tracker in tracker_list:
+                    # if not config['BREAK_ON_ERROR'] then go to next tracker without breaking
+                    try:
+                        # Evaluate each sequence in parallel or in series.
+                        # returns a nested dict (res), indexed like: res[seq][class][metric_name][sub_metric field]
+                        # e.g. res[seq_0001][pedestrian][hota][DetA]
+                        time_start = time.time()
+                        if all_tracker_err is not None:
+                            raise all_tracker_err
+                        if tracker in all_tracker_res:
+                            res = all_tracker_res[tracker]
+                        else:
+                            print('\nEvaluating %s\n' % tracker)
+                            res = self._evaluate_sequences(_eval_func, dataset, [tracker], seq_list, class_list,
+                                                           metrics_list, metric_names, pool)[tracker]
+                        if dataset.attribute_list:
+                            attribute_res = {}
+                            for attribute in ['All'] + dataset.attribute_list:
+                                # Sequences without dets in any timestep of an attribute are not part of that attribute.
+                                attribute_res[attribute] = {seq_key: seq_value[attribute] for seq_key, seq_value in
+                                                            res.items() if seq_value[attribute] is not None}
+                            res = attribute_res.pop('All')
+
+                        # Combine results over all sequences and then over all classes
+                        combined_cls_keys = self._combine_results(res, dataset, class_list, metrics_list, metric_names)
+
+                        # Print and output results in various formats
+                        if config['TIME_PROGRESS']:
+                            print('\nAll sequences for %s finished in %.2f seconds' % (tracker,
+                                                                                       time.time() - time_start))
+                        output_fol = dataset.get_output_fol(tracker)
+                        tracker_display_name = dataset.get_display_name(tracker)
+                        self._output_results(res, combined_cls_keys, dataset, metrics_list, metric_names,
+                                             tracker_display_name, output_fol)
+
+                        # Combine and output results for each attribute separately, into a sub folder of output_fol.
+                        if dataset.attribute_list:
+                            for attribute, curr_res in attribute_res.items():
+                                if len(curr_res) == 0:
+                                    print('\nNo sequences with dets for attribute %s, skipping it.' % attribute)
+                                    continue
+                                combined_cls_keys = self._combine_results(curr_res, dataset, class_list, metrics_list,
+                                                                          metric_names)
+                                self._output_results(curr_res, combined_cls_keys, dataset, metrics_list, metric_names,
+                                                     tracker_display_name + '-' + attribute,
+                                                     os.path.join(output_fol, attribute))
+                            res['ATTRIBUTES'] = attribute_res
+
+                        # Output for returning from function
+                        output_res[dataset_name][tracker] = res
+                        output_msg[dataset_name][tracker] = 'Success'
+
+                    except Exception as err:
+                        output_res[dataset_name][tracker] = None
+                        if type(err) == TrackEvalException:
+                            output_msg[dataset_name][tracker] = str(err)
+                        else:
+                            output_msg[dataset_name][tracker] = 'Unknown error occurred.'
+                        print('Tracker %s was unable to be evaluated.' % tracker)
+                        print(err)
+                        traceback.print_exc()
+                        if config['LOG_ON_ERROR'] is not None:
+                            with open(config['LOG_ON_ERROR'], 'a') as f:
+                                print(dataset_name, file=f)
+                                print(tracker, file=f)
+                                print(traceback.format_exc(), file=f)
+                                print('\n\n\n', file=f)
+                        if config['BREAK_ON_ERROR']:
+                            raise err
+                        elif config['RETURN_ON_ERROR']:
+                            return output_res, output_msg
+
+            # Report how the matches of each timestep were found (only counted in this process, so not in parallel).
+            if config['TIME_PROGRESS'] and not config['USE_PARALLEL']:
+                print('\nAssignments for %s: %s' % (dataset_name, ', '.join(
+                    '%s: %i' % (key, count) for key, count in _assignment.assignment_counts.items())))
 
         return output_res, output_msg
 
 
+class IncrementalEvaluator:
+    """ Evaluates a tracker on a dataset while it is still running, e.g. to get running estimates of the metrics
+    during inference. The tracker output of each sequence is added one timestep at a time as it is produced
+    (add_timestep), and the results of the timesteps added so far can be requested at any time (get_results).
+    Each sequence keeps an accumulator for each class and metric (see _BaseAccumulator), so the timesteps which were
+    already added are not loaded or preprocessed again. Only supported for datasets which implement
+    get_preprocessed_timestep.
+    """
+
+    def __init__(self, dataset, metrics_list, tracker=None):
+        """ Initialise the evaluator with a dataset and a list of metrics. tracker is only passed to the dataset to
+        load the gt (for datasets where its location depends on the tracker).
+        """
+        self.dataset = dataset
+        self.tracker = tracker
+        self.metrics_list = metrics_list + [Count()]  # Count metrics are always run
+        self.metric_names = utils.validate_metrics_list(self.metrics_list)
+        _, _, self.class_list = dataset.get_eval_info()
+        self.seq_states = {}
+
+    def _get_seq_state(self, seq):
+        """Returns the state of a sequence, loading its gt and creating its accumulators when it is first used"""
+        if seq not in self.seq_states:
+            raw_gt_data = self.dataset.get_raw_gt_data(self.tracker, seq)
+            self.dataset._check_unique_ids({'gt_ids': raw_gt_data['gt_ids'],
+                                            'tracker_ids': [np.empty(0, dtype=int)] * raw_gt_data['num_timesteps'],
+                                            'seq': seq})
+            self.seq_states[seq] = {
+                'raw_gt_data': raw_gt_data,
+                'num_timesteps': 0,
+                'id_maps': {cls: {'gt_ids': {}, 'tracker_ids': {}} for cls in self.class_list},
+                'accumulators': {cls: [metric.get_accumulator() for metric in self.metrics_list]
+                                 for cls in self.class_list},
+            }
+        return self.seq_states[seq]
+
+    def add_timestep(self, seq, tracker_ids, tracker_dets, tracker_confidences=None, tracker_classes=None):
+        """ Adds the tracker output of the next timestep of a sequence (timesteps are added in order, starting from the
+        first one, also if they have no dets). tracker_dets are N x 4 boxes in the box format of the dataset (e.g. xywh
+        for MOT Challenge), as an array or a list (which may be empty). tracker_confidences and tracker_classes default
+        to ones.
+        """
+        state = self._get_seq_state(seq)
+        raw_gt_data = state['raw_gt_data']
+        t = state['num_timesteps']
+        if t >= raw_gt_data['num_timesteps']:
+            raise TrackEvalException('All %i timesteps of sequence %s have already been added.'
+                                     % (raw_gt_data['num_timesteps'], seq))
+        tracker_ids = np.atleast_1d(np.asarray(tracker_ids)).astype(int)
+        if len(np.unique(tracker_ids)) != len(tracker_ids):
+            raise TrackEvalException('Tracker predicts the same ID more than once in a single timestep '
+                                     '(seq: %s, frame: %i)' % (seq, t + 1))
+        tracker_dets = np.asarray(tracker_dets, dtype=float).reshape(-1, 4)
+        if len(tracker_dets) != len(tracker_ids):
+            raise TrackEvalException('Tracker gives %i dets for %i IDs (seq: %s, frame: %i)'
+                                     % (len(tracker_dets), len(tracker_ids), seq, t + 1))
+        if tracker_confidences is None:
+            tracker_confidences = np.ones(len(tracker_ids))
+        if tracker_classes is None:
+            tracker_classes = np.ones_like(tracker_ids)
+        raw_tracker_data_t = {'tracker_ids': tracker_ids,
+                              'tracker_dets': tracker_dets,
+                              'tracker_confidences': np.atleast_1d(tracker_confidences),
+                              'tracker_classes': np.atleast_1d(tracker_classes).astype(int)}
+
+        for cls in self.class_list:
+            data_t = self.dataset.get_preprocessed_timestep(raw_gt_data, t, raw_tracker_data_t, cls,
+                                                            state['id_maps'][cls])
+            for accumulator in state['accumulators'][cls]:
+                accumulator.update(data_t)
+        state['num_timesteps'] += 1
+
+    def get_results(self):
+        """ Returns the results of the timesteps added so far, as a dict (for each sequence, and for all of them
+        combined under 'COMBINED_SEQ') of dicts (for each class) of dicts (for each metric) of results, as for a single
+        tracker and dataset of Evaluator.evaluate. Sequences are only evaluated on the timesteps which have been added
+        (including their gt), so until a sequence is complete these are running estimates of its results.
+        """
+        res = {}
+        for seq, state in self.seq_states.items():
+            res[seq] = {}
+            for cls in self.class_list:
+                res[seq][cls] = {met_name: accumulator.result() for accumulator, met_name in
+                                 zip(state['accumulators'][cls], self.metric_names)}
+        if res:
+            Evaluator._combine_results(res, self.dataset, self.class_list, self.metrics_list, self.metric_names)
+        return res
+
+
+# Dataset and metrics of a worker process, set by _init_worker when the process is started.
+_worker_state = {}
+
+
+def _init_worker(dataset, class_list, metrics_list, metric_names):
+    """Initializer of the worker processes, storing the (read-only) dataset and metrics for all tasks"""
+    _worker_state['dataset'] = dataset
+    _worker_state['class_list'] = class_list
+    _worker_state['metrics_list'] = metrics_list
+    _worker_state['metric_names'] = metric_names
+
+
+def _eval_sequence_chunk(eval_func, trackers, seqs):
+    """Function for evaluating a chunk of sequences in a worker process (see eval_sequence_chunk)"""
+    return eval_sequence_chunk(seqs, _worker_state['dataset'], trackers, eval_func, _worker_state['class_list'],
+                               _worker_state['metrics_list'], _worker_state['metric_names'])
+
+
+def eval_sequence_chunk(seqs, dataset, trackers, eval_func, class_list, metrics_list, metric_names):
+    """ Function for evaluating one or more trackers on a chunk of sequences (with eval_func). With several trackers,
+    the raw gt data of each sequence is loaded once and shared by all of them.
+    Returns a list of (tracker, seq, seq_res).
+    """
+    chunk_res = []
+    for seq in seqs:
+        raw_gt_data = dataset.get_raw_gt_data(trackers[0], seq) if len(trackers) > 1 else None
+        for tracker in trackers:
+            seq_res = eval_func(seq, dataset, tracker, class_list, metrics_list, metric_names, raw_gt_data=raw_gt_data)
+            chunk_res.append((tracker, seq, seq_res))
+    return chunk_res
+
+
 @_timing.time
-def eval_sequence(seq, dataset, tracker, class_list, metrics_list, metric_names):
-    """Function for evaluating a single sequence"""
+def eval_sequence(seq, dataset, tracker, class_list, metrics_list, metric_names, raw_gt_data=None):
+    """Function for evaluating a single sequence (optionally with already loaded raw gt data)"""
+
+    raw_data = dataset.get_raw_seq_data(tracker, seq, raw_gt_data)
+    return eval_raw_seq_data(raw_data, dataset, class_list, metrics_list, metric_names)
+
+
+@_timing.time
+def eval_sequence_streaming(seq, dataset, tracker, class_list, metrics_list, metric_names, raw_gt_data=None):
+    """ Function for evaluating a single sequence timestep by timestep (optionally with already loaded raw gt data).
+    The preprocessed timesteps of each class are passed to an accumulator for each metric in turn (see
+    _BaseAccumulator), so only the data of a single timestep is held in memory at once, plus the state of the
+    accumulators.
+    """
+
+    seq_res = {}
+    for cls in class_list:
+        accumulators = [metric.get_accumulator() for metric in metrics_list]
+        for data_t in dataset.get_preprocessed_timesteps(tracker, seq, cls, raw_gt_data):
+            for accumulator in accumulators:
+                accumulator.update(data_t)
+        seq_res[cls] = {met_name: accumulator.result() for accumulator, met_name in zip(accumulators, metric_names)}
+    return seq_res
+
+
+@_timing.time
+def eval_sequence_attributes(seq, dataset, tracker, class_list, metrics_list, metric_names, raw_gt_data=None):
+    """ Function for evaluating a single sequence, both in full and on the timesteps of each of the dataset's
+    attributes.
+    The sequence is loaded, its similarities are calculated and it is preprocessed only once. The data for each
+    attribute is obtained by masking out the timesteps without that attribute, reusing the same similarity matrices.
+    Returns a dict with the seq_res for the full sequence ('All') and for each attribute. The seq_res for an attribute
+    is None if the sequence has neither gt nor tracker dets in the timesteps of that attribute.
+    """
+
+    raw_data = dataset.get_raw_seq_data(tracker, seq, raw_gt_data)
+    attribute_masks = dataset.get_attribute_masks(seq)
+    has_dets = np.array([len(gt_ids_t) > 0 or len(tracker_ids_t) > 0 for gt_ids_t, tracker_ids_t in
+                         zip(raw_data['gt_ids'], raw_data['tracker_ids'])], dtype=bool)
+    masks = {'All': None}
+    for a, attribute in enumerate(dataset.attribute_list):
+        if np.any(has_dets & attribute_masks[:, a]):
+            masks[attribute] = attribute_masks[:, a]
+
+    res = {attribute: None for attribute in dataset.attribute_list}
+    res.update({attribute: {} for attribute in masks.keys()})
+    for cls in class_list:
+        data = dataset.get_preprocessed_seq_data(raw_data, cls)
+        for attribute, mask in masks.items():
+            if mask is None:
+                attribute_data = data
+            else:
+                attribute_data = dataset.get_preprocessed_timestep_subset(data, mask)
+            res[attribute][cls] = {}
+            for metric, met_name in zip(metrics_list, metric_names):
+                res[attribute][cls][met_name] = metric.eval_sequence(attribute_data)
+    return res
+
+
+def eval_raw_seq_data(raw_data, dataset, class_list, metrics_list, metric_names):
+    """Function for evaluating the raw data of a single sequence"""
 
-    raw_data = dataset.get_raw_seq_data(tracker, seq)
     seq_res = {}
     for cls in class_list:
         seq_res[cls] = {}
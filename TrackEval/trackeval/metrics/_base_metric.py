@@ -16,6 +16,7 @@ class _BaseMetric(ABC):
         self.float_array_fields = []
         self.fields = []
         self.summary_fields = []
+        self.summary_array_index = None  # If set, array fields are summarised by this entry, instead of their mean.
         self.registered = False
 
     #####################################################################
@@ -38,6 +39,11 @@ class _BaseMetric(ABC):
     def combine_classes_det_averaged(self, all_res):
         ...
 
+    def get_accumulator(self):
+        """Returns a new accumulator (see _BaseAccumulator) for evaluating one sequence timestep by timestep. Only
+        implemented for metrics which support streaming evaluation."""
+        raise TrackEvalException('Streaming evaluation is not implemented for metric %s' % self.get_name())
+
     def plot_single_tracker_results(self, all_res, tracker, output_folder, cls):
         """Plot results of metrics, only valid for metrics with self.plottable"""
         if self.plottable:
@@ -52,6 +58,17 @@ class _BaseMetric(ABC):
     def get_name(cls):
         return cls.__name__
 
+    def _accumulate_sequence(self, data):
+        """Evaluates a whole (preprocessed) sequence by passing each of its timesteps to an accumulator in turn"""
+        accumulator = self.get_accumulator()
+        for t in range(data['num_timesteps']):
+            accumulator.update({'gt_ids': data['gt_ids'][t],
+                                'tracker_ids': data['tracker_ids'][t],
+                                'similarity_scores': data['similarity_scores'][t],
+                                'num_gt_ids': data['num_gt_ids'],
+                                'num_tracker_ids': data['num_tracker_ids']})
+        return accumulator.result()
+
     @staticmethod
     def _combine_sum(all_res, field):
         """Combine sequence results via sum"""
@@ -79,8 +96,12 @@ class _BaseMetric(ABC):
     def _summary_row(self, results_):
         vals = []
         for h in self.summary_fields:
-            if h in self.float_array_fields:
+            if h in self.float_array_fields and self.summary_array_index is None:
                 vals.append("{0:1.5g}".format(100 * np.mean(results_[h])))
+            elif h in self.float_array_fields:
+                vals.append("{0:1.5g}".format(100 * float(results_[h][self.summary_array_index])))
+            elif h in self.integer_array_fields and self.summary_array_index is not None:
+                vals.append("{0:d}".format(int(results_[h][self.summary_array_index])))
             elif h in self.float_fields:
                 vals.append("{0:1.5g}".format(100 * float(results_[h])))
             elif h in self.integer_fields:
@@ -131,3 +152,53 @@ class _BaseMetric(ABC):
                 detailed_row.append(res[h][i])
             detailed_row.append(np.mean(res[h]))
         return detailed_row
+
+
+class _BaseAccumulator(ABC):
+    """ Accumulates the state needed to evaluate a metric on one sequence, one timestep at a time, so that the data
+    of the whole sequence never has to be held in memory. Timesteps are given to update() in order, as dicts with the
+    fields (see _BaseDataset.get_preprocessed_timesteps):
+        [gt_ids, tracker_ids]: 1D NDArrays of contiguous ids, each smaller than num_gt_ids / num_tracker_ids.
+        [similarity_scores]: 2D NDArray.
+        [num_gt_ids, num_tracker_ids]: integers, the number of ids seen so far (or in the whole sequence).
+    result() returns the same results as eval_sequence of the metric on all timesteps seen so far, and can be called
+    at any time (e.g. to get running results while more timesteps are still being added).
+    """
+
+    def __init__(self, metric):
+        self.metric = metric
+        self.num_timesteps = 0
+        self.num_gt_dets = 0
+        self.num_tracker_dets = 0
+        self.num_gt_ids = 0
+        self.num_tracker_ids = 0
+
+    def update(self, data_t):
+        """Adds the data of the next timestep"""
+        self.num_timesteps += 1
+        self.num_gt_dets += len(data_t['gt_ids'])
+        self.num_tracker_dets += len(data_t['tracker_ids'])
+        self.num_gt_ids = max(self.num_gt_ids, data_t['num_gt_ids'])
+        self.num_tracker_ids = max(self.num_tracker_ids, data_t['num_tracker_ids'])
+        self._update(data_t)
+
+    @abstractmethod
+    def _update(self, data_t):
+        ...
+
+    @abstractmethod
+    def result(self):
+        ...
+
+    @staticmethod
+    def _grow(array, shape, fill_value=0):
+        """ Returns array padded with fill_value to at least the given shape. The capacity is (at least) doubled along
+        each axis that grows, so that growing the arrays of the ids seen so far one id at a time is cheap.
+        """
+        if all(size >= min_size for size, min_size in zip(array.shape, shape)):
+            return array
+        new_shape = [size if size >= min_size else max(min_size, 2 * size)
+                     for size, min_size in zip(array.shape, shape)]
+        grown = np.full(new_shape, fill_value, dtype=array.dtype)
+        grown[tuple(slice(0, size) for size in array.shape)] = array
+        return grown
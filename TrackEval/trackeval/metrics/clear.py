@@ -1,8 +1,8 @@
 
 import numpy as np
-from scipy.optimize import linear_sum_assignment
-from ._base_metric import _BaseMetric
+from ._base_metric import _BaseMetric, _BaseAccumulator
 from .. import _timing
+from .. import _assignment
 from .. import utils
 
 class CLEAR(_BaseMetric):
@@ -12,7 +12,9 @@ class CLEAR(_BaseMetric):
     def get_default_config():
         """Default class config values"""
         default_config = {
-            'THRESHOLD': 0.5,  # Similarity score threshold required for a TP match. Default 0.5.
+            'THRESHOLD': 0.5,  # Similarity score threshold required for a TP match. Default 0.5. If a list of
+                               # thresholds is given, all fields are arrays with one value per threshold, and
+                               # the summary shows the first threshold.
             'PRINT_CONFIG': True,  # Whether to print the config information on init. Default: False.
         }
         return default_config
@@ -31,102 +33,31 @@ class CLEAR(_BaseMetric):
 
         # Configuration options:
         self.config = utils.init_config(config, self.get_default_config(), self.get_name())
-        self.threshold = float(self.config['THRESHOLD'])
+        self.thresholds = np.atleast_1d(np.array(self.config['THRESHOLD'], dtype=float))
+        self.threshold = float(self.thresholds[0])
 
+        # With a list of thresholds, these are evaluated together and give array fields (like the alphas of HOTA).
+        self.multiple_thresholds = np.ndim(self.config['THRESHOLD']) > 0
+        if self.multiple_thresholds:
+            self.array_labels = self.thresholds
+            self.integer_array_fields, self.integer_fields = self.integer_fields, []
+            self.float_array_fields, self.float_fields = self.float_fields, []
+            self.summary_array_index = 0  # The summary shows the first threshold (the others are in the details).
 
     @_timing.time
     def eval_sequence(self, data):
-        """Calculates CLEAR metrics for one sequence"""
-        # Initialise results
-        res = {}
-        for field in self.fields:
-            res[field] = 0
-
-        # Return result quickly if tracker or gt sequence is empty
-        if data['num_tracker_dets'] == 0:
-            res['CLR_FN'] = data['num_gt_dets']
-            res['ML'] = data['num_gt_ids']
-            res['MLR'] = 1.0
-            return res
-        if data['num_gt_dets'] == 0:
-            res['CLR_FP'] = data['num_tracker_dets']
-            res['MLR'] = 1.0
-            return res
-
-        # Variables counting global association
-        num_gt_ids = data['num_gt_ids']
-        gt_id_count = np.zeros(num_gt_ids)  # For MT/ML/PT
-        gt_matched_count = np.zeros(num_gt_ids)  # For MT/ML/PT
-        gt_frag_count = np.zeros(num_gt_ids)  # For Frag
-
-        # Note that IDSWs are counted based on the last time each gt_id was present (any number of frames previously),
-        # but are only used in matching to continue current tracks based on the gt_id in the single previous timestep.
-        prev_tracker_id = np.nan * np.zeros(num_gt_ids)  # For scoring IDSW
-        prev_timestep_tracker_id = np.nan * np.zeros(num_gt_ids)  # For matching IDSW
-
-        # Calculate scores for each timestep
-        for t, (gt_ids_t, tracker_ids_t) in enumerate(zip(data['gt_ids'], data['tracker_ids'])):
-            # Deal with the case that there are no gt_det/tracker_det in a timestep.
-            if len(gt_ids_t) == 0:
-                res['CLR_FP'] += len(tracker_ids_t)
-                continue
-            if len(tracker_ids_t) == 0:
-                res['CLR_FN'] += len(gt_ids_t)
-                gt_id_count[gt_ids_t] += 1
-                continue
-
-            # Calc score matrix to first minimise IDSWs from previous frame, and then maximise MOTP secondarily
-            similarity = data['similarity_scores'][t]
-            score_mat = (tracker_ids_t[np.newaxis, :] == prev_timestep_tracker_id[gt_ids_t[:, np.newaxis]])
-            score_mat = 1000 * score_mat + similarity
-            score_mat[similarity < self.threshold - np.finfo('float').eps] = 0
-
-            # Hungarian algorithm to find best matches
-            match_rows, match_cols = linear_sum_assignment(-score_mat)
-            actually_matched_mask = score_mat[match_rows, match_cols] > 0 + np.finfo('float').eps
-            match_rows = match_rows[actually_matched_mask]
-            match_cols = match_cols[actually_matched_mask]
+        """Calculates CLEAR metrics for one sequence, for all thresholds in one pass over the timesteps"""
+        return self._accumulate_sequence(data)
 
-            matched_gt_ids = gt_ids_t[match_rows]
-            matched_tracker_ids = tracker_ids_t[match_cols]
+    def get_accumulator(self):
+        """Returns a new accumulator for calculating CLEAR metrics for one sequence timestep by timestep"""
+        return _CLEARAccumulator(self)
 
-            # Calc IDSW for MOTA
-            prev_matched_tracker_ids = prev_tracker_id[matched_gt_ids]
-            is_idsw = (np.logical_not(np.isnan(prev_matched_tracker_ids))) & (
-                np.not_equal(matched_tracker_ids, prev_matched_tracker_ids))
-            res['IDSW'] += np.sum(is_idsw)
-
-            # Update counters for MT/ML/PT/Frag and record for IDSW/Frag for next timestep
-            gt_id_count[gt_ids_t] += 1
-            gt_matched_count[matched_gt_ids] += 1
-            not_previously_tracked = np.isnan(prev_timestep_tracker_id)
-            prev_tracker_id[matched_gt_ids] = matched_tracker_ids
-            prev_timestep_tracker_id[:] = np.nan
-            prev_timestep_tracker_id[matched_gt_ids] = matched_tracker_ids
-            currently_tracked = np.logical_not(np.isnan(prev_timestep_tracker_id))
-            gt_frag_count += np.logical_and(not_previously_tracked, currently_tracked)
-
-            # Calculate and accumulate basic statistics
-            num_matches = len(matched_gt_ids)
-            res['CLR_TP'] += num_matches
-            res['CLR_FN'] += len(gt_ids_t) - num_matches
-            res['CLR_FP'] += len(tracker_ids_t) - num_matches
-            if num_matches > 0:
-                res['MOTP_sum'] += sum(similarity[match_rows, match_cols])
-
-        # Calculate MT/ML/PT/Frag/MOTP
-        tracked_ratio = gt_matched_count[gt_id_count > 0] / gt_id_count[gt_id_count > 0]
-        res['MT'] = np.sum(np.greater(tracked_ratio, 0.8))
-        res['PT'] = np.sum(np.greater_equal(tracked_ratio, 0.2)) - res['MT']
-        res['ML'] = num_gt_ids - res['MT'] - res['PT']
-        res['Frag'] = np.sum(np.subtract(gt_frag_count[gt_frag_count > 0], 1))
-        res['MOTP'] = res['MOTP_sum'] / np.maximum(1.0, res['CLR_TP'])
-
-        res['CLR_Frames'] = data['num_timesteps']
-
-        # Calculate final CLEAR scores
-        res = self._compute_final_fields(res)
-        return res
+    def _get_threshold_results(self, res):
+        """Returns the results (arrays over thresholds) as single Python values if there is only a single threshold"""
+        if self.multiple_thresholds:
+            return res
+        return {field: value[0].item() for field, value in res.items()}
 
     def combine_sequences(self, all_res):
         """Combines metrics across all sequences"""
@@ -149,16 +80,17 @@ class CLEAR(_BaseMetric):
         If 'ignore_empty_classes' is True, then it only sums over classes with at least one gt or predicted detection.
         """
         res = {}
-        for field in self.integer_fields:
+        for field in self.integer_fields + self.integer_array_fields:
             if ignore_empty_classes:
                 res[field] = self._combine_sum(
-                    {k: v for k, v in all_res.items() if v['CLR_TP'] + v['CLR_FN'] + v['CLR_FP'] > 0}, field)
+                    {k: v for k, v in all_res.items() if np.any(v['CLR_TP'] + v['CLR_FN'] + v['CLR_FP'] > 0)}, field)
             else:
                 res[field] = self._combine_sum({k: v for k, v in all_res.items()}, field)
-        for field in self.float_fields:
+        for field in self.float_fields + self.float_array_fields:
             if ignore_empty_classes:
                 res[field] = np.mean(
-                    [v[field] for v in all_res.values() if v['CLR_TP'] + v['CLR_FN'] + v['CLR_FP'] > 0], axis=0)
+                    [v[field] for v in all_res.values() if np.any(v['CLR_TP'] + v['CLR_FN'] + v['CLR_FP'] > 0)],
+                    axis=0)
             else:
                 res[field] = np.mean([v[field] for v in all_res.values()], axis=0)
         return res
@@ -181,6 +113,137 @@ class CLEAR(_BaseMetric):
 
         res['CLR_F1'] = res['CLR_TP'] / np.maximum(1.0, res['CLR_TP'] + 0.5*res['CLR_FN'] + 0.5*res['CLR_FP'])
         res['FP_per_frame'] = res['CLR_FP'] / np.maximum(1.0, res['CLR_Frames'])
-        safe_log_idsw = np.log10(res['IDSW']) if res['IDSW'] > 0 else res['IDSW']
+        safe_log_idsw = np.log10(np.maximum(1, res['IDSW']))  # log10(IDSW), or 0 if there are no IDSWs
         res['MOTAL'] = (res['CLR_TP'] - res['CLR_FP'] - safe_log_idsw) / np.maximum(1.0, res['CLR_TP'] + res['CLR_FN'])
         return res
+
+
+class _CLEARAccumulator(_BaseAccumulator):
+    """Accumulates the CLEAR metrics of one sequence timestep by timestep, for all thresholds of the metric"""
+
+    def __init__(self, metric):
+        super().__init__(metric)
+        num_thresholds = len(metric.thresholds)
+        # Statistics which are accumulated over timesteps (for each threshold)
+        self.res = {field: np.zeros(num_thresholds, dtype=int) for field in ['CLR_TP', 'CLR_FN', 'CLR_FP', 'IDSW']}
+        self.res['MOTP_sum'] = np.zeros(num_thresholds, dtype=float)
+
+        # Variables counting global association (for each threshold and gt_id seen so far, apart from gt_id_count)
+        self.gt_id_count = np.zeros(0)  # For MT/ML/PT
+        self.gt_matched_count = np.zeros((num_thresholds, 0))  # For MT/ML/PT
+        self.gt_frag_count = np.zeros((num_thresholds, 0))  # For Frag
+
+        # Note that IDSWs are counted based on the last time each gt_id was present (any number of frames previously),
+        # but are only used in matching to continue current tracks based on the gt_id in the single previous timestep.
+        self.prev_tracker_id = np.zeros((num_thresholds, 0))  # For scoring IDSW
+        self.prev_timestep_tracker_id = np.zeros((num_thresholds, 0))  # For matching IDSW
+
+    def _update(self, data_t):
+        res = self.res
+        thresholds = self.metric.thresholds
+        gt_ids_t = data_t['gt_ids']
+        tracker_ids_t = data_t['tracker_ids']
+
+        # Grow the variables of each gt_id to the gt_ids seen so far.
+        num_gt_ids = self.num_gt_ids
+        self.gt_id_count = self._grow(self.gt_id_count, (num_gt_ids,))
+        self.gt_matched_count = self._grow(self.gt_matched_count, (len(thresholds), num_gt_ids))
+        self.gt_frag_count = self._grow(self.gt_frag_count, (len(thresholds), num_gt_ids))
+        self.prev_tracker_id = self._grow(self.prev_tracker_id, (len(thresholds), num_gt_ids), np.nan)
+        self.prev_timestep_tracker_id = self._grow(self.prev_timestep_tracker_id, (len(thresholds), num_gt_ids),
+                                                   np.nan)
+        gt_id_count = self.gt_id_count
+        gt_matched_count = self.gt_matched_count
+        gt_frag_count = self.gt_frag_count
+        prev_tracker_id = self.prev_tracker_id
+        prev_timestep_tracker_id = self.prev_timestep_tracker_id
+
+        # Deal with the case that there are no gt_det/tracker_det in a timestep.
+        if len(gt_ids_t) == 0:
+            res['CLR_FP'] += len(tracker_ids_t)
+            return
+        if len(tracker_ids_t) == 0:
+            res['CLR_FN'] += len(gt_ids_t)
+            gt_id_count[gt_ids_t] += 1
+            return
+        gt_id_count[gt_ids_t] += 1
+
+        similarity = data_t['similarity_scores']
+        below_thresholds = similarity[np.newaxis, :, :] < thresholds[:, np.newaxis, np.newaxis] - np.finfo('float').eps
+        for i in range(len(thresholds)):
+            # Calc score matrix to first minimise IDSWs from previous frame, and then maximise MOTP secondarily
+            score_mat = (tracker_ids_t[np.newaxis, :] == prev_timestep_tracker_id[i, gt_ids_t[:, np.newaxis]])
+            score_mat = 1000 * score_mat + similarity
+            score_mat[below_thresholds[i]] = 0
+
+            # Hungarian algorithm to find best matches (only run if the matching is not trivial)
+            match_rows, match_cols = _assignment.max_score_assignment(score_mat)
+            actually_matched_mask = score_mat[match_rows, match_cols] > 0 + np.finfo('float').eps
+            match_rows = match_rows[actually_matched_mask]
+            match_cols = match_cols[actually_matched_mask]
+
+            matched_gt_ids = gt_ids_t[match_rows]
+            matched_tracker_ids = tracker_ids_t[match_cols]
+
+            # Calc IDSW for MOTA
+            prev_matched_tracker_ids = prev_tracker_id[i, matched_gt_ids]
+            is_idsw = (np.logical_not(np.isnan(prev_matched_tracker_ids))) & (
+                np.not_equal(matched_tracker_ids, prev_matched_tracker_ids))
+            res['IDSW'][i] += np.sum(is_idsw)
+
+            # Update counters for MT/ML/PT/Frag and record for IDSW/Frag for next timestep
+            gt_matched_count[i, matched_gt_ids] += 1
+            not_previously_tracked = np.isnan(prev_timestep_tracker_id[i])
+            prev_tracker_id[i, matched_gt_ids] = matched_tracker_ids
+            prev_timestep_tracker_id[i, :] = np.nan
+            prev_timestep_tracker_id[i, matched_gt_ids] = matched_tracker_ids
+            currently_tracked = np.logical_not(np.isnan(prev_timestep_tracker_id[i]))
+            gt_frag_count[i] += np.logical_and(not_previously_tracked, currently_tracked)
+
+            # Calculate and accumulate basic statistics
+            num_matches = len(matched_gt_ids)
+            res['CLR_TP'][i] += num_matches
+            res['CLR_FN'][i] += len(gt_ids_t) - num_matches
+            res['CLR_FP'][i] += len(tracker_ids_t) - num_matches
+            if num_matches > 0:
+                res['MOTP_sum'][i] += sum(similarity[match_rows, match_cols])
+
+    def result(self):
+        """Calculates CLEAR metrics for the timesteps seen so far"""
+        metric = self.metric
+        num_thresholds = len(metric.thresholds)
+        res = {}
+        for field in metric.float_fields + metric.float_array_fields:
+            res[field] = np.zeros(num_thresholds, dtype=float)
+        for field in metric.integer_fields + metric.integer_array_fields:
+            res[field] = np.zeros(num_thresholds, dtype=int)
+
+        # Return result quickly if tracker or gt sequence is empty
+        if self.num_tracker_dets == 0:
+            res['CLR_FN'][:] = self.num_gt_dets
+            res['ML'][:] = self.num_gt_ids
+            res['MLR'][:] = 1.0
+            return metric._get_threshold_results(res)
+        if self.num_gt_dets == 0:
+            res['CLR_FP'][:] = self.num_tracker_dets
+            res['MLR'][:] = 1.0
+            return metric._get_threshold_results(res)
+        for field, value in self.res.items():
+            res[field] = value.copy()
+
+        # Calculate MT/ML/PT/Frag/MOTP
+        num_gt_ids = self.num_gt_ids
+        gt_id_count = self.gt_id_count[:num_gt_ids]
+        tracked_ratio = self.gt_matched_count[:, :num_gt_ids][:, gt_id_count > 0] / gt_id_count[gt_id_count > 0]
+        res['MT'] = np.sum(np.greater(tracked_ratio, 0.8), axis=1)
+        res['PT'] = np.sum(np.greater_equal(tracked_ratio, 0.2), axis=1) - res['MT']
+        res['ML'] = num_gt_ids - res['MT'] - res['PT']
+        gt_frag_count = self.gt_frag_count[:, :num_gt_ids]
+        res['Frag'] = np.sum(np.where(gt_frag_count > 0, gt_frag_count - 1, 0), axis=1)
+        res['MOTP'] = res['MOTP_sum'] / np.maximum(1.0, res['CLR_TP'])
+
+        res['CLR_Frames'][:] = self.num_timesteps
+
+        # Calculate final CLEAR scores
+        res = metric._compute_final_fields(res)
+        return metric._get_threshold_results(res)
@@ -1,5 +1,5 @@
 
-from ._base_metric import _BaseMetric
+from ._base_metric import _BaseMetric, _BaseAccumulator
 from .. import _timing
 
 
@@ -22,6 +22,10 @@ class Count(_BaseMetric):
                'Frames': data['num_timesteps']}
         return res
 
+    def get_accumulator(self):
+        """Returns a new accumulator for counting one sequence timestep by timestep"""
+        return _CountAccumulator(self)
+
     def combine_sequences(self, all_res):
         """Combines metrics across all sequences"""
         res = {}
@@ -42,3 +46,19 @@ class Count(_BaseMetric):
         for field in self.integer_fields:
             res[field] = self._combine_sum(all_res, field)
         return res
+
+
+class _CountAccumulator(_BaseAccumulator):
+    """Counts the tracker and gt detections and ids of one sequence timestep by timestep"""
+
+    def _update(self, data_t):
+        pass
+
+    def result(self):
+        """Returns counts for the timesteps seen so far"""
+        res = {'Dets': self.num_tracker_dets,
+               'GT_Dets': self.num_gt_dets,
+               'IDs': self.num_tracker_ids,
+               'GT_IDs': self.num_gt_ids,
+               'Frames': self.num_timesteps}
+        return res
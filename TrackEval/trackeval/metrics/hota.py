@@ -1,9 +1,10 @@
 
 import os
 import numpy as np
-from scipy.optimize import linear_sum_assignment
-from ._base_metric import _BaseMetric
+from ._base_metric import _BaseMetric, _BaseAccumulator
 from .. import _timing
+from .. import _assignment
+from .. import utils
 
 
 class HOTA(_BaseMetric):
@@ -11,6 +12,16 @@ class HOTA(_BaseMetric):
     See: https://link.springer.com/article/10.1007/s11263-020-01375-2
     """
 
+    @staticmethod
+    def get_default_config():
+        """Default class config values"""
+        default_config = {
+            'BATCHED_ALIGNMENT': True,  # Whether to accumulate the global alignment over all timesteps at once (True),
+                                        # or timestep by timestep (False). Both give identical results.
+            'PRINT_CONFIG': True,  # Whether to print the config information on init. Default: False.
+        }
+        return default_config
+
     def __init__(self, config=None):
         super().__init__()
         self.plottable = True
@@ -21,84 +32,96 @@ class HOTA(_BaseMetric):
         self.fields = self.float_array_fields + self.integer_array_fields + self.float_fields
         self.summary_fields = self.float_array_fields + self.float_fields
 
+        # Configuration options:
+        self.config = utils.init_config(config, self.get_default_config(), self.get_name())
+
     @_timing.time
     def eval_sequence(self, data):
         """Calculates the HOTA metrics for one sequence"""
 
-        # Initialise results
+        # Return result quickly if tracker or gt sequence is empty
+        res = self._get_empty_sequence_results(data['num_gt_dets'], data['num_tracker_dets'])
+        if res is not None:
+            return res
+
+        # Count the potential matches between ids, and the number of dets for each gt_id and tracker_id.
+        if self.config['BATCHED_ALIGNMENT']:
+            potential_matches_count, gt_id_count, tracker_id_count = self._accumulate_global_alignment_batched(data)
+        else:
+            potential_matches_count, gt_id_count, tracker_id_count = self._accumulate_global_alignment(data)
+
+        timesteps = zip(data['gt_ids'], data['tracker_ids'], data['similarity_scores'])
+        return self._eval_timesteps(timesteps, potential_matches_count, gt_id_count, tracker_id_count)
+
+    def get_accumulator(self):
+        """Returns a new accumulator for calculating the HOTA metrics for one sequence timestep by timestep"""
+        return _HOTAAccumulator(self)
+
+    def _init_results(self):
+        """Returns the results of a sequence, initialised to zero"""
         res = {}
         for field in self.float_array_fields + self.integer_array_fields:
             res[field] = np.zeros((len(self.array_labels)), dtype=float)
         for field in self.float_fields:
             res[field] = 0
+        return res
 
-        # Return result quickly if tracker or gt sequence is empty
-        if data['num_tracker_dets'] == 0:
-            res['HOTA_FN'] = data['num_gt_dets'] * np.ones((len(self.array_labels)), dtype=float)
+    def _get_empty_sequence_results(self, num_gt_dets, num_tracker_dets):
+        """Returns the results of a sequence without tracker dets or without gt dets, or None otherwise"""
+        res = self._init_results()
+        if num_tracker_dets == 0:
+            res['HOTA_FN'] = num_gt_dets * np.ones((len(self.array_labels)), dtype=float)
             res['LocA'] = np.ones((len(self.array_labels)), dtype=float)
             res['LocA(0)'] = 1.0
             return res
-        if data['num_gt_dets'] == 0:
-            res['HOTA_FP'] = data['num_tracker_dets'] * np.ones((len(self.array_labels)), dtype=float)
+        if num_gt_dets == 0:
+            res['HOTA_FP'] = num_tracker_dets * np.ones((len(self.array_labels)), dtype=float)
             res['LocA'] = np.ones((len(self.array_labels)), dtype=float)
             res['LocA(0)'] = 1.0
             return res
+        return None
 
-        # Variables counting global association
-        potential_matches_count = np.zeros((data['num_gt_ids'], data['num_tracker_ids']))
-        gt_id_count = np.zeros((data['num_gt_ids'], 1))
-        tracker_id_count = np.zeros((1, data['num_tracker_ids']))
-
-        # First loop through each timestep and accumulate global track information.
-        for t, (gt_ids_t, tracker_ids_t) in enumerate(zip(data['gt_ids'], data['tracker_ids'])):
-            # Count the potential matches between ids in each timestep
-            # These are normalised, weighted by the match similarity.
-            similarity = data['similarity_scores'][t]
-            sim_iou_denom = similarity.sum(0)[np.newaxis, :] + similarity.sum(1)[:, np.newaxis] - similarity
-            sim_iou = np.zeros_like(similarity)
-            sim_iou_mask = sim_iou_denom > 0 + np.finfo('float').eps
-            sim_iou[sim_iou_mask] = similarity[sim_iou_mask] / sim_iou_denom[sim_iou_mask]
-            potential_matches_count[gt_ids_t[:, np.newaxis], tracker_ids_t[np.newaxis, :]] += sim_iou
-
-            # Calculate the total number of dets for each gt_id and tracker_id.
-            gt_id_count[gt_ids_t] += 1
-            tracker_id_count[0, tracker_ids_t] += 1
+    def _eval_timesteps(self, timesteps, potential_matches_count, gt_id_count, tracker_id_count):
+        """ Matches the dets of each timestep (an iterable of (gt_ids_t, tracker_ids_t, similarity_t)) based on the
+        global alignment between ids, and calculates the HOTA metrics of the sequence.
+        """
+        res = self._init_results()
 
         # Calculate overall jaccard alignment score (before unique matching) between IDs
         global_alignment_score = potential_matches_count / (gt_id_count + tracker_id_count - potential_matches_count)
-        matches_counts = [np.zeros_like(potential_matches_count) for _ in self.array_labels]
+        # Number of matches between each gt_id and tracker_id, for each alpha value (alpha x gt_id x tracker_id)
+        matches_counts = np.zeros((len(self.array_labels),) + potential_matches_count.shape)
 
         # Calculate scores for each timestep
-        for t, (gt_ids_t, tracker_ids_t) in enumerate(zip(data['gt_ids'], data['tracker_ids'])):
+        for gt_ids_t, tracker_ids_t, similarity in timesteps:
             # Deal with the case that there are no gt_det/tracker_det in a timestep.
             if len(gt_ids_t) == 0:
-                for a, alpha in enumerate(self.array_labels):
-                    res['HOTA_FP'][a] += len(tracker_ids_t)
+                res['HOTA_FP'] += len(tracker_ids_t)
                 continue
             if len(tracker_ids_t) == 0:
-                for a, alpha in enumerate(self.array_labels):
-                    res['HOTA_FN'][a] += len(gt_ids_t)
+                res['HOTA_FN'] += len(gt_ids_t)
                 continue
 
             # Get matching scores between pairs of dets for optimizing HOTA
-            similarity = data['similarity_scores'][t]
             score_mat = global_alignment_score[gt_ids_t[:, np.newaxis], tracker_ids_t[np.newaxis, :]] * similarity
 
-            # Hungarian algorithm to find best matches
-            match_rows, match_cols = linear_sum_assignment(-score_mat)
-
-            # Calculate and accumulate basic statistics
-            for a, alpha in enumerate(self.array_labels):
-                actually_matched_mask = similarity[match_rows, match_cols] >= alpha - np.finfo('float').eps
-                alpha_match_rows = match_rows[actually_matched_mask]
-                alpha_match_cols = match_cols[actually_matched_mask]
-                num_matches = len(alpha_match_rows)
-                res['HOTA_TP'][a] += num_matches
-                res['HOTA_FN'][a] += len(gt_ids_t) - num_matches
-                res['HOTA_FP'][a] += len(tracker_ids_t) - num_matches
-                if num_matches > 0:
-                    res['LocA'][a] += sum(similarity[alpha_match_rows, alpha_match_cols])
-                    matches_counts[a][gt_ids_t[alpha_match_rows], tracker_ids_t[alpha_match_cols]] += 1
+            # Hungarian algorithm to find best matches (only run if the matching is not trivial)
+            match_rows, match_cols = _assignment.max_score_assignment(score_mat)
+
+            # Calculate and accumulate basic statistics for all alpha values at once (alpha x matches)
+            match_similarity = similarity[match_rows, match_cols]
+            actually_matched_mask = match_similarity[np.newaxis, :] >= \
+                self.array_labels[:, np.newaxis] - np.finfo('float').eps
+            num_matches = actually_matched_mask.sum(1)
+            res['HOTA_TP'] += num_matches
+            res['HOTA_FN'] += len(gt_ids_t) - num_matches
+            res['HOTA_FP'] += len(tracker_ids_t) - num_matches
+            if len(match_similarity) > 0:
+                # cumsum adds the similarities in match order, exactly like summing the matches of each alpha separately
+                res['LocA'] += np.cumsum(np.where(actually_matched_mask, match_similarity, 0), axis=1)[:, -1]
+                alpha_idx, match_idx = np.nonzero(actually_matched_mask)
+                np.add.at(matches_counts,
+                          (alpha_idx, gt_ids_t[match_rows[match_idx]], tracker_ids_t[match_cols[match_idx]]), 1)
 
         # Calculate association scores (AssA, AssRe, AssPr) for the alpha value.
         # First calculate scores per gt_id/tracker_id combo and then average over the number of detections.
@@ -116,6 +139,84 @@ class HOTA(_BaseMetric):
         res = self._compute_final_fields(res)
         return res
 
+    @staticmethod
+    def _accumulate_global_alignment(data):
+        """ Loops through each timestep and accumulates global track information: the potential matches between gt
+        and tracker ids (normalised, weighted by the match similarity), and the number of dets of each id.
+        """
+        # Variables counting global association
+        potential_matches_count = np.zeros((data['num_gt_ids'], data['num_tracker_ids']))
+        gt_id_count = np.zeros((data['num_gt_ids'], 1))
+        tracker_id_count = np.zeros((1, data['num_tracker_ids']))
+
+        # First loop through each timestep and accumulate global track information.
+        for gt_ids_t, tracker_ids_t, similarity in zip(data['gt_ids'], data['tracker_ids'], data['similarity_scores']):
+            HOTA._add_timestep_alignment(potential_matches_count, gt_id_count, tracker_id_count, gt_ids_t,
+                                         tracker_ids_t, similarity)
+        return potential_matches_count, gt_id_count, tracker_id_count
+
+    @staticmethod
+    def _add_timestep_alignment(potential_matches_count, gt_id_count, tracker_id_count, gt_ids_t, tracker_ids_t,
+                                similarity):
+        """Adds the global track information of a single timestep (in place)"""
+        # Count the potential matches between ids in each timestep
+        # These are normalised, weighted by the match similarity.
+        sim_iou_denom = similarity.sum(0)[np.newaxis, :] + similarity.sum(1)[:, np.newaxis] - similarity
+        sim_iou = np.zeros_like(similarity)
+        sim_iou_mask = sim_iou_denom > 0 + np.finfo('float').eps
+        sim_iou[sim_iou_mask] = similarity[sim_iou_mask] / sim_iou_denom[sim_iou_mask]
+        potential_matches_count[gt_ids_t[:, np.newaxis], tracker_ids_t[np.newaxis, :]] += sim_iou
+
+        # Calculate the total number of dets for each gt_id and tracker_id.
+        gt_id_count[gt_ids_t] += 1
+        tracker_id_count[0, tracker_ids_t] += 1
+
+    @staticmethod
+    def _accumulate_global_alignment_batched(data):
+        """ Same as _accumulate_global_alignment, but over all timesteps at once. The similarity scores of all timesteps
+        are flattened into one array of (gt det, tracker det) pairs, and the sums over each gt det (row) and tracker
+        det (column) of each timestep are segment sums over it. This avoids several small numpy operations per
+        timestep, which dominate for long sequences with few dets.
+        Results are bit-identical: row sums use np.add.reduceat, which (like sum(1) of each timestep) reduces each
+        row pairwise, and column sums and counts use np.bincount, which (like sum(0) and the per timestep +=) adds in
+        order.
+        """
+        potential_matches_count = np.zeros((data['num_gt_ids'], data['num_tracker_ids']))
+        gt_ids = np.concatenate(data['gt_ids']).astype(int)
+        tracker_ids = np.concatenate(data['tracker_ids']).astype(int)
+        gt_id_count = np.bincount(gt_ids, minlength=data['num_gt_ids']).astype(float)[:, np.newaxis]
+        tracker_id_count = np.bincount(tracker_ids, minlength=data['num_tracker_ids']).astype(float)[np.newaxis, :]
+
+        # Timestep of each gt det, and number of (gt det, tracker det) pairs of each gt det.
+        num_gt_t = np.array([len(gt_ids_t) for gt_ids_t in data['gt_ids']], dtype=int)
+        num_tracker_t = np.array([len(tracker_ids_t) for tracker_ids_t in data['tracker_ids']], dtype=int)
+        gt_det_timestep = np.repeat(np.arange(len(num_gt_t)), num_gt_t)
+        row_lengths = num_tracker_t[gt_det_timestep]
+        num_pairs = np.sum(row_lengths)
+        if num_pairs == 0:
+            return potential_matches_count, gt_id_count, tracker_id_count
+
+        # The similarities are flattened row by row, so the pairs of each gt det (row) are consecutive.
+        similarity = np.concatenate([similarity_t.ravel() for similarity_t in data['similarity_scores']])
+        row_starts = np.cumsum(row_lengths) - row_lengths
+        pair_row = np.repeat(np.arange(len(row_lengths)), row_lengths)
+        tracker_det_offsets = np.cumsum(num_tracker_t) - num_tracker_t
+        pair_col = tracker_det_offsets[gt_det_timestep[pair_row]] + np.arange(num_pairs) - row_starts[pair_row]
+
+        # Sums of the similarities of each gt det and each tracker det, within its timestep.
+        row_sums = np.zeros(len(row_lengths))
+        row_sums[row_lengths > 0] = np.add.reduceat(similarity, row_starts[row_lengths > 0])
+        col_sums = np.bincount(pair_col, weights=similarity, minlength=len(tracker_ids))
+
+        sim_iou_denom = col_sums[pair_col] + row_sums[pair_row] - similarity
+        sim_iou = np.zeros_like(similarity)
+        sim_iou_mask = sim_iou_denom > 0 + np.finfo('float').eps
+        sim_iou[sim_iou_mask] = similarity[sim_iou_mask] / sim_iou_denom[sim_iou_mask]
+        potential_matches_count += np.bincount(gt_ids[pair_row] * data['num_tracker_ids'] + tracker_ids[pair_col],
+                                               weights=sim_iou, minlength=potential_matches_count.size
+                                               ).reshape(potential_matches_count.shape)
+        return potential_matches_count, gt_id_count, tracker_id_count
+
     def combine_sequences(self, all_res):
         """Combines metrics across all sequences"""
         res = {}
@@ -201,3 +302,50 @@ class HOTA(_BaseMetric):
         plt.savefig(out_file)
         plt.savefig(out_file.replace('.pdf', '.png'))
         plt.clf()
+
+
+class _HOTAAccumulator(_BaseAccumulator):
+    """ Accumulates the HOTA metrics of one sequence timestep by timestep.
+    The global alignment between ids (potential matches count and the number of dets of each id) is accumulated as
+    the timesteps are added. However the matching in each timestep depends on the global alignment of the whole
+    sequence, so it can only be done when the results are calculated. For this, the ids and the non-zero similarity
+    scores of each timestep are kept (instead of the full data of the sequence).
+    """
+
+    def __init__(self, metric):
+        super().__init__(metric)
+        self.potential_matches_count = np.zeros((0, 0))
+        self.gt_id_count = np.zeros((0, 1))
+        self.tracker_id_count = np.zeros((1, 0))
+        self.timesteps = []  # (gt_ids_t, tracker_ids_t, rows, cols and values of the non-zero similarity scores)
+
+    def _update(self, data_t):
+        gt_ids_t = data_t['gt_ids']
+        tracker_ids_t = data_t['tracker_ids']
+        similarity = data_t['similarity_scores']
+        self.potential_matches_count = self._grow(self.potential_matches_count,
+                                                  (self.num_gt_ids, self.num_tracker_ids))
+        self.gt_id_count = self._grow(self.gt_id_count, (self.num_gt_ids, 1))
+        self.tracker_id_count = self._grow(self.tracker_id_count, (1, self.num_tracker_ids))
+
+        HOTA._add_timestep_alignment(self.potential_matches_count, self.gt_id_count, self.tracker_id_count,
+                                     gt_ids_t, tracker_ids_t, similarity)
+        rows, cols = np.nonzero(similarity)
+        self.timesteps.append((gt_ids_t, tracker_ids_t, rows, cols, similarity[rows, cols]))
+
+    def _get_timesteps(self):
+        """Yields (gt_ids_t, tracker_ids_t, similarity_t) of each timestep seen so far"""
+        for gt_ids_t, tracker_ids_t, rows, cols, values in self.timesteps:
+            similarity = np.zeros((len(gt_ids_t), len(tracker_ids_t)))
+            similarity[rows, cols] = values
+            yield gt_ids_t, tracker_ids_t, similarity
+
+    def result(self):
+        """Calculates the HOTA metrics for the timesteps seen so far"""
+        res = self.metric._get_empty_sequence_results(self.num_gt_dets, self.num_tracker_dets)
+        if res is not None:
+            return res
+        return self.metric._eval_timesteps(self._get_timesteps(),
+                                           self.potential_matches_count[:self.num_gt_ids, :self.num_tracker_ids],
+                                           self.gt_id_count[:self.num_gt_ids],
+                                           self.tracker_id_count[:, :self.num_tracker_ids])
@@ -1,7 +1,9 @@
 import numpy as np
-from scipy.optimize import linear_sum_assignment
-from ._base_metric import _BaseMetric
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from ._base_metric import _BaseMetric, _BaseAccumulator
 from .. import _timing
+from .. import _assignment
 from .. import utils
 
 
@@ -12,7 +14,9 @@ class Identity(_BaseMetric):
     def get_default_config():
         """Default class config values"""
         default_config = {
-            'THRESHOLD': 0.5,  # Similarity score threshold required for a IDTP match. Default 0.5.
+            'THRESHOLD': 0.5,  # Similarity score threshold required for a IDTP match. Default 0.5. If a list of
+                               # thresholds is given, all fields are arrays with one value per threshold, and
+                               # the summary shows the first threshold.
             'PRINT_CONFIG': True,  # Whether to print the config information on init. Default: False.
         }
         return default_config
@@ -26,84 +30,91 @@ class Identity(_BaseMetric):
 
         # Configuration options:
         self.config = utils.init_config(config, self.get_default_config(), self.get_name())
-        self.threshold = float(self.config['THRESHOLD'])
+        self.thresholds = np.atleast_1d(np.array(self.config['THRESHOLD'], dtype=float))
+        self.threshold = float(self.thresholds[0])
+
+        # With a list of thresholds, these are evaluated together and give array fields (like the alphas of HOTA).
+        self.multiple_thresholds = np.ndim(self.config['THRESHOLD']) > 0
+        if self.multiple_thresholds:
+            self.array_labels = self.thresholds
+            self.integer_array_fields, self.integer_fields = self.integer_fields, []
+            self.float_array_fields, self.float_fields = self.float_fields, []
+            self.summary_array_index = 0  # The summary shows the first threshold (the others are in the details).
 
     @_timing.time
     def eval_sequence(self, data):
-        """Calculates ID metrics for one sequence"""
-        # Initialise results
-        res = {}
-        for field in self.fields:
-            res[field] = 0
-
-        # Return result quickly if tracker or gt sequence is empty
-        if data['num_tracker_dets'] == 0:
-            res['IDFN'] = data['num_gt_dets']
-            return res
-        if data['num_gt_dets'] == 0:
-            res['IDFP'] = data['num_tracker_dets']
-            return res
+        """Calculates ID metrics for one sequence, for all thresholds in one pass over the timesteps"""
+        return self._accumulate_sequence(data)
 
-        # Variables counting global association
-        potential_matches_count = np.zeros((data['num_gt_ids'], data['num_tracker_ids']))
-        gt_id_count = np.zeros(data['num_gt_ids'])
-        tracker_id_count = np.zeros(data['num_tracker_ids'])
-
-        # First loop through each timestep and accumulate global track information.
-        for t, (gt_ids_t, tracker_ids_t) in enumerate(zip(data['gt_ids'], data['tracker_ids'])):
-            # Count the potential matches between ids in each timestep
-            matches_mask = np.greater_equal(data['similarity_scores'][t], self.threshold)
-            match_idx_gt, match_idx_tracker = np.nonzero(matches_mask)
-            potential_matches_count[gt_ids_t[match_idx_gt], tracker_ids_t[match_idx_tracker]] += 1
-
-            # Calculate the total number of dets for each gt_id and tracker_id.
-            gt_id_count[gt_ids_t] += 1
-            tracker_id_count[tracker_ids_t] += 1
-
-        # Calculate optimal assignment cost matrix for ID metrics
-        num_gt_ids = data['num_gt_ids']
-        num_tracker_ids = data['num_tracker_ids']
-        fp_mat = np.zeros((num_gt_ids + num_tracker_ids, num_gt_ids + num_tracker_ids))
-        fn_mat = np.zeros((num_gt_ids + num_tracker_ids, num_gt_ids + num_tracker_ids))
-        fp_mat[num_gt_ids:, :num_tracker_ids] = 1e10
-        fn_mat[:num_gt_ids, num_tracker_ids:] = 1e10
-        for gt_id in range(num_gt_ids):
-            fn_mat[gt_id, :num_tracker_ids] = gt_id_count[gt_id]
-            fn_mat[gt_id, num_tracker_ids + gt_id] = gt_id_count[gt_id]
-        for tracker_id in range(num_tracker_ids):
-            fp_mat[:num_gt_ids, tracker_id] = tracker_id_count[tracker_id]
-            fp_mat[tracker_id + num_gt_ids, tracker_id] = tracker_id_count[tracker_id]
-        fn_mat[:num_gt_ids, :num_tracker_ids] -= potential_matches_count
-        fp_mat[:num_gt_ids, :num_tracker_ids] -= potential_matches_count
-
-        # Hungarian algorithm
-        match_rows, match_cols = linear_sum_assignment(fn_mat + fp_mat)
-
-        # Accumulate basic statistics
-        res['IDFN'] = fn_mat[match_rows, match_cols].sum().astype(np.int)
-        res['IDFP'] = fp_mat[match_rows, match_cols].sum().astype(np.int)
-        res['IDTP'] = (gt_id_count.sum() - res['IDFN']).astype(np.int)
+    def get_accumulator(self):
+        """Returns a new accumulator for calculating ID metrics for one sequence timestep by timestep"""
+        return _IdentityAccumulator(self)
 
-        # Calculate final ID scores
-        res = self._compute_final_fields(res)
-        return res
+    @staticmethod
+    def _id_assignment(match_gt, match_tracker, potential_matches_count, num_gt_ids, num_tracker_ids):
+        """ Finds the one-to-one matching between gt ids and tracker ids which minimises IDFN + IDFP, given the
+        potential matches count of each pair of ids that overlap at least once. Returns the number of IDTPs.
+
+        Each matched pair of ids has IDFN = gt_id_count - matches and IDFP = tracker_id_count - matches, and unmatched
+        ids are all IDFN/IDFP. So IDFN = num_gt_dets - IDTP and IDFP = num_tracker_dets - IDTP, and the optimal matching
+        is the one which maximises the number of matches (IDTP). Ids which never overlap can't add any matches, so they
+        are left unmatched without building the (num_gt_ids + num_tracker_ids)^2 cost matrix. The overlapping pairs are
+        split into connected components (groups of ids which only overlap with each other), which are solved
+        separately on small dense matrices.
+        """
+        if len(potential_matches_count) == 0:
+            return 0
+        graph = coo_matrix((np.ones(len(match_gt)), (match_gt, num_gt_ids + match_tracker)),
+                           shape=(num_gt_ids + num_tracker_ids, num_gt_ids + num_tracker_ids))
+        _, component_labels = connected_components(graph, directed=False)
+        match_component = component_labels[match_gt]
+
+        # Components with only a single pair of ids are matched directly.
+        is_single = np.bincount(match_component)[match_component] == 1
+        idtp = np.sum(potential_matches_count[is_single])
+
+        # Otherwise find the best matching within each component.
+        order = np.argsort(match_component[~is_single], kind='stable')
+        components_gt = match_gt[~is_single][order]
+        components_tracker = match_tracker[~is_single][order]
+        components_count = potential_matches_count[~is_single][order]
+        splits = np.flatnonzero(np.diff(match_component[~is_single][order])) + 1
+        for comp_gt, comp_tracker, comp_count in zip(np.split(components_gt, splits),
+                                                     np.split(components_tracker, splits),
+                                                     np.split(components_count, splits)):
+            if len(comp_count) == 0:
+                continue
+            unique_gt, comp_gt = np.unique(comp_gt, return_inverse=True)
+            unique_tracker, comp_tracker = np.unique(comp_tracker, return_inverse=True)
+            score_mat = np.zeros((len(unique_gt), len(unique_tracker)))
+            score_mat[comp_gt, comp_tracker] = comp_count
+            match_rows, match_cols = _assignment.max_score_assignment(score_mat)
+            idtp += np.sum(score_mat[match_rows, match_cols])
+        return int(idtp)
+
+    def _get_threshold_results(self, res):
+        """Returns the results (arrays over thresholds) as single Python values if there is only a single threshold"""
+        if self.multiple_thresholds:
+            return res
+        return {field: value[0].item() for field, value in res.items()}
 
     def combine_classes_class_averaged(self, all_res, ignore_empty_classes=False):
         """Combines metrics across all classes by averaging over the class values.
         If 'ignore_empty_classes' is True, then it only sums over classes with at least one gt or predicted detection.
         """
         res = {}
-        for field in self.integer_fields:
+        for field in self.integer_fields + self.integer_array_fields:
             if ignore_empty_classes:
-                res[field] = self._combine_sum({k: v for k, v in all_res.items()
-                                                if v['IDTP'] + v['IDFN'] + v['IDFP'] > 0 + np.finfo('float').eps},
-                                               field)
+                res[field] = self._combine_sum(
+                    {k: v for k, v in all_res.items()
+                     if np.any(v['IDTP'] + v['IDFN'] + v['IDFP'] > 0 + np.finfo('float').eps)}, field)
             else:
                 res[field] = self._combine_sum({k: v for k, v in all_res.items()}, field)
-        for field in self.float_fields:
+        for field in self.float_fields + self.float_array_fields:
             if ignore_empty_classes:
                 res[field] = np.mean([v[field] for v in all_res.values()
-                                      if v['IDTP'] + v['IDFN'] + v['IDFP'] > 0 + np.finfo('float').eps], axis=0)
+                                      if np.any(v['IDTP'] + v['IDFN'] + v['IDFP'] > 0 + np.finfo('float').eps)],
+                                     axis=0)
             else:
                 res[field] = np.mean([v[field] for v in all_res.values()], axis=0)
         return res
@@ -111,7 +122,7 @@ class Identity(_BaseMetric):
     def combine_classes_det_averaged(self, all_res):
         """Combines metrics across all classes by averaging over the detection values"""
         res = {}
-        for field in self.integer_fields:
+        for field in self.integer_fields + self.integer_array_fields:
             res[field] = self._combine_sum(all_res, field)
         res = self._compute_final_fields(res)
         return res
@@ -119,7 +130,7 @@ class Identity(_BaseMetric):
     def combine_sequences(self, all_res):
         """Combines metrics across all sequences"""
         res = {}
-        for field in self.integer_fields:
+        for field in self.integer_fields + self.integer_array_fields:
             res[field] = self._combine_sum(all_res, field)
         res = self._compute_final_fields(res)
         return res
@@ -133,3 +144,82 @@ class Identity(_BaseMetric):
         res['IDP'] = res['IDTP'] / np.maximum(1.0, res['IDTP'] + res['IDFP'])
         res['IDF1'] = res['IDTP'] / np.maximum(1.0, res['IDTP'] + 0.5 * res['IDFP'] + 0.5 * res['IDFN'])
         return res
+
+
+class _IdentityAccumulator(_BaseAccumulator):
+    """ Accumulates the ID metrics of one sequence timestep by timestep, for all thresholds of the metric.
+    Each potential match is stored as (threshold, gt_id, tracker_id), so that only pairs of ids which actually overlap
+    are stored and counted (instead of dense num_gt_ids x num_tracker_ids matrices). The matches of recent timesteps
+    are merged into the counts of each pair every CONSOLIDATE_INTERVAL timesteps, so memory scales with the number of
+    overlapping pairs of ids rather than with the sequence length.
+    """
+    CONSOLIDATE_INTERVAL = 256
+
+    def __init__(self, metric):
+        super().__init__(metric)
+        self.match_keys = np.zeros((0, 3), dtype=np.int64)  # Unique (threshold, gt_id, tracker_id) potential matches
+        self.potential_matches_count = np.zeros(0, dtype=int)
+        self.new_match_keys = []
+
+    def _update(self, data_t):
+        # Collect the potential matches between ids, for all thresholds at once.
+        thresholds = self.metric.thresholds
+        matches_mask = np.greater_equal(data_t['similarity_scores'][np.newaxis, :, :],
+                                        thresholds[:, np.newaxis, np.newaxis])
+        match_idx_threshold, match_idx_gt, match_idx_tracker = np.nonzero(matches_mask)
+        self.new_match_keys.append(np.stack([match_idx_threshold, data_t['gt_ids'][match_idx_gt],
+                                             data_t['tracker_ids'][match_idx_tracker]], axis=1).astype(np.int64))
+        if len(self.new_match_keys) >= self.CONSOLIDATE_INTERVAL:
+            self._consolidate()
+
+    def _consolidate(self):
+        """Merges the potential matches of recent timesteps into the counts of each (threshold, gt_id, tracker_id)"""
+        if len(self.new_match_keys) == 0:
+            return
+        match_keys = np.concatenate([self.match_keys] + self.new_match_keys)
+        counts = np.concatenate([self.potential_matches_count,
+                                 np.ones(len(match_keys) - len(self.match_keys), dtype=int)])
+        # Each key is encoded as a single integer (for the ids seen so far), which sorts them by threshold, gt_id and
+        # then tracker_id.
+        num_gt_ids = self.num_gt_ids
+        num_tracker_ids = self.num_tracker_ids
+        match_keys = (match_keys[:, 0] * num_gt_ids + match_keys[:, 1]) * num_tracker_ids + match_keys[:, 2]
+        match_keys, inverse = np.unique(match_keys, return_inverse=True)
+        self.potential_matches_count = np.bincount(inverse.ravel(), weights=counts,
+                                                   minlength=len(match_keys)).astype(int)
+        match_threshold, match_keys = np.divmod(match_keys, num_gt_ids * num_tracker_ids)
+        match_gt, match_tracker = np.divmod(match_keys, num_tracker_ids)
+        self.match_keys = np.stack([match_threshold, match_gt, match_tracker], axis=1)
+        self.new_match_keys = []
+
+    def result(self):
+        """Calculates ID metrics for the timesteps seen so far"""
+        metric = self.metric
+        num_thresholds = len(metric.thresholds)
+        res = {}
+        for field in metric.fields:
+            res[field] = np.zeros(num_thresholds, dtype=int)
+
+        # Return result quickly if tracker or gt sequence is empty
+        if self.num_tracker_dets == 0:
+            res['IDFN'][:] = self.num_gt_dets
+            return metric._get_threshold_results(res)
+        if self.num_gt_dets == 0:
+            res['IDFP'][:] = self.num_tracker_dets
+            return metric._get_threshold_results(res)
+
+        # Find the optimal assignment of ids for each threshold
+        self._consolidate()
+        match_threshold, match_gt, match_tracker = self.match_keys.T
+        for i in range(num_thresholds):
+            is_threshold = match_threshold == i
+            idtp = metric._id_assignment(match_gt[is_threshold], match_tracker[is_threshold],
+                                         self.potential_matches_count[is_threshold], self.num_gt_ids,
+                                         self.num_tracker_ids)
+            res['IDTP'][i] = idtp
+            res['IDFN'][i] = self.num_gt_dets - idtp
+            res['IDFP'][i] = self.num_tracker_dets - idtp
+
+        # Calculate final ID scores
+        res = metric._compute_final_fields(res)
+        return metric._get_threshold_results(res)
@@ -1,6 +1,6 @@
 import numpy as np
 from scipy.optimize import linear_sum_assignment
-from ._base_metric import _BaseMetric
+from ._base_metric import _BaseMetric, _BaseAccumulator
 from .. import _timing
 
 
@@ -38,59 +38,11 @@ class VACE(_BaseMetric):
             data['tracker_ids']
             data['similarity_scores']
         """
-        res = {}
+        return self._accumulate_sequence(data)
 
-        # Obtain Average Tracking Accuracy (ATA) using track correspondence.
-        # Obtain counts necessary to compute temporal IOU.
-        # Assume that integer counts can be represented exactly as floats.
-        potential_matches_count = np.zeros((data['num_gt_ids'], data['num_tracker_ids']))
-        gt_id_count = np.zeros(data['num_gt_ids'])
-        tracker_id_count = np.zeros(data['num_tracker_ids'])
-        both_present_count = np.zeros((data['num_gt_ids'], data['num_tracker_ids']))
-        for t, (gt_ids_t, tracker_ids_t) in enumerate(zip(data['gt_ids'], data['tracker_ids'])):
-            # Count the number of frames in which two tracks satisfy the overlap criterion.
-            matches_mask = np.greater_equal(data['similarity_scores'][t], self.threshold)
-            match_idx_gt, match_idx_tracker = np.nonzero(matches_mask)
-            potential_matches_count[gt_ids_t[match_idx_gt], tracker_ids_t[match_idx_tracker]] += 1
-            # Count the number of frames in which the tracks are present.
-            gt_id_count[gt_ids_t] += 1
-            tracker_id_count[tracker_ids_t] += 1
-            both_present_count[gt_ids_t[:, np.newaxis], tracker_ids_t[np.newaxis, :]] += 1
-        # Number of frames in which either track is present (union of the two sets of frames).
-        union_count = (gt_id_count[:, np.newaxis]
-                       + tracker_id_count[np.newaxis, :]
-                       - both_present_count)
-        # The denominator should always be non-zero if all tracks are non-empty.
-        with np.errstate(divide='raise', invalid='raise'):
-            temporal_iou = potential_matches_count / union_count
-        # Find assignment that maximizes temporal IOU.
-        match_rows, match_cols = linear_sum_assignment(-temporal_iou)
-        res['STDA'] = temporal_iou[match_rows, match_cols].sum()
-        res['VACE_IDs'] = data['num_tracker_ids']
-        res['VACE_GT_IDs'] = data['num_gt_ids']
-
-        # Obtain Frame Detection Accuracy (FDA) using per-frame correspondence.
-        non_empty_count = 0
-        fda = 0
-        for t, (gt_ids_t, tracker_ids_t) in enumerate(zip(data['gt_ids'], data['tracker_ids'])):
-            n_g = len(gt_ids_t)
-            n_d = len(tracker_ids_t)
-            if not (n_g or n_d):
-                continue
-            # n_g > 0 or n_d > 0
-            non_empty_count += 1
-            if not (n_g and n_d):
-                continue
-            # n_g > 0 and n_d > 0
-            spatial_overlap = data['similarity_scores'][t]
-            match_rows, match_cols = linear_sum_assignment(-spatial_overlap)
-            overlap_ratio = spatial_overlap[match_rows, match_cols].sum()
-            fda += overlap_ratio / (0.5 * (n_g + n_d))
-        res['FDA'] = fda
-        res['num_non_empty_timesteps'] = non_empty_count
-
-        res.update(self._compute_final_fields(res))
-        return res
+    def get_accumulator(self):
+        """Returns a new accumulator for calculating VACE metrics for one sequence timestep by timestep"""
+        return _VACEAccumulator(self)
 
     def combine_classes_class_averaged(self, all_res, ignore_empty_classes=True):
         """Combines metrics across all classes by averaging over the class values.
@@ -129,3 +81,82 @@ class VACE(_BaseMetric):
                             (0.5 * (additive['VACE_IDs'] + additive['VACE_GT_IDs'])))
             final['SFDA'] = additive['FDA'] / additive['num_non_empty_timesteps']
         return final
+
+
+class _VACEAccumulator(_BaseAccumulator):
+    """Accumulates the VACE metrics of one sequence timestep by timestep"""
+
+    def __init__(self, metric):
+        super().__init__(metric)
+        # Counts necessary to compute temporal IOU (for the ids seen so far).
+        # Assume that integer counts can be represented exactly as floats.
+        self.potential_matches_count = np.zeros((0, 0))
+        self.gt_id_count = np.zeros(0)
+        self.tracker_id_count = np.zeros(0)
+        self.both_present_count = np.zeros((0, 0))
+        # Frame Detection Accuracy (FDA) using per-frame correspondence.
+        self.non_empty_count = 0
+        self.fda = np.float64(0)  # So that SFDA is nan (not an error) before any non-empty timestep, e.g. while running
+
+    def _update(self, data_t):
+        gt_ids_t = data_t['gt_ids']
+        tracker_ids_t = data_t['tracker_ids']
+        shape = (self.num_gt_ids, self.num_tracker_ids)
+        self.potential_matches_count = self._grow(self.potential_matches_count, shape)
+        self.gt_id_count = self._grow(self.gt_id_count, shape[:1])
+        self.tracker_id_count = self._grow(self.tracker_id_count, shape[1:])
+        self.both_present_count = self._grow(self.both_present_count, shape)
+
+        # Count the number of frames in which two tracks satisfy the overlap criterion.
+        matches_mask = np.greater_equal(data_t['similarity_scores'], self.metric.threshold)
+        match_idx_gt, match_idx_tracker = np.nonzero(matches_mask)
+        self.potential_matches_count[gt_ids_t[match_idx_gt], tracker_ids_t[match_idx_tracker]] += 1
+        # Count the number of frames in which the tracks are present.
+        self.gt_id_count[gt_ids_t] += 1
+        self.tracker_id_count[tracker_ids_t] += 1
+        self.both_present_count[gt_ids_t[:, np.newaxis], tracker_ids_t[np.newaxis, :]] += 1
+
+        n_g = len(gt_ids_t)
+        n_d = len(tracker_ids_t)
+        if not (n_g or n_d):
+            return
+        # n_g > 0 or n_d > 0
+        self.non_empty_count += 1
+        if not (n_g and n_d):
+            return
+        # n_g > 0 and n_d > 0
+        spatial_overlap = data_t['similarity_scores']
+        match_rows, match_cols = linear_sum_assignment(-spatial_overlap)
+        overlap_ratio = spatial_overlap[match_rows, match_cols].sum()
+        self.fda += overlap_ratio / (0.5 * (n_g + n_d))
+
+    def result(self):
+        """Calculates VACE metrics for the timesteps seen so far"""
+        res = {}
+
+        # Obtain Average Tracking Accuracy (ATA) using track correspondence.
+        num_gt_ids = self.num_gt_ids
+        num_tracker_ids = self.num_tracker_ids
+        potential_matches_count = self.potential_matches_count[:num_gt_ids, :num_tracker_ids]
+        gt_id_count = self.gt_id_count[:num_gt_ids]
+        tracker_id_count = self.tracker_id_count[:num_tracker_ids]
+        both_present_count = self.both_present_count[:num_gt_ids, :num_tracker_ids]
+        # Number of frames in which either track is present (union of the two sets of frames).
+        union_count = (gt_id_count[:, np.newaxis]
+                       + tracker_id_count[np.newaxis, :]
+                       - both_present_count)
+        # The denominator is only zero for pairs of ids which have not been seen yet (e.g. gt ids of later timesteps
+        # while the sequence is still running), whose temporal IOU is zero.
+        temporal_iou = np.divide(potential_matches_count, union_count, out=np.zeros_like(potential_matches_count),
+                                 where=union_count > 0)
+        # Find assignment that maximizes temporal IOU.
+        match_rows, match_cols = linear_sum_assignment(-temporal_iou)
+        res['STDA'] = temporal_iou[match_rows, match_cols].sum()
+        res['VACE_IDs'] = num_tracker_ids
+        res['VACE_GT_IDs'] = num_gt_ids
+
+        res['FDA'] = self.fda
+        res['num_non_empty_timesteps'] = self.non_empty_count
+
+        res.update(self.metric._compute_final_fields(res))
+        return res
@@ -21,12 +21,15 @@ import torch.utils.data
 import os.path as osp
 from PIL import Image, ImageDraw
 import copy
+from collections import OrderedDict
 import json
+import pickle
 import datasets.transforms as T
 from models.structures import Instances
 
 
 class DetMOTDetection:
+    """Referring MOT dataset of UAV videos. targets['obj_ids'] are float64 (1000000 * video index + id)."""
     def __init__(self, args, data_txt_path: str, seqs_folder, dataset2transform):
         self.args = args
         self.dataset2transform = dataset2transform
@@ -35,6 +38,10 @@ class DetMOTDetection:
         self.sample_interval = args.sample_interval # 1
         self.vis = args.vis # False
         self.video_dict = {}
+        # LRU cache of decoded frames, with a budget in bytes (0 disables it). Each dataloader worker has its own cache.
+        self.frame_cache_bytes = getattr(args, 'frame_cache_bytes', 0)
+        self.frame_cache = OrderedDict()
+        self.frame_cache_size = 0
 
         with open(data_txt_path, 'r') as file:
             self.img_files = file.readlines()
@@ -48,6 +55,9 @@ class DetMOTDetection:
         self.item_num = len(self.img_files) - (self.num_frames_per_batch - 1) * self.sample_interval
 
         self._register_videos()
+        self._load_label_store()
+        self._load_video_sizes()
+        self._load_expression_index()
 
         # video sampler.
         self.sampler_steps: list = args.sampler_steps #[60,80,90]
@@ -72,6 +82,52 @@ class DetMOTDetection:
                 self.video_dict[video_name] = len(self.video_dict)
                 # assert len(self.video_dict) <= 300
 
+    def _load_label_store(self):
+        # The labels of all frames are parsed once into one contiguous float32 array: the labels of frame idx are
+        # label_rows[label_offsets[idx]:label_offsets[idx + 1]]. They are cached in args.label_cache_path if given,
+        # which is only reused if the mtime and size of every label file are unchanged.
+        cache_path = getattr(self.args, 'label_cache_path', None)
+        if cache_path is not None:
+            label_stats = self._get_file_stats(self.label_files)
+        if cache_path is not None and osp.isfile(cache_path):
+            with np.load(cache_path) as cache:
+                if ('label_stats' in cache.files and cache['label_files'].tolist() == self.label_files
+                        and np.array_equal(cache['label_stats'], label_stats)):
+                    print("load labels of {} frames from {}".format(len(self.label_files), cache_path))
+                    self.label_rows = cache['label_rows']
+                    self.label_offsets = cache['label_offsets']
+                    self.label_exists = cache['label_exists']
+                    return
+
+        label_rows = []
+        self.label_exists = np.zeros(len(self.label_files), dtype=bool)
+        for i, label_path in enumerate(self.label_files):
+            if osp.isfile(label_path):
+                label_rows.append(np.loadtxt(label_path, dtype=np.float32).reshape(-1, 6))
+                self.label_exists[i] = True
+            else:
+                # raised as invalid label path when the frame is used.
+                label_rows.append(np.zeros((0, 6), dtype=np.float32))
+        self.label_rows = np.concatenate(label_rows) if label_rows else np.zeros((0, 6), dtype=np.float32)
+        self.label_offsets = np.zeros(len(label_rows) + 1, dtype=np.int64)
+        self.label_offsets[1:] = np.cumsum([len(rows) for rows in label_rows])
+        print("parsed labels of {} frames".format(len(self.label_files)))
+
+        if cache_path is not None:
+            with open(cache_path, 'wb') as f:  # np.savez would add a .npz suffix to a path
+                np.savez(f, label_files=np.array(self.label_files), label_stats=label_stats,
+                         label_rows=self.label_rows, label_offsets=self.label_offsets, label_exists=self.label_exists)
+
+    @staticmethod
+    def _get_file_stats(paths):
+        # (mtime in ns, size) of each file, or (-1, -1) if it doesn't exist, to check if cached data is up to date.
+        stats = np.full((len(paths), 2), -1, dtype=np.int64)
+        for i, path in enumerate(paths):
+            if osp.isfile(path):
+                stat = os.stat(path)
+                stats[i] = stat.st_mtime_ns, stat.st_size
+        return stats
+
     def set_epoch(self, epoch):
         self.current_epoch = epoch
         if self.sampler_steps is None or len(self.sampler_steps) == 0:
@@ -99,25 +155,88 @@ class DetMOTDetection:
         gt_instances.is_ref = targets['is_ref']
         return gt_instances
 
+    def _load_video_sizes(self):
+        # The frames of a video share a resolution, so only the header of the first frame of each video is read.
+        self.video_sizes = {}
+        for img_path in self.img_files:
+            video_dir = osp.dirname(img_path)
+            if video_dir not in self.video_sizes:
+                w, h = Image.open(img_path).size
+                assert w > 0 and h > 0, "invalid image {} with shape {} {}".format(img_path, w, h)
+                self.video_sizes[video_dir] = (w, h)
+
+    def _load_image(self, img_path):
+        if self.frame_cache_bytes <= 0:
+            return Image.open(img_path)
+        # overlapping clips of adjacent samples reuse the decoded frames instead of decoding them again.
+        frame = self.frame_cache.get(img_path)
+        if frame is None:
+            frame = np.asarray(Image.open(img_path).convert('RGB'))
+            self.frame_cache[img_path] = frame
+            self.frame_cache_size += frame.nbytes
+            while self.frame_cache_size > self.frame_cache_bytes and len(self.frame_cache) > 1:
+                _, evicted = self.frame_cache.popitem(last=False)
+                self.frame_cache_size -= evicted.nbytes
+        else:
+            self.frame_cache.move_to_end(img_path)
+        return Image.fromarray(frame)
+
+    def _load_expression_index(self):
+        # All expressions of each video, parsed once: a list of {'sentence': str, 'ref_ids': {frame_id: int array}}
+        # per video id, in os.listdir order. The index is cached with pickle in args.expression_index_path if given,
+        # which is only reused if the expression files (names, mtimes and sizes) of every video are unchanged.
+        video_ids = sorted({img_path.split('/')[-2] for img_path in self.img_files if 'uav' in img_path})
+        cache_path = getattr(self.args, 'expression_index_path', None)
+        expression_files = {}
+        for video_id in video_ids:
+            expression_dir = osp.join(self.args.rmot_path, 'expression', video_id)
+            expression_names = os.listdir(expression_dir)
+            expression_stats = None
+            if cache_path is not None:
+                expression_stats = self._get_file_stats(
+                    [osp.join(expression_dir, name) for name in expression_names]).tolist()
+            expression_files[video_id] = (expression_names, expression_stats)
+        if cache_path is not None and osp.isfile(cache_path):
+            with open(cache_path, 'rb') as f:
+                cache = pickle.load(f)
+            if (isinstance(cache, dict) and 'files' in cache
+                    and all(cache['files'].get(video_id) == expression_files[video_id] for video_id in video_ids)):
+                print("load expressions of {} videos from {}".format(len(video_ids), cache_path))
+                self.expression_index = cache['index']
+                return
+
+        self.expression_index = {}
+        for video_id in video_ids:
+            expression_dir = osp.join(self.args.rmot_path, 'expression', video_id)
+            expressions = []
+            for expression_name in expression_files[video_id][0]:
+                with open(osp.join(expression_dir, expression_name), 'r') as f:
+                    expression_info = json.load(f)
+                ref_ids = {int(frame_id): np.array([int(ref_id) for ref_id in frame_ref_ids], dtype=np.int64)
+                           for frame_id, frame_ref_ids in expression_info['label'].items()}
+                expressions.append({'sentence': expression_info['sentence'], 'ref_ids': ref_ids})
+            self.expression_index[video_id] = expressions
+        print("parsed expressions of {} videos".format(len(video_ids)))
+
+        if cache_path is not None:
+            with open(cache_path, 'wb') as f:
+                pickle.dump({'files': expression_files, 'index': self.expression_index}, f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+
     def _pre_single_frame(self, idx: int, expression_infos):
 
         img_path = self.img_files[idx]
         label_path = self.label_files[idx]
 
-        ref_ids = []
-        for expression_info in expression_infos:
-            if expression_info is not None:
-                frame_id = int(img_path.split('/')[-1].split('.')[0])
-                if str(frame_id) in expression_info['label'].keys():
-                    ref_ids += expression_info['label'][str(frame_id)]
-        ref_ids = [int(ref_id) for ref_id in ref_ids] # 9,7
+        frame_id = int(img_path.split('/')[-1].split('.')[0])
+        ref_ids = [expression_info['ref_ids'][frame_id] for expression_info in expression_infos
+                   if expression_info is not None and frame_id in expression_info['ref_ids']]
+        ref_ids = np.concatenate(ref_ids) if len(ref_ids) > 0 else np.zeros(0, dtype=np.int64)  # 9,7
 
-        img = Image.open(img_path)
         targets = {}
-        w, h = img._size
-        assert w > 0 and h > 0, "invalid image {} with shape {} {}".format(img_path, w, h)
-        if osp.isfile(label_path):
-            labels0 = np.loadtxt(label_path, dtype=np.float32).reshape(-1, 6)
+        w, h = self.video_sizes[osp.dirname(img_path)]
+        if self.label_exists[idx]:
+            labels0 = self.label_rows[self.label_offsets[idx]:self.label_offsets[idx + 1]]
             if 'uav' in label_path:
                 # normalized x1y1wh to pixel xyxy format
                 labels = labels0.copy()
@@ -142,36 +261,24 @@ class DetMOTDetection:
         else:
             raise NotImplementedError()
 
-        targets['boxes'] = []
-        targets['area'] = []
-        targets['iscrowd'] = []
-        targets['labels'] = []
-        targets['obj_ids'] = []
         targets['image_id'] = torch.as_tensor(idx)
         targets['size'] = torch.as_tensor([h, w])
         targets['orig_size'] = torch.as_tensor([h, w])
-        targets['is_ref'] = []
-
-        # print(labels[0])
-        for label in labels:
-            targets['boxes'].append(label[2:6].tolist())
-            targets['area'].append(label[4] * label[5])
-            targets['iscrowd'].append(0)
-            targets['labels'].append(0)
-            # targets['labels'].append(label[0] - 1)  # category start from 0
-            obj_id = label[1] + obj_idx_offset if label[1] >= 0 else label[1]
-            targets['obj_ids'].append(obj_id)  # relative id
-            if int(label[1]) in ref_ids:  # if an id is in ref_ids, then mask it as 1, else mask 0
-                targets['is_ref'].append(1.0)
-            else:
-                targets['is_ref'].append(0.0)
-
-        targets['area'] = torch.as_tensor(targets['area'])
-        targets['iscrowd'] = torch.as_tensor(targets['iscrowd'])
-        targets['labels'] = torch.as_tensor(targets['labels'], dtype=torch.int64)
-        targets['obj_ids'] = torch.as_tensor(targets['obj_ids'])
-        targets['boxes'] = torch.as_tensor(targets['boxes'], dtype=torch.float32).reshape(-1, 4)
-        targets['is_ref'] = torch.as_tensor(targets['is_ref'])
+
+        # The ids are offset in float64, as 1000000 * video + id can't be represented exactly in float32.
+        label_ids = labels[:, 1].astype(np.float64)
+        obj_ids = np.where(label_ids >= 0, label_ids + obj_idx_offset, label_ids)  # relative id
+        # if an id is in ref_ids, then mask it as 1, else mask 0
+        is_ref = np.isin(labels[:, 1].astype(np.int64), ref_ids).astype(np.float32)
+
+        targets['area'] = torch.as_tensor(labels[:, 4] * labels[:, 5])
+        targets['iscrowd'] = torch.as_tensor([0] * len(labels))
+        targets['labels'] = torch.zeros(len(labels), dtype=torch.int64)
+        # targets['labels'] = torch.as_tensor(labels[:, 0] - 1, dtype=torch.int64)  # category start from 0
+        targets['obj_ids'] = torch.as_tensor(obj_ids)
+        targets['boxes'] = torch.as_tensor(np.ascontiguousarray(labels[:, 2:6]), dtype=torch.float32).reshape(-1, 4)
+        targets['is_ref'] = torch.as_tensor(is_ref)
+        img = self._load_image(img_path)
         return img, targets
 
     def _get_sample_range(self, start_idx):
@@ -201,11 +308,7 @@ class DetMOTDetection:
 
         if 'uav' in img_path:
             video_id = img_path.split('/')[-2]
-            expression_list = os.listdir(osp.join(self.args.rmot_path, 'expression', video_id))
-            expression_random = random.choice(expression_list) # 
-            expression_path = osp.join(self.args.rmot_path, 'expression', video_id, expression_random)
-            with open(expression_path, 'r') as f:
-                expression_info = json.load(f)
+            expression_info = random.choice(self.expression_index[video_id])
             sentence = [expression_info['sentence']]
             expression_info = [expression_info]
         else:
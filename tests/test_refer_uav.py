@@ -0,0 +1,244 @@
+"""
+Tests of the loading of the Refer-UAV training dataset (DetMOTDetection), on a small generated dataset.
+"""
+import os
+import sys
+import json
+import types
+
+import numpy as np
+import pytest
+
+pytest.importorskip('torch')
+pytest.importorskip('cv2')
+pytest.importorskip('PIL')
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from PIL import Image  # noqa: E402
+from datasets.refer_uav import DetMOTDetection  # noqa: E402
+
+VIDEOS = ['uav0000001_00000_v', 'uav0000002_00000_v']
+NUM_FRAMES = 6
+
+
+def _write_dataset(root, rng):
+    """ Writes the frames, labels (without a label file for the last frame of the last video) and expressions of a
+    few short videos in the Refer-UAV layout, and returns the path of the data txt file.
+    """
+    img_paths = []
+    for v, video in enumerate(VIDEOS):
+        for folder in ['training', 'labels_with_ids']:
+            os.makedirs(os.path.join(root, folder, 'image_02', video))
+        os.makedirs(os.path.join(root, 'expression', video))
+        size = (64 + 16 * v, 48)
+        for frame in range(1, NUM_FRAMES + 1):
+            img_path = 'training/image_02/{}/{:07d}.jpg'.format(video, frame)
+            Image.new('RGB', size, (frame, v, 0)).save(os.path.join(root, img_path))
+            img_paths.append(img_path)
+            if video == VIDEOS[-1] and frame == NUM_FRAMES:
+                continue
+            num_objects = rng.integers(0, 5)
+            labels = np.c_[np.zeros(num_objects), rng.choice(np.arange(-1, 20), num_objects, replace=False),
+                           rng.random((num_objects, 4)) / 2]
+            np.savetxt(os.path.join(root, 'labels_with_ids', 'image_02', video, '{:07d}.txt'.format(frame)), labels,
+                       fmt='%.6f')
+        for e in range(3):
+            label = {str(frame): rng.integers(0, 20, rng.integers(0, 3)).tolist() for frame in range(1, NUM_FRAMES + 1)}
+            with open(os.path.join(root, 'expression', video, 'expression_{}.json'.format(e)), 'w') as f:
+                json.dump({'sentence': 'expression {} of {}'.format(e, video), 'label': label}, f)
+    data_txt_path = os.path.join(root, 'train.txt')
+    with open(data_txt_path, 'w') as f:
+        f.write(''.join(img_path + '\n' for img_path in img_paths))
+    return data_txt_path
+
+
+def _get_args(root, **kwargs):
+    """The args of DetMOTDetection for a dataset written by _write_dataset"""
+    args = dict(sampler_lengths=[2], sample_mode='fixed_interval', sample_interval=1, vis=False, sampler_steps=None,
+                rmot_path=str(root), label_cache_path=None, expression_index_path=None, frame_cache_bytes=0)
+    args.update(kwargs)
+    return types.SimpleNamespace(**args)
+
+
+@pytest.fixture
+def dataset_root(tmp_path):
+    data_txt_path = _write_dataset(str(tmp_path / 'data'), np.random.default_rng(0))
+    return tmp_path, data_txt_path
+
+
+def _assert_label_store_matches_files(dataset):
+    """Checks that the label store of a dataset has the labels of each frame's label file"""
+    assert dataset.label_rows.dtype == np.float32
+    for idx, label_path in enumerate(dataset.label_files):
+        labels = dataset.label_rows[dataset.label_offsets[idx]:dataset.label_offsets[idx + 1]]
+        if os.path.isfile(label_path):
+            assert dataset.label_exists[idx]
+            np.testing.assert_array_equal(labels, np.loadtxt(label_path, dtype=np.float32).reshape(-1, 6))
+        else:
+            assert not dataset.label_exists[idx] and len(labels) == 0
+
+
+def test_label_store(dataset_root):
+    root, data_txt_path = dataset_root
+    dataset = DetMOTDetection(_get_args(root / 'data'), data_txt_path, str(root / 'data'), {})
+    assert len(dataset.label_offsets) == len(dataset.img_files) + 1
+    _assert_label_store_matches_files(dataset)
+    with pytest.raises(ValueError, match='invalid label path'):
+        dataset._pre_single_frame(len(dataset.img_files) - 1, [])
+
+
+def test_label_cache(dataset_root, monkeypatch):
+    root, data_txt_path = dataset_root
+    args = _get_args(root / 'data', label_cache_path=str(root / 'labels.cache'))
+    _assert_label_store_matches_files(DetMOTDetection(args, data_txt_path, str(root / 'data'), {}))
+    assert os.path.isfile(args.label_cache_path)
+
+    # The cached labels are loaded without parsing any label file.
+    with monkeypatch.context() as m:
+        m.setattr(np, 'loadtxt', lambda *a, **k: pytest.fail('label file parsed despite the cache'))
+        dataset = DetMOTDetection(args, data_txt_path, str(root / 'data'), {})
+    _assert_label_store_matches_files(dataset)
+
+    # Changing, removing or adding a label file invalidates the cache.
+    dataset = DetMOTDetection(args, data_txt_path, str(root / 'data'), {})
+    changed_file, removed_file, added_file = dataset.label_files[1], dataset.label_files[2], dataset.label_files[-1]
+    with open(changed_file, 'a') as f:
+        f.write('0 7 0.1 0.1 0.2 0.2\n')
+    os.remove(removed_file)
+    with open(added_file, 'w') as f:
+        f.write('0 3 0.3 0.3 0.1 0.1\n')
+    for _ in range(2):  # Rewritten, then loaded from the cache.
+        dataset = DetMOTDetection(args, data_txt_path, str(root / 'data'), {})
+        _assert_label_store_matches_files(dataset)
+        assert not dataset.label_exists[2] and dataset.label_exists[-1]
+
+
+def _assert_expression_index_matches_files(dataset):
+    """Checks that the expression index of a dataset has the expressions of each video's expression files"""
+    assert sorted(dataset.expression_index.keys()) == VIDEOS
+    for video, expressions in dataset.expression_index.items():
+        expression_dir = os.path.join(dataset.args.rmot_path, 'expression', video)
+        expression_names = os.listdir(expression_dir)
+        assert len(expressions) == len(expression_names)
+        for expression_name, expression in zip(expression_names, expressions):
+            with open(os.path.join(expression_dir, expression_name)) as f:
+                expression_info = json.load(f)
+            assert expression['sentence'] == expression_info['sentence']
+            assert sorted(expression['ref_ids'].keys()) == sorted(int(frame) for frame in expression_info['label'])
+            for frame, ref_ids in expression_info['label'].items():
+                assert expression['ref_ids'][int(frame)].dtype == np.int64
+                np.testing.assert_array_equal(expression['ref_ids'][int(frame)], ref_ids)
+
+
+def test_expression_index(dataset_root):
+    root, data_txt_path = dataset_root
+    dataset = DetMOTDetection(_get_args(root / 'data'), data_txt_path, str(root / 'data'), {})
+    _assert_expression_index_matches_files(dataset)
+
+    # The reference ids of all expressions of a sample are concatenated.
+    expressions = dataset.expression_index[VIDEOS[0]]
+    _, targets = dataset._pre_single_frame(0, expressions)
+    labels = dataset.label_rows[dataset.label_offsets[0]:dataset.label_offsets[1]]
+    ref_ids = np.concatenate([expression['ref_ids'][1] for expression in expressions])
+    np.testing.assert_array_equal(targets['is_ref'], np.isin(labels[:, 1].astype(np.int64), ref_ids))
+
+
+def test_expression_cache(dataset_root, monkeypatch):
+    root, data_txt_path = dataset_root
+    args = _get_args(root / 'data', expression_index_path=str(root / 'expressions.cache'))
+    _assert_expression_index_matches_files(DetMOTDetection(args, data_txt_path, str(root / 'data'), {}))
+    assert os.path.isfile(args.expression_index_path)
+
+    # The cached expressions are loaded without parsing any expression file.
+    with monkeypatch.context() as m:
+        m.setattr(json, 'load', lambda *a, **k: pytest.fail('expression file parsed despite the cache'))
+        dataset = DetMOTDetection(args, data_txt_path, str(root / 'data'), {})
+    _assert_expression_index_matches_files(dataset)
+
+    # Changing, adding or removing an expression file invalidates the cache.
+    expression_dir = os.path.join(str(root / 'data'), 'expression', VIDEOS[0])
+    for change in ['changed', 'added', 'removed']:
+        expression_file = os.path.join(expression_dir, 'expression_0.json' if change == 'changed' else 'added.json')
+        if change == 'removed':
+            os.remove(expression_file)
+        else:
+            with open(expression_file, 'w') as f:
+                json.dump({'sentence': '{} expression'.format(change), 'label': {'1': [3, 5], '4': [11]}}, f)
+        for _ in range(2):  # Rewritten, then loaded from the cache.
+            _assert_expression_index_matches_files(DetMOTDetection(args, data_txt_path, str(root / 'data'), {}))
+
+
+def test_obj_ids(dataset_root):
+    root, data_txt_path = dataset_root
+    dataset = DetMOTDetection(_get_args(root / 'data'), data_txt_path, str(root / 'data'), {})
+    video_name = os.path.dirname(dataset.label_files[0])
+    for video_index in [0, 1, 300]:  # From the 17th video, 1000000 * video index + id is not exact in float32.
+        dataset.video_dict[video_name] = video_index
+        for idx in range(NUM_FRAMES):
+            _, targets = dataset._pre_single_frame(idx, [])
+            label_ids = dataset.label_rows[dataset.label_offsets[idx]:dataset.label_offsets[idx + 1], 1].astype(int)
+            expected = [label_id + 1000000 * video_index if label_id >= 0 else label_id for label_id in label_ids]
+            obj_ids = np.asarray(targets['obj_ids'])
+            assert obj_ids.dtype == np.float64
+            assert obj_ids.tolist() == expected  # Exactly, so that distinct ids stay distinct.
+
+
+def test_video_sizes(dataset_root, monkeypatch):
+    root, data_txt_path = dataset_root
+    opened = []
+    image_open = Image.open
+    monkeypatch.setattr(Image, 'open', lambda path: opened.append(path) or image_open(path))
+    dataset = DetMOTDetection(_get_args(root / 'data'), data_txt_path, str(root / 'data'), {})
+
+    # Only the first frame of each video is opened, for the size of all its frames.
+    assert opened == [dataset.img_files[v * NUM_FRAMES] for v in range(len(VIDEOS))]
+    for img_path in dataset.img_files:
+        assert dataset.video_sizes[os.path.dirname(img_path)] == image_open(img_path).size
+
+    # The boxes of each frame are scaled to the size of its video.
+    for idx in [0, NUM_FRAMES + 1]:
+        _, targets = dataset._pre_single_frame(idx, [])
+        w, h = image_open(dataset.img_files[idx]).size
+        labels = dataset.label_rows[dataset.label_offsets[idx]:dataset.label_offsets[idx + 1]]
+        expected = np.c_[labels[:, 2] * w, labels[:, 3] * h, (labels[:, 2] + labels[:, 4]) * w,
+                         (labels[:, 3] + labels[:, 5]) * h]
+        np.testing.assert_allclose(np.asarray(targets['boxes']), expected, rtol=1e-6)
+
+
+def test_frame_cache(dataset_root, monkeypatch):
+    root, data_txt_path = dataset_root
+    opened = []
+    image_open = Image.open
+    monkeypatch.setattr(Image, 'open', lambda path: opened.append(path) or image_open(path))
+    frame_bytes = 64 * 48 * 3  # The frames of the first video.
+    dataset = DetMOTDetection(_get_args(root / 'data', frame_cache_bytes=3 * frame_bytes), data_txt_path,
+                              str(root / 'data'), {})
+    img_files = dataset.img_files
+
+    def load(idx):
+        opened.clear()
+        img = dataset._load_image(img_files[idx])
+        np.testing.assert_array_equal(np.asarray(img), np.asarray(image_open(img_files[idx]).convert('RGB')))
+        assert dataset.frame_cache_size == sum(frame.nbytes for frame in dataset.frame_cache.values())
+        assert dataset.frame_cache_size <= dataset.frame_cache_bytes
+        return len(opened) > 0
+
+    assert [load(idx) for idx in [0, 1, 2, 0, 1]] == [True, True, True, False, False]
+    assert load(3)  # Evicts the least recently used frame.
+    assert list(dataset.frame_cache.keys()) == [img_files[0], img_files[1], img_files[3]]
+    assert load(2) and not load(3)
+
+    # A frame larger than the budget is still kept, as the only frame in the cache.
+    dataset.frame_cache_bytes = frame_bytes // 2
+    dataset.frame_cache.clear()
+    dataset.frame_cache_size = 0
+    opened.clear()
+    dataset._load_image(img_files[0])
+    dataset._load_image(img_files[0])
+    assert opened == [img_files[0]] and list(dataset.frame_cache.keys()) == [img_files[0]]
+
+    # Without a budget, every frame is opened and nothing is cached.
+    dataset = DetMOTDetection(_get_args(root / 'data'), data_txt_path, str(root / 'data'), {})
+    opened.clear()
+    for _ in range(2):
+        dataset._load_image(img_files[0])
+    assert opened == [img_files[0]] * 2 and len(dataset.frame_cache) == 0